@@ -0,0 +1,83 @@
+"""
+Archiving whole lists of replays at once, e.g. everything from a tournament
+
+@author Intenzi
+@license MIT
+"""
+import asyncio
+
+from discord.ext import commands
+
+from Helpers.fetch_scheduler import Priority, Requester, current_requester
+from Helpers.replay_ingest import BulkIngest, parse_replay_list
+
+
+class Ingest(commands.Cog):
+    # replays archived at once by an ingest job, on top of whatever users are loading
+    INGEST_WORKERS = 3
+    # attachments bigger than this aren't replay lists (bytes)
+    MAX_LIST_SIZE = 2 * 1024 * 1024
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.ingest_task: asyncio.Task | None = None
+        self.running: BulkIngest | None = None
+
+    def cog_unload(self):
+        if self.ingest_task is not None:
+            self.ingest_task.cancel()
+
+    @commands.command()
+    @commands.is_owner()
+    async def ingest(self, ctx, job: str = None, *, replays: str = ''):
+        """
+        .ingest <job> <links or ids>, and/or with text files of them attached
+        Running the same job again picks up where it stopped, the job name can be left out as "-"
+        """
+        if self.ingest_task is not None and not self.ingest_task.done():
+            return await ctx.send(f"Already ingesting. {self.running.report.summary()}")
+        text = replays
+        for attachment in ctx.message.attachments:
+            if attachment.size > self.MAX_LIST_SIZE:
+                return await ctx.send(f"{attachment.filename} is too big to be a list of replays.")
+            text += '\n' + (await attachment.read()).decode(errors='replace')
+        if job is not None and parse_replay_list(job)[0]:  # no job name given, it's the first replay
+            text = job + '\n' + text
+            job = None
+        replay_ids, invalid = parse_replay_list(text)
+        if not replay_ids:
+            return await ctx.send("Please give some replay links or ids, or attach a file of them.")
+
+        replay_cog = self.bot.get_cog('Replay')
+        requester = Requester(ctx.author.id, ctx.guild.id if ctx.guild else None, Priority.BULK)
+
+        def load(replay_id: str):
+            # queued behind people waiting on .replay
+            current_requester.set(requester)
+            return replay_cog.load_replay(replay_id)
+
+        self.running = ingest = BulkIngest(
+            self.bot.archive,
+            load,
+            workers=self.INGEST_WORKERS,
+            on_progress=lambda report: m.edit(content=report.summary()),
+            progress_interval=10,
+        )
+        note = f" ({len(invalid)} entries weren't replay links and are left out)" if invalid else ''
+        m = await ctx.send(f"Ingesting {len(replay_ids)} replays..{note}")
+        self.ingest_task = asyncio.create_task(ingest.run(replay_ids, None if job == '-' else job))
+        try:
+            report = await asyncio.shield(self.ingest_task)
+        except Exception as e:
+            print(e)
+            return await ctx.send(f"Ingest stopped: {e}")
+        await m.edit(content=report.summary())
+        if report.errors:
+            failures = '\n'.join(f"{replay_id}: {error}" for replay_id, error in list(report.errors.items())[:10])
+            more = f"\n..and {len(report.errors) - 10} more" if len(report.errors) > 10 else ''
+            await ctx.send(f"Failed:\n{failures}{more}")
+
+
+async def setup(bot):
+    await bot.add_cog(Ingest(bot))
+    print("Ingest Cog loaded")
@@ -0,0 +1,144 @@
+"""
+Archives replays linked in chat ahead of time, so they're ready by the time someone runs /replay on them.
+Opt in per guild with /prefetch.
+
+@author Intenzi
+@license MIT
+"""
+import asyncio
+from collections import OrderedDict
+
+import discord
+from discord import app_commands as slash
+from discord.ext import commands
+
+from Helpers.fetch_scheduler import Priority, Requester, current_requester
+from Helpers.replay_id import find_replay_ids
+
+
+class Prefetch(commands.Cog):
+    # replays prefetched at once, and the fetch scheduler still runs them behind everything else
+    PREFETCH_WORKERS = 2
+    # links waiting to be prefetched, any more are dropped until the backlog clears
+    MAX_PENDING = 50
+    # links taken out of a single message
+    MAX_LINKS_PER_MESSAGE = 5
+    # links prefetched per guild, and per user, per 60 seconds
+    GUILD_RATE = 20
+    USER_RATE = 5
+    # replays queued or found archived recently, they aren't looked up again
+    RECENT_SIZE = 2000
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.guilds: set[int] | None = None  # opted in, read from the archive on first use
+        self.queue: asyncio.Queue[tuple[str, Requester]] = asyncio.Queue(self.MAX_PENDING)
+        self.recent: OrderedDict[str, None] = OrderedDict()
+        self.workers: list[asyncio.Task] = []
+        self.guild_cooldown = commands.CooldownMapping.from_cooldown(self.GUILD_RATE, 60, commands.BucketType.guild)
+        self.user_cooldown = commands.CooldownMapping.from_cooldown(self.USER_RATE, 60, commands.BucketType.user)
+
+    def cog_unload(self):
+        for task in self.workers:
+            task.cancel()
+
+    async def enabled_guilds(self) -> set[int]:
+        if self.guilds is None:
+            async with self.bot.archive.read() as conn:
+                async with conn.execute("SELECT guild_id FROM psreplay_prefetch_guilds") as cursor:
+                    self.guilds = {row[0] for row in await cursor.fetchall()}
+        return self.guilds
+
+    def seen(self, replay_id: str) -> bool:
+        """whether the replay came up recently, remembering it if it didn't"""
+        if replay_id in self.recent:
+            self.recent.move_to_end(replay_id)
+            return True
+        self.recent[replay_id] = None
+        if len(self.recent) > self.RECENT_SIZE:
+            self.recent.popitem(last=False)
+        return False
+
+    async def archived(self, replay_ids: list[str]) -> set[str]:
+        marks = ', '.join('?' * len(replay_ids))
+        query = f"SELECT replayid FROM psreplays WHERE replayid IN ({marks})"
+        async with self.bot.archive.read() as conn:
+            async with conn.execute(query, tuple(replay_ids)) as cursor:
+                return {row[0] for row in await cursor.fetchall()}
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if message.author.bot or message.guild is None or "replay.pokemonshowdown.com" not in message.content.lower():
+            return
+        if message.guild.id not in await self.enabled_guilds():
+            return
+        replay_ids = [
+            replay_id for replay_id in find_replay_ids(message.content)[:self.MAX_LINKS_PER_MESSAGE]
+            if not self.seen(replay_id)
+        ]
+        if not replay_ids:
+            return
+        archived = await self.archived(replay_ids)
+        self.bot.metrics.count("prefetch_archived", len(archived))
+        requester = Requester(message.author.id, message.guild.id, Priority.BACKGROUND)
+        guild_bucket = self.guild_cooldown.get_bucket(message)
+        user_bucket = self.user_cooldown.get_bucket(message)
+        for replay_id in replay_ids:
+            if replay_id in archived:
+                continue
+            # one queued link is one use of both limits, both are checked before either is used
+            # so a user over their limit doesn't use up the guild's
+            if not guild_bucket.get_tokens() or not user_bucket.get_tokens():
+                self.bot.metrics.count("prefetch_rate_limited")
+                del self.recent[replay_id]  # may be posted again once the limit is over
+                continue
+            try:
+                self.queue.put_nowait((replay_id, requester))
+            except asyncio.QueueFull:
+                self.bot.metrics.count("prefetch_dropped")
+                del self.recent[replay_id]
+                continue
+            guild_bucket.update_rate_limit()
+            user_bucket.update_rate_limit()
+            self.bot.metrics.count("prefetch_queued")
+        self.start_workers()
+
+    def start_workers(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self.worker()) for _ in range(self.PREFETCH_WORKERS)]
+
+    async def worker(self):
+        replay_cog = self.bot.get_cog('Replay')
+        while True:
+            replay_id, requester = await self.queue.get()
+            # whoever posted it is asking, at the lowest priority
+            current_requester.set(requester)
+            try:
+                await replay_cog.load_replay(replay_id)
+                self.bot.metrics.count("prefetch_done")
+            except Exception as e:  # deleted or private replay, or showdown being down, nobody is waiting on it
+                print(f"Prefetch of {replay_id} failed: {e}")
+                self.bot.metrics.count("prefetch_failed")
+            finally:
+                self.queue.task_done()
+
+    @commands.hybrid_command(name="prefetch")
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    @slash.describe(enabled="Archive replays linked in this server's chat ahead of time")
+    async def prefetch_command(self, ctx, enabled: bool):
+        """Archive replay links posted in this server right away, so /replay on them is instant"""
+        guilds = await self.enabled_guilds()
+        if enabled:
+            await self.bot.archive.write("INSERT OR IGNORE INTO psreplay_prefetch_guilds (guild_id) VALUES (?)", (ctx.guild.id,))
+            guilds.add(ctx.guild.id)
+            await ctx.send("Replay links posted here will now be archived right away.")
+        else:
+            await self.bot.archive.write("DELETE FROM psreplay_prefetch_guilds WHERE guild_id = ?", (ctx.guild.id,))
+            guilds.discard(ctx.guild.id)
+            await ctx.send("Replay links posted here won't be archived ahead of time anymore.")
+
+
+async def setup(bot):
+    await bot.add_cog(Prefetch(bot))
+    print("Prefetch Cog loaded")
@@ -0,0 +1,156 @@
+"""
+Searching through the replay archive
+
+@author Intenzi
+@license MIT
+"""
+import asyncio
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+from discord.ui import View, Button
+
+from Helpers.replay_id import replay_url
+from Helpers.replay_search import (
+    SEARCH_PAGE_SIZE,
+    backfill_params,
+    backfill_query,
+    build_match,
+    index_query,
+    search_replays,
+    summary_query,
+)
+
+
+class SearchFlags(commands.FlagConverter):
+    pokemon: str = commands.flag(default=None, description="Pokemon in the battle, e.g. Tyranitar vs Skarmory")
+    player: str = commands.flag(default=None, description="Name of either player")
+    format: str = commands.flag(default=None, description="e.g. gen3ou")
+    text: str = commands.flag(default=None, description="Something that happened in the battle")
+    min_turns: int = commands.flag(default=None, description="At least this many turns")
+    max_turns: int = commands.flag(default=None, description="At most this many turns")
+
+
+class SearchPageButton(Button):
+    def __init__(self, step: int, **kwargs):
+        super().__init__(emoji="◀️" if step < 0 else "▶️", **kwargs)
+        self.step = step
+
+    async def callback(self, interaction):
+        view = self.view
+        view.page += self.step
+        try:
+            await view.load_page()
+        except Exception as e:
+            view.page -= self.step
+            print(e)
+            return await interaction.response.send_message("Search failed, please try again.", ephemeral=True)
+        await interaction.response.edit_message(embed=view.build_embed(), view=view)
+
+
+class SearchResultsView(View):
+    def __init__(self, user_id, archive, match, min_turns, max_turns):
+        super().__init__(timeout=300)
+        self.user_id = user_id
+        self.archive = archive
+        self.match = match
+        self.min_turns = min_turns
+        self.max_turns = max_turns
+        self.page = 0
+        self.total = 0
+        self.rows = []
+        self.add_item(SearchPageButton(-1))
+        self.add_item(SearchPageButton(1))
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // SEARCH_PAGE_SIZE))
+
+    async def load_page(self):
+        self.total, self.rows = await search_replays(self.archive, self.match, self.min_turns, self.max_turns, self.page)
+        self.children[0].disabled = self.page == 0
+        self.children[1].disabled = self.page >= self.pages - 1
+
+    def build_embed(self):
+        emb = discord.Embed(color=discord.Color.pink(), title=f"{self.total} archived replays found")
+        lines = []
+        for replay_id, turn_count, p1, p2, battle_format, upload_time in self.rows:
+            title = f"{p1} vs. {p2}" if p1 is not None else replay_id
+            details = [battle_format or replay_id.rsplit('-', 1)[0], f"{turn_count} turns"]
+            if upload_time:
+                details.append(discord.utils.format_dt(datetime.fromtimestamp(upload_time), 'd'))
+            lines.append(f"[{discord.utils.escape_markdown(title)}]({replay_url(replay_id)}) · {' · '.join(details)}")
+        emb.description = '\n'.join(lines) or "Nothing matched, try fewer filters."
+        emb.set_footer(text=f"Page {self.page + 1}/{self.pages}")
+        return emb
+
+    async def interaction_check(self, interaction):
+        return interaction.user.id == self.user_id
+
+
+class ReplaySearch(commands.Cog):
+    # replays indexed per batch by the backfill, and the pause between batches (seconds)
+    BACKFILL_BATCH = 50
+    BACKFILL_PAUSE = 0.5
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.backfill_task: asyncio.Task | None = None
+        self.backfilled = 0
+
+    def cog_unload(self):
+        if self.backfill_task is not None:
+            self.backfill_task.cancel()
+
+    @commands.hybrid_command()
+    async def replaysearch(self, ctx, *, flags: SearchFlags):
+        """Search through every replay tyranitar has saved!"""
+        if flags.min_turns is not None and flags.max_turns is not None and flags.min_turns > flags.max_turns:
+            return await ctx.send("min_turns can't be more than max_turns.", ephemeral=True)
+        match = build_match(flags.pokemon, flags.player, flags.format, flags.text)
+        if match is None and flags.min_turns is None and flags.max_turns is None:
+            return await ctx.send("Please give at least one thing to search for.", ephemeral=True)
+        view = SearchResultsView(ctx.author.id, self.bot.archive, match, flags.min_turns, flags.max_turns)
+        try:
+            await view.load_page()
+        except Exception as e:
+            print(e)
+            return await ctx.send("Search failed, please check your search terms.", ephemeral=True)
+        await ctx.send(embed=view.build_embed(), view=view)
+
+    async def backfill(self):
+        """indexes the replays archived before the search index existed, a batch at a time"""
+        last_rowid = 0
+        while True:
+            async with self.bot.archive.read() as conn:
+                async with conn.execute(backfill_query, (last_rowid, self.BACKFILL_BATCH)) as cursor:
+                    rows = [tuple(row) for row in await cursor.fetchall()]
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            summaries, documents = await self.bot.parse_pool.run(backfill_params, rows)
+            self.bot.archive.write_many(summary_query, summaries)
+            await self.bot.archive.write_many(index_query, documents)
+            self.backfilled += len(documents)
+            await asyncio.sleep(self.BACKFILL_PAUSE)
+
+    @commands.command()
+    @commands.is_owner()
+    async def replayindex(self, ctx):  # run once after updating, safe to rerun since it only picks up unindexed replays
+        if self.backfill_task is not None and not self.backfill_task.done():
+            return await ctx.send(f"Already indexing, {self.backfilled} replays done so far.")
+        self.backfilled = 0
+        self.backfill_task = asyncio.create_task(self.backfill())
+        await ctx.send("Indexing the archive in the background..")
+        try:
+            await asyncio.shield(self.backfill_task)
+        except Exception as e:
+            print(e)
+            return await ctx.send(f"Indexing stopped after {self.backfilled} replays: {e}")
+        await ctx.send(f"Finished indexing {self.backfilled} replays.")
+
+
+async def setup(bot):
+    await bot.add_cog(ReplaySearch(bot))
+    print("ReplaySearch Cog loaded")
@@ -0,0 +1,125 @@
+"""
+Teams, KOs and the winner of archived replays, worked out when they were saved
+
+@author Intenzi
+@license MIT
+"""
+import asyncio
+
+import discord
+from discord import app_commands as slash
+from discord.ext import commands
+
+from Helpers.replay_analytics import (
+    FAINT,
+    analyse_replay,
+    analytics_backfill_params,
+    analytics_backfill_query,
+    get_analytics,
+    store_analytics,
+)
+from Helpers.replay_id import parse_replay_id, replay_url
+
+
+class ReplayStats(commands.Cog):
+    # replays analysed per batch by the backfill, and the pause between batches (seconds)
+    BACKFILL_BATCH = 50
+    BACKFILL_PAUSE = 0.5
+    # KOs listed before the rest are cut off, embed fields hold 1024 characters
+    MAX_KOS_SHOWN = 12
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.backfill_task: asyncio.Task | None = None
+        self.backfilled = 0
+
+    def cog_unload(self):
+        if self.backfill_task is not None:
+            self.backfill_task.cancel()
+
+    async def players(self, replay_id: str) -> tuple[str, str, str] | None:
+        async with self.bot.archive.read() as conn:
+            async with conn.execute("SELECT p1, p2, format FROM psreplay_meta WHERE replayid = ?", (replay_id,)) as cursor:
+                return await cursor.fetchone()
+
+    @commands.hybrid_command()
+    @slash.describe(url="Link to a replay tyranitar has saved")
+    async def replaystats(self, ctx, url: str):
+        """Teams, KOs and the winner of a saved replay"""
+        replay_id = parse_replay_id(url)
+        if replay_id is None:
+            return await ctx.send('Please enter a valid showdown replay link.', ephemeral=True)
+        # the archive read and an analysis in the parse pool can outlast discord's 3 seconds
+        await ctx.defer()
+        analytics = await get_analytics(self.bot.archive, replay_id)
+        if analytics is None:
+            # saved before analytics existed and not backfilled yet
+            battle_texts = await self.bot.get_cog('Replay').get_replay_from_db(replay_id)
+            if battle_texts is None:
+                return await ctx.send("I haven't saved that replay yet, use /replay on it first.", ephemeral=True)
+            analytics = await self.bot.parse_pool.run(analyse_replay, battle_texts[1])
+        meta = await self.players(replay_id)
+        p1, p2, battle_format = meta if meta is not None else ("Player 1", "Player 2", replay_id.rsplit('-', 1)[0])
+        names = (p1, p2)
+
+        winner = analytics.winner or ("Tie" if analytics.tie else "Nobody (unfinished)")
+        emb = discord.Embed(
+            title=f"{p1} vs. {p2}", url=replay_url(replay_id), color=discord.Color.pink(),
+            description=f"{battle_format} · {analytics.turn_count} turns",
+        )
+        emb.add_field(name="Winner", value=f"||{winner}||")
+        for side, team in enumerate(analytics.teams):
+            fainted = {event.species: event.turn for event in analytics.kos(side)}
+            lines = [
+                f"~~{name}~~ (turn {fainted[species]})" if species in fainted else name
+                for species, name in zip(team, map(discord.utils.escape_markdown, team))
+            ]
+            emb.add_field(
+                name=f"{names[side]}'s team ({len(team) - len(fainted)}/{len(team)} left)",
+                value='\n'.join(lines) or "-",
+            )
+        kos = [event for event in analytics.events if event.kind == FAINT]
+        timeline = [f"Turn {event.turn}: {names[event.side]}'s {event.species}" for event in kos[:self.MAX_KOS_SHOWN]]
+        if len(kos) > self.MAX_KOS_SHOWN:
+            timeline.append(f"and {len(kos) - self.MAX_KOS_SHOWN} more")
+        timeline = discord.utils.escape_markdown('\n'.join(timeline))
+        emb.add_field(name="KOs", value=f"||{timeline}||" if timeline else "None", inline=False)
+        emb.add_field(name="Switches", value=f"{p1}: {analytics.switches(0)}\n{p2}: {analytics.switches(1)}")
+        await ctx.send(embed=emb)
+
+    async def backfill(self):
+        """analyses the replays summarised before analytics existed, a batch at a time"""
+        last_rowid = 0
+        while True:
+            async with self.bot.archive.read() as conn:
+                async with conn.execute(analytics_backfill_query, (last_rowid, self.BACKFILL_BATCH)) as cursor:
+                    rows = [tuple(row) for row in await cursor.fetchall()]
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            results = await self.bot.parse_pool.run(analytics_backfill_params, rows)
+            for replay_id, analytics in results:
+                store_analytics(self.bot.archive, replay_id, analytics)
+            await self.bot.archive.flush()
+            self.backfilled += len(results)
+            await asyncio.sleep(self.BACKFILL_PAUSE)
+
+    @commands.command()
+    @commands.is_owner()
+    async def replaystatsindex(self, ctx):  # run after .replayindex, which creates the summaries this fills in
+        if self.backfill_task is not None and not self.backfill_task.done():
+            return await ctx.send(f"Already analysing, {self.backfilled} replays done so far.")
+        self.backfilled = 0
+        self.backfill_task = asyncio.create_task(self.backfill())
+        await ctx.send("Analysing the archive in the background..")
+        try:
+            await asyncio.shield(self.backfill_task)
+        except Exception as e:
+            print(e)
+            return await ctx.send(f"Analysing stopped after {self.backfilled} replays: {e}")
+        await ctx.send(f"Finished analysing {self.backfilled} replays.")
+
+
+async def setup(bot):
+    await bot.add_cog(ReplayStats(bot))
+    print("ReplayStats Cog loaded")
@@ -4,10 +4,14 @@ This file is used to play published Pokémon Showdown replays onto discord
 @author Intenzi
 @license MIT
 """
-import re
 from datetime import datetime
 from http import HTTPStatus
 
+import asyncio
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
 import aiohttp
 import discord
 from discord import app_commands as slash
@@ -15,381 +19,497 @@ from discord.ext import commands
 from discord.ui import View, Button, Modal, TextInput
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
+from Helpers.battle_log import UnsupportedLogLine, log_battle_parser
+from Helpers.fetch_scheduler import Priority, Requester, SchedulerFull, current_requester
+from Helpers.html_parser import html_battle_views
+from Helpers.render_queue import RenderWorkerError
+from Helpers.replay_analytics import analyse_replay, replay_winner, store_analytics
+from Helpers.replay_codec import decode_turns, encode_turns, legacy_split
+from Helpers.replay_id import parse_replay_id, replay_url
+from Helpers.replay_search import index_replay
+from Helpers.replay_store import ParsedReplay
+from Helpers.showdown_client import ShowdownBadResponse, ShowdownUnavailable
+from Helpers.sprites import back_sprite, front_sprite
 from Helpers.task_cache import taskcache
 
 
-def simple_sprite_gen(name: str, is_back: bool):
-    """builds gen 3 sprites"""
-    # simplify name
-    name = name.lower().replace(':', '').replace(' ', '-').replace('%', '').replace('.', '').replace(
-        '\u2019', '').replace('\u0301', '')
-    if is_back:  # no gifs for back sprites
-        base_url = "https://play.pokemonshowdown.com/sprites/gen3-back/"
-        url_path = base_url + name + '.png'
-    else:
-        if name.startswith(('castform-', 'deoxys-')):  # the repo doesn't contain formes
-            base_url = "https://play.pokemonshowdown.com/sprites/gen3/"
-            url_path = base_url + name + '.png'
-        else:
-            base_url = "https://raw.githubusercontent.com/Dastardllydwarf/Emerald-Animated-Sprites/main/"
-            url_path = base_url + name + '.gif'
+# custom_ids of replay viewer components, replay:<action>:<user id>:<turn>:<page>:<perspective>
+VIEWER_ID_PREFIX = "replay:"
+# a replay's turns as ready to send embeds, [perspective][turn][page]
+TurnEmbeds = tuple[tuple[tuple[discord.Embed, ...], ...], ...]
 
-    return url_path
 
+def turn_embeds(replay: ParsedReplay) -> TurnEmbeds:
+    """
+    Every page of every turn from both viewpoints as ready to send embeds, [perspective][turn][page]
+    Built once per replay and shared by all its viewer messages, so they must never be modified
+    """
+    perspectives = []
+    for pages, active_mons in ((replay.pages, replay.active_mons), (replay.pages2, replay.active_mons2)):
+        turns = []
+        for turn_pages, (mon1, mon2) in zip(pages, active_mons):
+            embeds = []
+            for number, page in enumerate(turn_pages, 1):
+                emb = discord.Embed(color=discord.Color.gold(), description=page)
+                # the active pokemon of the shown viewpoint at the turn
+                if mon1 is not None:
+                    emb.set_image(url=back_sprite(mon1))
+                if mon2 is not None:
+                    emb.set_thumbnail(url=front_sprite(mon2))
+                if len(turn_pages) > 1:
+                    emb.set_footer(text=f"Page {number}/{len(turn_pages)}")
+                embeds.append(emb)
+            turns.append(tuple(embeds))
+        perspectives.append(tuple(turns))
+    return tuple(perspectives)
+
+
+class ViewerState(NamedTuple):
+    """
+    What a replay viewer message is showing, kept in the custom_ids of its buttons instead of in memory
+    so the buttons keep working forever and across restarts
+    """
+    user_id: int  # only they can use the buttons
+    turn: int = 0
+    page: int = 0
+    perspective: int = 0  # 0 for p1's viewpoint, 1 for p2's
 
-class CurrentTurnButton(Button):
-    """This button displays the current turn"""
-    def __init__(self, total_turns, **kwargs):
-        super().__init__(label=f"Turn 0/{total_turns}", disabled=True, style=discord.ButtonStyle.blurple, **kwargs)
+    def custom_id(self, action: str) -> str:
+        return f"{VIEWER_ID_PREFIX}{action}:{self.user_id}:{self.turn}:{self.page}:{self.perspective}"
 
+    @classmethod
+    def from_custom_id(cls, custom_id: str) -> tuple[str, "ViewerState"]:
+        action, *numbers = custom_id[len(VIEWER_ID_PREFIX):].split(':')
+        return action, cls(*map(int, numbers))
 
-class PreviousTurnButton(Button):
-    def __init__(self, **kwargs):
-        super().__init__(emoji="◀️", **kwargs, disabled=True)
 
-    async def callback(self, interaction):
-        embeds = interaction.message.embeds
-        self.view.go_previous_turn(embeds)
-        await interaction.response.edit_message(embeds=embeds, view=self.view)
+def viewer_replay_id(message: discord.Message) -> str | None:
+    """the replay a viewer message is showing, kept in the custom_id of its (disabled) turn button"""
+    for row in message.components:
+        for component in getattr(row, "children", ()):
+            custom_id = getattr(component, "custom_id", None) or ''
+            if custom_id.startswith(VIEWER_ID_PREFIX + "id:"):
+                return custom_id[len(VIEWER_ID_PREFIX + "id:"):]
+    return None
 
 
-class FirstTurnButton(Button):
-    def __init__(self, **kwargs):
-        super().__init__(emoji="⏮️", **kwargs, disabled=True)
+class ReplayViewer:
+    """
+    Everything a replay viewer shows, built once per replay and shared by every viewer message of it.
+    Navigation takes a ViewerState and returns the next one.
+    """
+    def __init__(self, replay: ParsedReplay, battle_data: dict, url: str, pages: TurnEmbeds | None = None):
+        p1, p2 = battle_data["players"]
+        self.replay = replay
+        self.players = (p1, p2)
+        self.battle_format = battle_data["format"]
+        self.total_turns = replay.total_turns
+        # the turn embeds of an older viewer of the same replay can be passed in, only the headers are rebuilt then
+        self.pages = pages if pages is not None else turn_embeds(replay)
+
+        winner, tie = replay_winner(replay.texts)
+        if winner is None:
+            winner = "Tie" if tie else "Nobody (unfinished)"
+        # Initial embed
+        emb = discord.Embed(color=discord.Color.pink(), url=url)
+        # rating
+        if battle_data.get('rating', 0):
+            emb.add_field(name="Rating", value=battle_data["rating"])
+        emb.add_field(name="Views", value=battle_data["views"])
+        upload_time = discord.utils.format_dt(datetime.fromtimestamp(int(battle_data["uploadtime"])))
+        emb.add_field(name="Uploaded", value=upload_time)
+        emb.add_field(name="Winner", value=f"||{winner}||")
+        # the replay's details from both viewpoints, [perspective][0 before the battle starts, 1 once it's going]
+        self.headers = (self.build_headers(emb, p1, p2), self.build_headers(emb, p2, p1))
 
-    async def callback(self, interaction):
-        embeds = interaction.message.embeds
-        self.view.go_previous_turn(embeds, jump=0)
-        await interaction.response.edit_message(embeds=embeds, view=self.view)
+    def build_headers(self, header: discord.Embed, player, opponent) -> tuple[discord.Embed, discord.Embed]:
+        start = header.copy()
+        start.title = f"{player} vs. {opponent}"
+        start.description = self.replay.format_text
+        going = start.copy()
+        going.title = f"{self.battle_format}: {start.title}"
+        going.description = None
+        return start, going
 
+    def page_count(self, state: ViewerState) -> int:
+        return len(self.pages[state.perspective][state.turn])
 
-class NextTurnButton(Button):
-    def __init__(self, **kwargs):
-        super().__init__(emoji="▶️", **kwargs)
+    def clamp(self, state: ViewerState) -> ViewerState:
+        """keeps a state read back from a message within this replay"""
+        turn = min(max(state.turn, 0), self.total_turns)
+        state = state._replace(turn=turn, perspective=state.perspective & 1)
+        return state._replace(page=min(max(state.page, 0), self.page_count(state) - 1))
 
-    async def callback(self, interaction):
-        embeds = interaction.message.embeds
-        self.view.go_forward_turn(embeds)
-        await interaction.response.edit_message(embeds=embeds, view=self.view)
+    def step(self, state: ViewerState, step: int) -> ViewerState:
+        """one page forwards or backwards, moving on to the next/previous turn past the last/first page"""
+        if 0 <= state.page + step < self.page_count(state):
+            return state._replace(page=state.page + step)
+        if 0 <= state.turn + step <= self.total_turns:
+            return state._replace(turn=state.turn + step, page=0)
+        return state
 
+    def go_to_turn(self, state: ViewerState, turn: int) -> ViewerState:
+        return state._replace(turn=turn, page=0)
 
-class LastTurnButton(Button):
-    def __init__(self, **kwargs):
-        super().__init__(emoji="⏭️", **kwargs)
+    def swap_perspective(self, state: ViewerState) -> ViewerState:
+        # the other viewpoint's text of the turn may not split into as many pages
+        return self.clamp(state._replace(perspective=state.perspective ^ 1))
 
-    async def callback(self, interaction):
-        embeds = interaction.message.embeds
-        self.view.go_forward_turn(embeds, jump=self.view.total_turns)
-        await interaction.response.edit_message(embeds=embeds, view=self.view)
+    def embeds(self, state: ViewerState) -> list[discord.Embed]:
+        return [self.headers[state.perspective][state.turn > 0], self.pages[state.perspective][state.turn][state.page]]
 
+    def view(self, state: ViewerState) -> "ReplayViewerView":
+        return ReplayViewerView(self, state)
 
-class GoToTurnButton(Button):
-    def __init__(self, **kwargs):
-        super().__init__(emoji="🔢", label="Go To Turn", **kwargs)
 
-    async def callback(self, interaction):
-        await interaction.response.send_modal(GoToTurnModal(int(self.view.children[1].label[5:].split('/')[0]), self.view))
+class ReplayViewerView(View):
+    """
+    unified viewer + doesn't care about which source the replay is from
+    Only the buttons of one state, clicks are handled by Replay.on_interaction
+    """
+    def __init__(self, viewer: ReplayViewer, state: ViewerState):
+        super().__init__(timeout=None)
+        at_start = state.turn == 0 and state.page == 0
+        pages = viewer.page_count(state)
+        at_end = state.turn == viewer.total_turns and state.page == pages - 1
+        label = f"Turn {state.turn}/{viewer.total_turns}"
+        if pages > 1:
+            label += f" ({state.page + 1}/{pages})"
+
+        self.add_item(Button(emoji="◀️", custom_id=state.custom_id("previous"), disabled=at_start, row=0))
+        self.add_item(Button(
+            label=label, custom_id=f"{VIEWER_ID_PREFIX}id:{viewer.replay.replay_id}",
+            disabled=True, style=discord.ButtonStyle.blurple, row=0
+        ))
+        self.add_item(Button(emoji="▶️", custom_id=state.custom_id("next"), disabled=at_end, row=0))
+        self.add_item(Button(emoji="⏮️", custom_id=state.custom_id("first"), disabled=at_start, row=1))
+        self.add_item(Button(emoji="🔢", label="Go To Turn", custom_id=state.custom_id("goto"), row=1))
+        self.add_item(Button(emoji="⏭️", custom_id=state.custom_id("last"), disabled=at_end, row=1))
+        self.add_item(Button(emoji="🔀", label=viewer.players[state.perspective], custom_id=state.custom_id("swap"), row=1))
+        # sent views aren't kept around by discord.py once they're stopped
+        self.stop()
 
 
 class GoToTurnModal(Modal):
-    def __init__(self, current_turn, view):
-        self.current_turn = current_turn
-        self.view = view
-        super().__init__(title="Jump to any turn")
-        self.turn = TextInput(label="Enter Turn Number:", placeholder=f"Only from 0 to {view.total_turns}")
+    def __init__(self, state: ViewerState, total_turns: int | None):
+        super().__init__(title="Jump to any turn", custom_id=state.custom_id("goto"))
+        placeholder = f"Only from 0 to {total_turns}" if total_turns is not None else None
+        self.turn = TextInput(label="Enter Turn Number:", placeholder=placeholder, custom_id="turn")
         self.add_item(self.turn)
+        # submissions are handled by Replay.on_interaction like the buttons
+        self.stop()
 
-    async def on_submit(self, interaction):
-        turn = self.turn.value
-        if not turn.isdigit():
-            return await interaction.response.send_message("Please enter a valid turn number..", ephemeral=True)
-        turn = int(turn)
-        if turn not in range(self.view.total_turns+1):
-            return await interaction.response.send_message(f"Please enter a number only between 0 to {self.view.total_turns}", ephemeral=True)
-        if self.current_turn == turn:
-            return await interaction.response.defer()
-
-        embs = interaction.message.embeds
-        if turn > self.current_turn:
-            self.view.go_forward_turn(embs, jump=turn)
-        else:
-            self.view.go_previous_turn(embs, jump=turn)
 
-        await interaction.response.edit_message(embeds=embs, view=self.view)
-
-
-class SwapViewButton(Button):
-    def __init__(self, player: str, **kwargs):
-        super().__init__(emoji="🔀", label=player, **kwargs)
-
-    async def callback(self, interaction):
-        embs = interaction.message.embeds
-        currently_p1 = self.label == self.view.p1
-        current_turn = int(self.view.children[1].label[5:].split('/')[0])
-
-        if currently_p1:
-            embs[1].description = self.view.texts2[current_turn]
-            embs[0].title.replace(f"{self.view.p1} vs. {self.view.p2}", f"{self.view.p2} vs. {self.view.p1}")
-            self.label = self.view.p2
-        else:
-            embs[1].description = self.view.texts[current_turn]
-            embs[0].title.replace(f"{self.view.p2} vs. {self.view.p1}", f"{self.view.p1} vs. {self.view.p2}")
-            self.label = self.view.p1
-        # just swap the images
-        new_mon1_link = simple_sprite_gen(embs[1].thumbnail.url[:-4].replace("https://raw.githubusercontent.com/Dastardllydwarf/Emerald-Animated-Sprites/main/", '').replace("https://play.pokemonshowdown.com/sprites/gen3/", ''), is_back=True)
-        new_mon2_link = simple_sprite_gen(embs[1].image.url[:-4].replace("https://play.pokemonshowdown.com/sprites/gen3-back/", ''), is_back=False)
-        embs[1].set_thumbnail(url=new_mon2_link)
-        embs[1].set_image(url=new_mon1_link)
-        await interaction.response.edit_message(embeds=embs, view=self.view)
+def modal_value(interaction: discord.Interaction, custom_id: str) -> str:
+    """what was entered into a modal's text input"""
+    for row in interaction.data.get("components", ()):
+        for component in row.get("components", ()):
+            if component.get("custom_id") == custom_id:
+                return component.get("value", '')
+    return ''
 
 
-class ReplayViewerView(View):
-    """unified viewer + doesn't care about which source the replay is from"""
-    def __init__(self, user_id, replay_texts, replay_texts2, replay_images, format_text, battle_format, theme, p1, p2):
-        self.user_id = user_id
-        # consists of each turn's text and images
-        self.texts = replay_texts
-        self.texts2 = replay_texts2
-        self.images = replay_images  # multiple images can be present for a particular turn due to switch in/switch out
-        self.format_text = format_text
-        self.theme = theme
-        self.p1 = p1
-        self.p2 = p2
-
-        self.battle_format = battle_format
-        self.total_turns = len(replay_texts) - 1
-        super().__init__(timeout=840)  # 14 minute timeout
-
-        self.build_main_ui(clear=False)
-
-    def build_main_ui(self, clear=True):
-        if clear:
-            self.clear_items()
-        self.add_item(PreviousTurnButton(row=0))
-        self.add_item(CurrentTurnButton(self.total_turns, row=0))
-        self.add_item(NextTurnButton(row=0))
-        self.add_item(FirstTurnButton(row=1))
-        self.add_item(GoToTurnButton(row=1))
-        self.add_item(LastTurnButton(row=1))
-        self.add_item(SwapViewButton(self.p1, row=1))
-
-    async def interaction_check(self, interaction):
-        return interaction.user.id == self.user_id
+class ReplayLoadError(Exception):
+    """a replay couldn't be loaded, the message is meant for the user"""
 
-    @staticmethod
-    def set_jumped_emb_img(emb, turn_texts, previous_turn, new_turn):
-        """Need a go through of all turns based on jump for finalising image"""
-        opposing_mon_pattern = re.compile(r'(?:\n|^).+?sent out.+?\*\*(.+?)\*\*\)?!(?:\n|$)')
-        player_mon_pattern = re.compile(r'(?:\n|^)Go!.+?\*\*(.+?)\*\*\)?!(?:\n|$)')
-        # jumped ahead
-        if new_turn > previous_turn:
-            # we need text from previous turn till the latest turn
-            finding_text = "".join(turn_texts[previous_turn:new_turn+1])
-            if player_mon_pattern.findall(finding_text):
-                mon1 = player_mon_pattern.findall(finding_text)[-1]
-                emb.set_image(url=simple_sprite_gen(mon1, is_back=True))
-
-            if opposing_mon_pattern.findall(finding_text):
-                mon2 = opposing_mon_pattern.findall(finding_text)[-1]
-                emb.set_thumbnail(url=simple_sprite_gen(mon2, is_back=False))
-        else:  # includes equals case
-            # we need text from 0th turn till the latest turn
-            finding_text = "".join(turn_texts[:new_turn+1])
-            if player_mon_pattern.findall(finding_text):
-                mon1 = player_mon_pattern.findall(finding_text)[-1]
-                emb.set_image(url=simple_sprite_gen(mon1, is_back=True))
-
-            if opposing_mon_pattern.findall(finding_text):
-                mon2 = opposing_mon_pattern.findall(finding_text)[-1]
-                emb.set_thumbnail(url=simple_sprite_gen(mon2, is_back=False))
 
-    @staticmethod
-    def set_emb_img(turn_text, emb):
-        """Modify only if found modifying trigger text, cannot deal with doubles properly"""
-        # pattern is to prevent trainer names from leading to issues for example a player named "sent out **Gyarados**!"
-        opposing_mon_pattern = re.compile(r'(?:\n|^)?.+?sent out.+?\*\*(.+?)\*\*\)?!(?:\n|$)')
-        player_mon_pattern = re.compile(r'(?:\n|^)?Go!.+?\*\*(.+?)\*\*\)?!(?:\n|$)')
-        # p1: "Go! **Pikachu**!"
-        # p2: "Player 2 name sent out **Bulbasaur**!"
-        if player_mon_pattern.findall(turn_text):
-            mon1 = player_mon_pattern.findall(turn_text)[-1]  # last one here
-            emb.set_image(url=simple_sprite_gen(mon1, is_back=True))
-
-        if opposing_mon_pattern.findall(turn_text):
-            mon2 = opposing_mon_pattern.findall(turn_text)[-1]
-            emb.set_thumbnail(url=simple_sprite_gen(mon2, is_back=False))
-
-    def go_forward_turn(self, embeds, jump: int = None):
-        turn_btn = self.children[1]
-        current_turn = int(turn_btn.label[5:].split('/')[0])
-        emb1, emb2 = embeds
-        if current_turn == 0:
-            # modify embeds
-            self.children[0].disabled = False  # previous turn button
-            self.children[3].disabled = False  # first turn button
-            emb1.description = None
-            emb1.title = f"{self.battle_format}: {emb1.title}"
-
-        if jump is not None:
-            if self.children[6].label == self.p1:
-                emb2.description = self.texts[jump]
-                self.set_jumped_emb_img(emb2, self.texts, current_turn, jump)
-            else:
-                emb2.description = self.texts2[jump]
-                self.set_jumped_emb_img(emb2, self.texts2, current_turn, jump)
-            turn_btn.label = f"Turn {jump}/{self.total_turns}"
-            current_turn = jump
-        else:
-            current_turn += 1
-            if self.children[6].label == self.p1:
-                emb2.description = self.texts[current_turn]
-            else:
-                emb2.description = self.texts2[current_turn]
-            self.set_emb_img(emb2.description, emb2)
-            turn_btn.label = f"Turn {current_turn}/{self.total_turns}"
-
-        if current_turn == self.total_turns:
-            self.children[2].disabled = True  # next turn btn
-            self.children[5].disabled = True  # last turn btn
-
-    def go_previous_turn(self, embeds, jump: int = None):
-        turn_btn = self.children[1]
-        current_turn = int(turn_btn.label[5:].split('/')[0])
-        emb1, emb2 = embeds
-        if current_turn == self.total_turns:
-            # modify embeds
-            self.children[2].disabled = False  # next turn button
-            self.children[5].disabled = False  # last turn button
-
-        if jump is not None:
-            if self.children[6].label == self.p1:
-                emb2.description = self.texts[jump]
-                self.set_jumped_emb_img(emb2, self.texts, current_turn, jump)
-            else:
-                emb2.description = self.texts2[jump]
-                self.set_jumped_emb_img(emb2, self.texts2, current_turn, jump)
-            turn_btn.label = f"Turn {jump}/{self.total_turns}"
-            current_turn = jump
-        else:
-            current_turn -= 1
-            if self.children[6].label == self.p1:
-                emb2.description = self.texts[current_turn]
-            else:
-                emb2.description = self.texts2[current_turn]
-            self.set_emb_img(emb2.description, emb2)
-            turn_btn.label = f"Turn {current_turn}/{self.total_turns}"
-
-        if current_turn == 0:
-            self.children[0].disabled = True  # previous turn btn
-            self.children[3].disabled = True  # first turn btn
-            emb1.description = self.format_text
-            emb1.title = ': '.join(emb1.title.split(': ')[1:])
-
-
-def html_battle_parser(html_text):
+def clean_battle_data(data) -> dict:
     """
-    Handles the parsing of html battle text log (not same as .log file)
+    showdown's .json with the fields everything after it relies on checked, and the numbers made numbers
+    the log may still be missing, that's left to render_locally which falls back to the replay page
     """
-    # Filtering at the very beginning
-    text = html_text.replace('<div class="battle-options"></div><div class="inner message-log">', '').replace('</div><div class="inner-preempt message-log"></div>', '')
-    # Now there are four types of divs at the topmost layer, along with h2 tags
-    # - chat
-    # - spacer
-    # - battle-history
-    # with the fourth being no class divs that are present at turn 0 stating the format and clauses,mods
-    # Take out all chat from the replays  i.e. joins/leaves/timers/chat messages
-    chat_pattern = re.compile(r'<div class="chat.*?">.*?</div>')
-    text = chat_pattern.sub('', text)
-    # Replace all of the spacer divs with a newline
-    text = text.replace('<div class="spacer battle-history"><br></div>', '\n')
-    # Find strong tags
-    strong_pattern = re.compile(r'<strong.*?>(.*?)</strong>')
-    text = strong_pattern.sub(lambda match: f'**{match.group(1)}**', text)
-    # clear out any small tags
-    text = text.replace('<small>', '').replace('</small>', '')
-    # Now separate the battle-history and no class divs
-    battle_start_index = text.find('<div class="battle-history">')
-    format_text = text[:battle_start_index]
-    text = text[battle_start_index:]
-    # Find em tags
-    em_pattern = re.compile(r'<em.*?>(.*?)</em>')
-    text = em_pattern.sub(lambda match: f'_{match.group(1)}_', text)
-    format_text = em_pattern.sub(lambda match: f'- {match.group(1)}', format_text)
-    # Replace all of the divs with a newline
-    div_pattern = re.compile(r'<div.*?>(.*?)</div>')
-    text = div_pattern.sub(lambda match: f'{match.group(1)}\n', text)
-    format_text = div_pattern.sub(lambda match: f'{match.group(1)}\n', format_text)
-    # replace br tags where it doesn't end at a newline with newline
-    br_pattern = re.compile(r'<br>(?!\n)')
-    text = br_pattern.sub('\n', text)
-    # now clear out any remaining br tags
-    text = text.replace('<br>', '')
-    format_text = format_text.replace('<br>', '')
-    # Replace all of the abbr in battle text with percentages
-    abbr_pattern = re.compile(r'<abbr.*?>(.*?)</abbr>')
-    text = abbr_pattern.sub(lambda match: f'{match.group(1)}', text)
-    # finally lets parse out the h2 tags for turn text
-    h2_pattern = re.compile(r'<h2.*?>(.*?)</h2>')
-    # ^-^  random encoding to split on
-    text = h2_pattern.sub(lambda match: f'^-^ ## ```{match.group(1)}```', text)
-
-    # now separate the text into a list of turns, while keeping the turn text
-    text = [t.strip() for t in text.split('^-^ ')]
-    # don't forget turn 0
-    text[0] = "## ```Turn 0```\n" + text[0]
-    # some formatting
-    format_text = format_text.strip()
-    return format_text, text
+    if not isinstance(data, dict):
+        raise ReplayLoadError('I could not read that replay..')
+    players = data.get("players")
+    if not isinstance(players, list) or len(players) != 2:
+        raise ReplayLoadError('I could not read that replay..')
+    data["players"] = [str(player) for player in players]
+    data["format"] = str(data.get("format") or '')
+    for field in ("uploadtime", "views", "rating"):
+        try:
+            data[field] = int(data.get(field) or 0)
+        except (TypeError, ValueError):
+            data[field] = 0
+    return data
 
 
 class Replay(commands.Cog):
+    # archived replays refresh their view count from showdown at most this often (seconds)
+    VIEWS_REFRESH_INTERVAL = 600
+    # seconds between updates of the queue position shown while a replay waits to be saved
+    QUEUE_UPDATE_INTERVAL = 3
+    # replays whose viewer (parsed turns, turn embeds and headers) is kept ready, the only in memory cache of them
+    VIEWER_CACHE_SIZE = 32
+    # a click waits this long (seconds) for its replay before deferring, discord wants an answer within 3
+    CLICK_DEFER_AFTER = 2
+
     def __init__(self, bot):
         self.bot = bot
-
-    async def save_replay_to_db(self, url: str, format_text, text1, text2):
-        formatted_url = '.com/'.join(url.split('.com/')[1:])  # scraps out https://replay.pokemonshowdown.com/
-        query = "INSERT INTO psreplays (replayid, format_text, battle_text1, battle_text2) VALUES (?, ?, ?, ?)"
-        async with self.bot.pool.acquire() as conn:
-            # yet another random encoding to split on
-            params = (formatted_url, format_text, "\n-\n-\n".join(text1), "\n-\n-\n".join(text2))
-            await conn.execute(query, params)
-            await conn.commit()
-
-    async def get_replay_from_db(self, url: str):
+        self.viewers: OrderedDict[str, ReplayViewer] = OrderedDict()
+        self.views_checked: dict[str, float] = {}
+        self.background_tasks: set[asyncio.Task] = set()
+        self.uncompactable: set[str] = set()  # old format rows which failed to convert
+
+    async def save_replay_to_db(self, replay_id: str, format_text, text1, text2):
+        turns = await self.bot.parse_pool.run(encode_turns, text1, text2)
+        # OR IGNORE, a replay only ever has one archived copy
+        query = "INSERT OR IGNORE INTO psreplays (replayid, format_text, turns) VALUES (?, ?, ?)"
+        # write-behind, committed along with whatever else is being saved right now
+        self.bot.archive.write(query, (replay_id, format_text, turns))
+
+    async def get_replay_from_db(self, replay_id: str):
         """
         psreplays table
-        replayid  format_text  battle_text1  battle_text2  sc_img  gen_img
+        replayid  format_text  battle_text1  battle_text2  turns
+        battle_text1/2 are the sentinel joined turn texts of rows not yet converted to the compact turns blob
+        Returns format_text, turn texts, turn texts of the second viewpoint or None
         """
-        formatted_url = '.com/'.join(url.split('.com/')[1:])  # scraps out https://replay.pokemonshowdown.com/
-        # get from database, or return None
-        query = "SELECT format_text, battle_text1, battle_text2 FROM psreplays WHERE replayid = ?"
-        async with self.bot.pool.acquire() as conn:
-            async with conn.execute(query, (formatted_url,)) as cursor:
-                row = await cursor.fetchone()
-                return row
+        query = "SELECT format_text, battle_text1, battle_text2, turns FROM psreplays WHERE replayid = ?"
+        with self.bot.metrics.span("archive_read"):
+            async with self.bot.archive.read() as conn:
+                async with conn.execute(query, (replay_id,)) as cursor:
+                    row = await cursor.fetchone()
+        if row is None:
+            self.bot.metrics.count("archive_miss")
+            return None
+        self.bot.metrics.count("archive_hit")
+        format_text, battle_text1, battle_text2, turns = row
+        if turns is not None:
+            return format_text, *decode_turns(turns)
+        turn_texts, turn_texts2 = legacy_split(battle_text1, battle_text2)
+        # the row reads fine as it is, converting it is left to the background
+        if replay_id not in self.uncompactable:
+            task = asyncio.create_task(self.compact_replay_row(replay_id, turn_texts, turn_texts2))
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+        return format_text, turn_texts, turn_texts2
+
+    async def compact_replay_row(self, replay_id: str, text1, text2):
+        """converts a row saved in the old format, rows which can't be are left as they are"""
+        try:
+            turns = await self.bot.parse_pool.run(encode_turns, text1, text2)
+        except Exception as e:  # e.g. viewpoints with different turn counts, not tried again until a restart
+            print(f"{replay_id}: can't be converted to the compact format, {e!r}")
+            self.uncompactable.add(replay_id)
+            return
+        query = "UPDATE psreplays SET turns = ?, battle_text1 = NULL, battle_text2 = NULL WHERE replayid = ?"
+        self.bot.archive.write(query, (turns, replay_id))
+
+    async def save_replay_meta(self, replay_id: str, battle_data: dict):
+        """replays can't change once uploaded, so the .json only ever needs fetching once (bar the views)"""
+        query = """
+        INSERT OR REPLACE INTO psreplay_meta (replayid, p1, p2, format, rating, uploadtime, views, views_checked)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        try:
+            p1, p2 = battle_data["players"]
+            params = (
+                replay_id, p1, p2, battle_data["format"], int(battle_data.get("rating") or 0),
+                int(battle_data.get("uploadtime") or 0), int(battle_data.get("views") or 0), time.time(),
+            )
+        except (KeyError, TypeError, ValueError) as e:  # the .json gets fetched again next time instead
+            print(f"{replay_id}: not saving its metadata, {e!r}")
+            return
+        self.bot.archive.write(query, params)
 
-    @taskcache(ttl=100)
-    async def fetch_replay(self, url: str):
-        page = await self.bot.browser.new_page()
+    async def get_replay_meta(self, replay_id: str):
+        """
+        psreplay_meta table
+        replayid  p1  p2  format  rating  uploadtime  views  views_checked
+        Returns the row shaped like showdown's .json, or None for replays archived before it existed
+        """
+        query = "SELECT p1, p2, format, rating, uploadtime, views, views_checked FROM psreplay_meta WHERE replayid = ?"
+        async with self.bot.archive.read() as conn:
+            async with conn.execute(query, (replay_id,)) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        p1, p2, battle_format, rating, upload_time, views, views_checked = row
+        # views_checked survives restarts, so the refresh rate limit does too
+        self.views_checked.setdefault(replay_id, views_checked)
+        return {"players": [p1, p2], "format": battle_format, "rating": rating, "uploadtime": upload_time, "views": views}
+
+    async def refresh_views(self, replay_id: str, url: str):
         try:
-            await page.goto(url=url)
+            # only the view count is needed, so an unchanged replay doesn't have to be downloaded again
+            status, data = await self.bot.showdown.get_json(url + '.json', metadata_only=True)
+            if status != HTTPStatus.OK:
+                return
+            views = data["views"]
+            self.bot.archive.write(
+                "UPDATE psreplay_meta SET views = ?, views_checked = ? WHERE replayid = ?", (views, time.time(), replay_id)
+            )
+        except Exception as e:  # only the view count is stale then
+            print(e)
+
+    def schedule_views_refresh(self, replay_id: str, url: str):
+        """refreshes the view count in the background, at most once every VIEWS_REFRESH_INTERVAL per replay"""
+        now = time.time()
+        if now - self.views_checked.get(replay_id, float('-inf')) < self.VIEWS_REFRESH_INTERVAL:
+            return
+        self.views_checked[replay_id] = now
+        task = asyncio.create_task(self.refresh_views(replay_id, url))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def fetch_battle_logs(self, url: str) -> tuple[str, str]:
+        """the battle log html of the replay page from both viewpoints, after skipping to the end"""
+        async with self.bot.browser_pool.page() as page:
+            # the log is filled in by the client scripts, no need to wait for every subresource
+            with self.bot.metrics.span("goto"):
+                await page.goto(url=url, wait_until="domcontentloaded")
             skip = page.get_by_role("button", name="Skip to end")
             await skip.click()
             battle_log = page.get_by_role("log")
-            html_log = await battle_log.inner_html()
+            with self.bot.metrics.span("inner_html"):
+                html_log = await battle_log.inner_html()
             viewpoint = page.get_by_role("button", name="viewpoint")
             await viewpoint.click()
             battle_log2 = page.get_by_role("log")
-            html_log2 = await battle_log2.inner_html()
+            with self.bot.metrics.span("inner_html2"):
+                html_log2 = await battle_log2.inner_html()
+        return html_log, html_log2
+
+    @taskcache(ttl=100, maxsize=64)
+    async def fetch_replay(self, url: str):
+        try:
+            html_log, html_log2 = await self.fetch_battle_logs(url)
         except PlaywrightTimeoutError:
-            await page.close()
             return PlaywrightTimeoutError
         except Exception as e:
             print(e)
-            await page.close()
             return
-        await page.close()
-        return html_battle_parser(html_log), html_battle_parser(html_log2)
+        # both viewpoints go to the parser pool as one job
+        with self.bot.metrics.span("html_parse"):
+            return await self.bot.parse_pool.run(html_battle_views, html_log, html_log2)
+
+    async def fetch_battle_data(self, url: str) -> dict:
+        try:
+            with self.bot.metrics.span("json_fetch"):
+                status, data = await self.bot.showdown.get_json(url + '.json')
+        except aiohttp.InvalidURL:
+            raise ReplayLoadError('Please provide a valid replay link.')
+        except ShowdownUnavailable as e:
+            print(e)
+            raise ReplayLoadError('Showdown is not responding right now, please try again in a bit.')
+        except ShowdownBadResponse as e:
+            print(e)
+            raise ReplayLoadError('Showdown sent back something other than the replay, please try again later.')
+        except Exception as e:
+            # todo: customised error for replays with invalid password
+            print(e)
+            raise ReplayLoadError('An error occurred, please ensure the provided url is valid.')
+        if status != HTTPStatus.OK:
+            raise ReplayLoadError('I could not access the url..')
+        return clean_battle_data(data)
+
+    @taskcache(ttl=0)  # single flight, concurrent calls for one replay share a run and nothing is kept after it
+    async def load_replay(self, replay_id: str) -> tuple[dict, ParsedReplay]:
+        """
+        Metadata, archive lookup, render and save of a replay.
+        However many people ask for the same replay at once, this only happens once for all of them.
+        Anything that has to go to showdown waits for its turn on the fetch scheduler,
+        as whoever current_requester says is asking.
+        """
+        url = self.bot.showdown.replay_url(replay_id)
+        # archived replays are served without asking showdown
+        battle_data = await self.get_replay_meta(replay_id)
+        if battle_data is not None:
+            self.schedule_views_refresh(replay_id, url)
+        # the parsed turns of a replay are kept in its cached viewer
+        viewer = self.viewers.get(replay_id)
+        parsed = viewer.replay if viewer is not None else None
+        self.bot.metrics.count("parsed_miss" if parsed is None else "parsed_hit")
+        battle_texts = await self.get_replay_from_db(replay_id) if parsed is None else None
+
+        if battle_data is None or (parsed is None and battle_texts is None):
+            queued = time.perf_counter()
+            try:
+                async with self.bot.fetch_scheduler.turn(replay_id):
+                    self.bot.metrics.observe("queue_wait", time.perf_counter() - queued)
+                    if battle_data is None:
+                        battle_data = await self.fetch_battle_data(url)
+                    if parsed is None and battle_texts is None:
+                        battle_texts = await self.render_replay(replay_id, url, battle_data)
+            except SchedulerFull:
+                raise ReplayLoadError('Tyranitar is busy saving a lot of replays right now, please try again in a minute.')
+            if "log" in battle_data:
+                # fetched from showdown, which also lazily fills in rows archived before the metadata was kept
+                await self.save_replay_meta(replay_id, battle_data)
+        if parsed is None:
+            parsed = ParsedReplay(replay_id, *battle_texts)
+        return battle_data, parsed
+
+    async def render_replay(self, replay_id: str, url: str, battle_data: dict):
+        """renders a replay which isn't archived yet and archives it, returns format_text, turn texts, turn texts2"""
+        with self.bot.metrics.span("render"):
+            render_queue = self.bot.render_queue
+            if render_queue is not None and render_queue.connected:
+                return await self.render_in_worker(replay_id, url, battle_data)
+            return await self.render_locally(replay_id, url, battle_data)
+
+    async def render_in_worker(self, replay_id: str, url: str, battle_data: dict):
+        """has a render worker process render the replay, then archives the turns it sends back"""
+        try:
+            reply = await self.bot.render_queue.render({
+                "replay_id": replay_id, "url": url, "battle_data": battle_data, "from_log": self.bot.render_from_log
+            })
+        except RenderWorkerError as e:
+            print(e)
+            raise ReplayLoadError('An error occurred, I was unable to open the replay site properly. Please report it to Intenzi.')
+        self.bot.metrics.observe("worker_queue_wait", reply["waited"])
+        # the worker's own spans of the job (goto, inner_html, parsers, ...)
+        for name, seconds in reply.get("spans", {}).items():
+            self.bot.metrics.observe(name, seconds)
+        if reply["type"] != "done":
+            raise ReplayLoadError(reply["message"])
+        await self.archive_rendered(replay_id, battle_data, reply["format_text"], reply["texts"], reply["texts2"])
+        return reply["format_text"], reply["texts"], reply["texts2"]
+
+    async def render_locally(self, replay_id: str, url: str, battle_data: dict):
+        """render_replay in this process"""
+        format_text, turn_texts, turn_texts2 = await self.render_turns(url, battle_data)
+        await self.archive_rendered(replay_id, battle_data, format_text, turn_texts, turn_texts2)
+        return format_text, turn_texts, turn_texts2
+
+    async def render_turns(self, url: str, battle_data: dict):
+        """
+        format_text, turn texts and turn texts2 of a replay from the replay page,
+        or from its log when bot.render_from_log is on (falling back to the page for logs it can't render)
+        """
+        res = None
+        if self.bot.render_from_log:
+            try:
+                # no browser needed when the protocol log can be rendered directly
+                with self.bot.metrics.span("log_parse"):
+                    res = await self.bot.parse_pool.run(log_battle_parser, battle_data["log"])
+            except (KeyError, UnsupportedLogLine) as e:
+                print(e)
+        if res is None:
+            res = await self.fetch_replay(url)
+        if res == PlaywrightTimeoutError:
+            raise ReplayLoadError('Replay website timed out! Please redo the command.')
+        elif not res:
+            raise ReplayLoadError('An error occurred, I was unable to open the replay site properly. Please report it to Intenzi.')
+        format_text, turn_texts = res[0]
+        format_text2, turn_texts2 = res[1]
+        return format_text, turn_texts, turn_texts2
+
+    async def archive_rendered(self, replay_id: str, battle_data: dict, format_text, turn_texts, turn_texts2):
+        """saves a newly rendered replay along with its search index and analytics"""
+        await self.save_replay_to_db(replay_id, format_text, turn_texts, turn_texts2)
+        index_replay(self.bot.archive, replay_id, battle_data["players"], battle_data["format"], turn_texts)
+        with self.bot.metrics.span("analyse"):
+            analytics = await self.bot.parse_pool.run(analyse_replay, turn_texts)
+        store_analytics(self.bot.archive, replay_id, analytics)
+
+    def waiting_message(self, replay_id: str) -> str:
+        message = '<a:loading_blue:1222017888769151018> Please wait while tyranitar saves the replay..'
+        queued = self.bot.fetch_scheduler.position(replay_id)
+        if queued is not None:
+            position, eta = queued
+            message += f' (#{position} in the queue, about {max(1, round(eta))}s)'
+        return message
 
     @commands.hybrid_command()
     @slash.describe(
@@ -401,63 +521,147 @@ class Replay(commands.Cog):
         # The ps replay viewer should act as an archive of ps replays
         # while also being able to give users on discord a lazier way to watch the replay
 
-        if not url.startswith('https://replay.pokemonshowdown.com/'):
+        replay_id = parse_replay_id(url)
+        if replay_id is None:
             return await ctx.send('Please enter a valid showdown replay link.', ephemeral=True)
-        if url.endswith(('.json', '.log')):
-            url = url[:url.rfind('.')]
+        url = replay_url(replay_id)
+
+        m = None
+        requester = Requester(ctx.author.id, ctx.guild.id if ctx.guild else None, Priority.INTERACTIVE)
+        current_requester.set(requester)  # picked up by the load task
+        # shielded, someone else's command may be waiting on the same load
+        task = self.load_replay(replay_id)
+        done, _ = await asyncio.wait({task}, timeout=1)
+        if not done:  # not in the archive, it has to be rendered
+            # it may have been queued by an ingest or in the background, the user waiting on it goes first now
+            self.bot.fetch_scheduler.promote(replay_id, requester)
+            m = await ctx.send(self.waiting_message(replay_id))
+            while not done:
+                done, _ = await asyncio.wait({task}, timeout=self.QUEUE_UPDATE_INTERVAL)
+                content = self.waiting_message(replay_id)
+                if not done and content != m.content:
+                    try:
+                        m = await m.edit(content=content)
+                    except discord.HTTPException as e:
+                        print(e)
         try:
-            async with self.bot.session.get(url + '.json') as response:
-                if response.status != HTTPStatus.OK:
-                    return await ctx.send('I could not access the url..', ephemeral=True)
-                battle_data = await response.json()
-                p1, p2 = battle_data["players"]
-                battle_format = battle_data["format"]
-                views = battle_data["views"]
-                upload_time = discord.utils.format_dt(datetime.fromtimestamp(int(battle_data["uploadtime"])))
-        except aiohttp.InvalidURL:
-            return await ctx.send('Please provide a valid replay link.', ephemeral=True)
+            battle_data, parsed = await asyncio.shield(task)
+        except ReplayLoadError as e:
+            return await self.load_failed(ctx, m, str(e))
+        except Exception as e:
+            print(f"Loading {replay_id} failed: {e!r}")
+            return await self.load_failed(ctx, m, 'An error occurred, I was unable to load the replay. Please report it to Intenzi.')
+        try:
+            cached = self.viewers.get(replay_id)
+            pages = cached.pages if cached is not None and cached.replay is parsed else None
+            viewer = self.add_viewer(ReplayViewer(parsed, battle_data, url, pages))
         except Exception as e:
-            # todo: customised error for replays with invalid password
             print(e)
             return await ctx.send('An error occurred, please ensure the provided url is valid.', ephemeral=True)
 
-        battle_texts = await self.get_replay_from_db(url)
-        if battle_texts is not None:
-            format_text, turn_texts, turn_texts2 = battle_texts
-            turn_texts = turn_texts.split("\n-\n-\n")
-            turn_texts2 = turn_texts2.split("\n-\n-\n")
-        else:
-            m = await ctx.send('<a:loading_blue:1222017888769151018> Please wait while tyranitar saves the replay..')
-            res = await self.fetch_replay(url)
-            if res == PlaywrightTimeoutError:
-                return await ctx.send('Replay website timed out! Please redo the command.')
-            elif not res:
-                return await ctx.send('An error occurred, I was unable to open the replay site properly. Please report it to Intenzi.')
-            else:
-                format_text, turn_texts = res[0]
-                format_text2, turn_texts2 = res[1]
-                await self.save_replay_to_db(url, format_text, turn_texts, turn_texts2)
-
-        # Parse the html file
-        winner = p1 if p1 == turn_texts[-1].splitlines()[-1].replace('**', '')[:-16] else p2
-        # Initial embed
-        emb = discord.Embed(color=discord.Color.pink(), description=format_text, url=url)
-        emb.title = f"{p1} vs. {p2}"
-        # rating
-        if battle_data.get('rating', 0):
-            emb.add_field(name="Rating", value=battle_data["rating"])
-        emb.add_field(name="Views", value=views)
-        emb.add_field(name="Uploaded", value=upload_time)
-        emb.add_field(name="Winner", value=f"||{winner}||")
+        state = ViewerState(ctx.author.id)
+        with self.bot.metrics.span("send"):
+            await ctx.send(embeds=viewer.embeds(state), view=viewer.view(state))
+        if m is not None:
+            await m.delete()
 
-        emb_2 = discord.Embed(color=discord.Color.gold())
-        emb_2.description = turn_texts[0]
-        ReplayViewerView.set_emb_img(emb_2.description, emb_2)
+    async def load_failed(self, ctx, waiting: discord.Message | None, message: str):
+        """the error takes the place of the please wait message, if there was one"""
+        if waiting is not None:
+            try:
+                return await waiting.edit(content=message)
+            except discord.HTTPException as e:
+                print(e)
+        await ctx.send(message, ephemeral=True)
+
+    def add_viewer(self, viewer: ReplayViewer) -> ReplayViewer:
+        self.viewers[viewer.replay.replay_id] = viewer
+        self.viewers.move_to_end(viewer.replay.replay_id)
+        while len(self.viewers) > self.VIEWER_CACHE_SIZE:
+            self.viewers.popitem(last=False)
+        return viewer
+
+    async def get_viewer(self, replay_id: str) -> ReplayViewer:
+        """the viewer of a replay, rebuilt from the archive if it isn't cached (e.g. after a restart)"""
+        viewer = self.viewers.get(replay_id)
+        if viewer is not None:
+            self.bot.metrics.count("viewer_hit")
+            self.viewers.move_to_end(replay_id)
+            return viewer
+        self.bot.metrics.count("viewer_miss")
+        battle_data, parsed = await self.load_replay(replay_id)
+        return self.add_viewer(ReplayViewer(parsed, battle_data, replay_url(replay_id)))
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        """the buttons and go to turn modal of every replay viewer message ever sent"""
+        if interaction.type not in (discord.InteractionType.component, discord.InteractionType.modal_submit):
+            return
+        custom_id = (interaction.data or {}).get("custom_id", '')
+        if not custom_id.startswith(VIEWER_ID_PREFIX) or interaction.message is None:
+            return
+        try:
+            action, state = ViewerState.from_custom_id(custom_id)
+        except (TypeError, ValueError):  # not one of ours
+            return
+        if interaction.user.id != state.user_id:
+            return await interaction.response.send_message("Open your own viewer with /replay to look through this replay!", ephemeral=True)
+        replay_id = viewer_replay_id(interaction.message)
+        if replay_id is None:
+            return
+        with self.bot.metrics.span("button_callback"):
+            await self.handle_click(interaction, replay_id, action, state)
 
-        view = ReplayViewerView(ctx.author.id, turn_texts, turn_texts2, [], format_text, battle_format, theme, p1, p2)
-        await ctx.send(embeds=[emb, emb_2], view=view)
-        if battle_texts is None:
-            await m.delete()
+    async def handle_click(self, interaction: discord.Interaction, replay_id: str, action: str, state: ViewerState):
+        if action == "goto" and interaction.type is discord.InteractionType.component:
+            viewer = self.viewers.get(replay_id)
+            await interaction.response.send_modal(GoToTurnModal(state, viewer.total_turns if viewer else None))
+            return
+
+        current_requester.set(Requester(interaction.user.id, interaction.guild_id, Priority.INTERACTIVE))
+        task = asyncio.ensure_future(self.get_viewer(replay_id))
+        done, _ = await asyncio.wait({task}, timeout=self.CLICK_DEFER_AFTER)
+        if not done:  # not loaded since the bot started, and not quick to load either
+            await interaction.response.defer()
+        try:
+            viewer = await task
+        except ReplayLoadError as e:
+            return await self.click_error(interaction, str(e))
+        except Exception as e:
+            print(e)
+            return await self.click_error(interaction, 'An error occurred, I was unable to load this replay again.')
+        state = viewer.clamp(state)
+
+        if action == "previous":
+            state = viewer.step(state, -1)
+        elif action == "next":
+            state = viewer.step(state, 1)
+        elif action == "first":
+            state = viewer.go_to_turn(state, 0)
+        elif action == "last":
+            state = viewer.go_to_turn(state, viewer.total_turns)
+        elif action == "swap":
+            state = viewer.swap_perspective(state)
+        elif action == "goto":
+            turn = modal_value(interaction, "turn").strip()
+            if not turn.isdigit():
+                return await self.click_error(interaction, "Please enter a valid turn number..")
+            turn = int(turn)
+            if turn not in range(viewer.total_turns+1):
+                return await self.click_error(interaction, f"Please enter a number only between 0 to {viewer.total_turns}")
+            state = viewer.go_to_turn(state, turn)
+
+        if interaction.response.is_done():
+            await interaction.edit_original_response(embeds=viewer.embeds(state), view=viewer.view(state))
+        else:
+            await interaction.response.edit_message(embeds=viewer.embeds(state), view=viewer.view(state))
+
+    @staticmethod
+    async def click_error(interaction: discord.Interaction, message: str):
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
 
 
 async def setup(bot):
@@ -0,0 +1,110 @@
+"""
+Where the time goes: latency of every stage of loading and showing a replay, cache hit rates and event loop lag
+
+@author Intenzi
+@license MIT
+"""
+import discord
+from discord.ext import commands
+
+from Helpers.lazy_browser import process_tree_rss
+
+
+def percent(rate) -> str:
+    return "-" if rate is None else f"{rate:.0%}"
+
+
+class Stats(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    def gauges(self) -> dict:
+        """current values of everything that isn't a histogram or counter, for the text export"""
+        bot = self.bot
+        gauges = {
+            "event_loop_lag_seconds": bot.loop_monitor.last_lag,
+            "event_loop_recent_max_lag_seconds": bot.loop_monitor.recent_max_lag,
+            "archive_queue_depth": bot.archive.queue_depth,
+            "scheduler_running": bot.fetch_scheduler.running,
+            "scheduler_queue_depth": bot.fetch_scheduler.queue_depth,
+            "browser_running": int(bot.browser_pool.running),
+            "showdown_circuit_open": int(bot.showdown.circuit_open),
+            "showdown_retries": bot.showdown.retried,
+            "showdown_circuit_opens": bot.showdown.circuit_opens,
+            "rss_bytes": process_tree_rss(),
+        }
+        if bot.render_queue is not None:
+            gauges["render_workers_connected"] = bot.render_queue.connected
+            gauges["render_queue_depth"] = bot.render_queue.queue_depth
+        return gauges
+
+    @commands.hybrid_command()
+    @commands.is_owner()
+    async def stats(self, ctx):
+        """Latency percentiles, hit rates and load of the bot"""
+        bot = self.bot
+        metrics = bot.metrics
+        lines = [f"{'stage':<18}{'n':>6}{'p50':>8}{'p95':>8}{'p99':>8}"]
+        for name, (count, p50, p95, p99) in metrics.summary().items():
+            lines.append(f"{name:<18}{count:>6}{p50 * 1000:>8.0f}{p95 * 1000:>8.0f}{p99 * 1000:>8.0f}")
+        emb = discord.Embed(
+            title="Tyranitar stats", color=discord.Color.gold(),
+            description="Latency in ms\n```\n" + '\n'.join(lines) + "\n```",
+        )
+
+        load_cache = bot.get_cog("Replay").load_replay.cache_info()
+        emb.add_field(name="Hit rates", value='\n'.join((
+            f"Viewers: {percent(metrics.rate('viewer_hit', 'viewer_miss'))}",
+            f"Parsed replays: {percent(metrics.rate('parsed_hit', 'parsed_miss'))}",
+            f"Archive: {percent(metrics.rate('archive_hit', 'archive_miss'))}",
+            f"Loads shared: {load_cache['coalesced']}",
+        )))
+        monitor = bot.loop_monitor
+        emb.add_field(name="Event loop lag", value=(
+            f"Now: {monitor.last_lag * 1000:.0f}ms\nRecent worst: {monitor.recent_max_lag * 1000:.0f}ms\n"
+            f"Worst: {monitor.max_lag * 1000:.0f}ms"
+        ))
+        scheduler = bot.fetch_scheduler.stats()
+        emb.add_field(name="Fetch scheduler", value=(
+            f"Running: {scheduler['running']}\nQueued: {scheduler['queue_depth']}\n"
+            f"Rejected: {scheduler['rejected']}\nAverage wait: {scheduler['average_wait']:.1f}s"
+        ))
+        archive = bot.archive.stats()
+        emb.add_field(name="Archive writer", value=(
+            f"Queued: {archive['queue_depth']}\nWritten: {archive['written']}\n"
+            f"Failed: {archive['failed']}\nAverage batch: {archive['average_batch']:.1f}"
+        ))
+        showdown = bot.showdown.stats()
+        emb.add_field(name="Showdown", value=(
+            f"Requests: {showdown['requests']}\nRetried: {showdown['retried']}\nNot modified: {showdown['not_modified']}\n"
+            f"Bad responses: {showdown['bad_responses']}\n"
+            f"Circuit: {'open' if showdown['circuit_open'] else 'closed'} (opened {showdown['circuit_opens']}x, "
+            f"{showdown['short_circuited']} turned away)"
+        ))
+        browser = bot.browser_pool.stats()
+        emb.add_field(name="Browser", value=(
+            f"Running: {'yes' if browser['running'] else 'no'}\nLaunches: {browser['launches']}\nCrashes: {browser['crashes']}"
+        ))
+        if bot.render_queue is not None:
+            workers = bot.render_queue.stats()
+            emb.add_field(name="Render workers", value=(
+                f"Connected: {workers['connected']}/{workers['workers']}\nQueued: {workers['queue_depth']}\n"
+                f"Done: {workers['done']}\nFailed: {workers['failed']}\nRestarts: {workers['restarts']}"
+            ))
+        prefetch = bot.get_cog("Prefetch")
+        if prefetch is not None:
+            counters = metrics.counters
+            emb.add_field(name="Prefetch", value=(
+                f"Pending: {prefetch.queue.qsize()}\nDone: {counters.get('prefetch_done', 0)}\n"
+                f"Already archived: {counters.get('prefetch_archived', 0)}\nFailed: {counters.get('prefetch_failed', 0)}\n"
+                f"Limited/dropped: {counters.get('prefetch_rate_limited', 0)}/{counters.get('prefetch_dropped', 0)}"
+            ))
+        rss = process_tree_rss()
+        if rss is not None:
+            emb.set_footer(text=f"Memory (with workers and chromium): {rss / 2 ** 20:.0f} MiB")
+        await ctx.send(embed=emb)
+
+
+async def setup(bot):
+    await bot.add_cog(Stats(bot))
+    print("Stats Cog loaded")
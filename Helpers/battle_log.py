@@ -0,0 +1,659 @@
+"""
+Renders the Pokémon Showdown battle protocol (the `.log` of a replay) into the same html
+that the replay page's battle log element holds after "Skip to end".
+
+The output is meant to be fed into html_battle_parser, so only the html the replay page would produce
+has to be reproduced here and the discord formatting stays in one place.
+Anything this module doesn't know how to render raises UnsupportedLogLine,
+callers are expected to fall back to the browser in that case rather than risk showing a different text.
+"""
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+from Helpers.html_parser import html_battle_parser
+
+__all__ = ("UnsupportedLogLine", "render_log_html", "log_battle_parser")
+
+
+class UnsupportedLogLine(Exception):
+    """raised when a protocol line can't be rendered exactly like the replay page would"""
+    def __init__(self, line: str):
+        # args kept as just the line so the error survives pickling back from a worker process
+        super().__init__(line)
+        self.line = line
+
+    def __str__(self):
+        return f"Unsupported battle log line: {self.line}"
+
+
+# the replay page wraps the log with these, html_battle_parser strips them out again
+LOG_PREFIX = '<div class="battle-options"></div><div class="inner message-log">'
+LOG_SUFFIX = '</div><div class="inner-preempt message-log"></div>'
+SPACER = '<div class="spacer battle-history"><br></div>'
+
+# protocol lines which never show up in the rendered battle log (or only as chat which gets filtered anyway)
+IGNORED = {
+    '', 't:', 'gametype', 'gen', 'player', 'teamsize', 'clearpoke', 'poke', 'teampreview', 'seed',
+    'j', 'J', 'join', 'l', 'L', 'leave', 'n', 'N', 'name', 'c', 'chat', 'c:', 'inactive', 'inactiveoff',
+    'request', 'debug', 'title', 'timestamp', 'badge', '-anim', '-nothing', '-mustrecharge', 'split', 'sentchoice',
+}
+
+STAT_NAMES = {
+    'atk': "Attack", 'def': "Defense", 'spa': "Sp. Atk", 'spd': "Sp. Def", 'spe': "Speed",
+    'accuracy': "accuracy", 'evasion': "evasiveness",
+}
+
+# templates keyed by effect id, only effects whose text is known for certain are present
+EFFECT_TEXT = {
+    'brn': {
+        'start': "  [POKEMON] was burned!",
+        'end': "  [POKEMON]'s burn was healed.",
+        'damage': "  [POKEMON] was hurt by its burn!",
+    },
+    'par': {
+        'start': "  [POKEMON] is paralyzed! It may be unable to move!",
+        'end': "  [POKEMON] was cured of paralysis.",
+        'cant': "[POKEMON] is paralyzed! It can't move!",
+    },
+    'psn': {
+        'start': "  [POKEMON] was poisoned!",
+        'end': "  [POKEMON] was cured of its poisoning.",
+        'damage': "  [POKEMON] was hurt by poison!",
+    },
+    'tox': {
+        'start': "  [POKEMON] was badly poisoned!",
+        'end': "  [POKEMON] was cured of its poisoning.",
+        'damage': "  [POKEMON] was hurt by poison!",
+    },
+    'slp': {
+        'start': "  [POKEMON] fell asleep!",
+        'startFromRest': "  [POKEMON] slept and became healthy!",
+        'end': "  [POKEMON] woke up!",
+        'cant': "[POKEMON] is fast asleep.",
+    },
+    'frz': {
+        'start': "  [POKEMON] was frozen solid!",
+        'end': "  [POKEMON] thawed out!",
+        'cant': "[POKEMON] is frozen solid!",
+    },
+    'flinch': {'cant': "[POKEMON] flinched and couldn't move!"},
+    'recharge': {'cant': "[POKEMON] must recharge!"},
+    'confusion': {
+        'start': "  [POKEMON] became confused!",
+        'end': "  [POKEMON] snapped out of its confusion!",
+        'activate': "  [POKEMON] is confused!",
+        'damage': "  It hurt itself in its confusion!",
+    },
+    'leechseed': {
+        'start': "  [POKEMON] was seeded!",
+        'end': "  [POKEMON] was freed from Leech Seed!",
+        'damage': "  [POKEMON]'s health is sapped by Leech Seed!",
+    },
+    'substitute': {
+        'start': "  [POKEMON] put in a substitute!",
+        'end': "  [POKEMON]'s substitute faded!",
+        'activate': "  The substitute took damage for [POKEMON]!",
+    },
+    'protect': {
+        'start': "  [POKEMON] protected itself!",
+        'activate': "  [POKEMON] protected itself!",
+    },
+    'recoil': {'damage': "  [POKEMON] is damaged by the recoil!"},
+    'sandstorm': {
+        'start': "  A sandstorm kicked up!",
+        'end': "  The sandstorm subsided.",
+        'upkeep': "  (The sandstorm is raging.)",
+        'damage': "  [POKEMON] is buffeted by the sandstorm!",
+    },
+    'raindance': {
+        'start': "  It started to rain!",
+        'end': "  The rain stopped.",
+        'upkeep': "  (Rain continues to fall!)",
+    },
+    'sunnyday': {
+        'start': "  The sunlight turned harsh!",
+        'end': "  The harsh sunlight faded.",
+        'upkeep': "  (The sunlight is strong!)",
+    },
+    'hail': {
+        'start': "  It started to hail!",
+        'end': "  The hail stopped.",
+        'upkeep': "  (The hail is crashing down.)",
+        'damage': "  [POKEMON] is buffeted by the hail!",
+    },
+    'spikes': {
+        'start': "  Spikes were scattered on the ground all around [TEAM]!",
+        'end': "  The spikes disappeared from the ground around [TEAM]!",
+        'damage': "  [POKEMON] is hurt by the spikes!",
+    },
+    'reflect': {
+        'start': "  Reflect made [TEAM] stronger against physical moves!",
+        'end': "  [TEAM]'s Reflect wore off!",
+    },
+    'lightscreen': {
+        'start': "  Light Screen made [TEAM] stronger against special moves!",
+        'end': "  [TEAM]'s Light Screen wore off!",
+    },
+    'leftovers': {'heal': "  [POKEMON] restored a little HP using its Leftovers!"},
+    'drain': {'heal': "  [SOURCE] had its energy drained!"},
+    'wish': {'heal': "  [NICKNAME]'s wish came true!"},
+    'ingrain': {'heal': "  [POKEMON] absorbed nutrients with its roots!"},
+    'levitate': {},
+}
+
+DEFAULT_TEXT = {
+    'startBattle': "Battle started between [TRAINER] and [TRAINER]!",
+    'winBattle': "**[TRAINER]** won the battle!",
+    'tieBattle': "Tie between [TRAINER] and [TRAINER]!",
+    'opposingPokemon': "the opposing [NICKNAME]",
+    'team': "your team",
+    'opposingTeam': "the opposing team",
+    'turn': "== Turn [NUMBER] ==",
+    'switchIn': "[TRAINER] sent out [FULLNAME]!",
+    'switchInOwn': "Go! [FULLNAME]!",
+    'switchOut': "[TRAINER] withdrew [NICKNAME]!",
+    'switchOutOwn': "[NICKNAME], come back!",
+    'drag': "[FULLNAME] was dragged out!",
+    'faint': "[POKEMON] fainted!",
+    'move': "[POKEMON] used **[MOVE]**!",
+    'abilityActivation': "  [[POKEMON]'s [ABILITY]]",
+    'cant': "[POKEMON] can't use [MOVE]!",
+    'cantNoMove': "[POKEMON] can't move!",
+    'fail': "  But it failed!",
+    'damage': "  ([POKEMON] was hurt!)",
+    'damagePercentage': "  ([POKEMON] lost [PERCENTAGE] of its health!)",
+    'damageFromPartialTrapping': "  [POKEMON] is hurt by [MOVE]!",
+    'heal': "  [POKEMON] had its HP restored.",
+    'healFromEffect': "  [POKEMON] restored HP using its [EFFECT]!",
+    'boost': "  [POKEMON]'s [STAT] rose!",
+    'boost2': "  [POKEMON]'s [STAT] rose sharply!",
+    'boost3': "  [POKEMON]'s [STAT] rose drastically!",
+    'boost0': "  [POKEMON]'s [STAT] won't go any higher!",
+    'unboost': "  [POKEMON]'s [STAT] fell!",
+    'unboost2': "  [POKEMON]'s [STAT] fell harshly!",
+    'unboost3': "  [POKEMON]'s [STAT] fell severely!",
+    'unboost0': "  [POKEMON]'s [STAT] won't go any lower!",
+    'clearAllBoost': "  All stat changes were eliminated!",
+    'superEffective': "  It's super effective!",
+    'resisted': "  It's not very effective...",
+    'crit': "  A critical hit!",
+    'immune': "  It doesn't affect [POKEMON]...",
+    'immuneOHKO': "  [POKEMON] is unaffected!",
+    'miss': "  [POKEMON] avoided the attack!",
+    'missNoPokemon': "  [SOURCE]'s attack missed!",
+    'noTarget': "  But there was no target...",
+    'ohko': "  It's a one-hit KO!",
+    'hitCount': "  The Pokémon was hit [NUMBER] times!",
+    'hitCountSingular': "  The Pokémon was hit 1 time!",
+}
+
+# "the opposing" and friends get capitalised when they begin a line
+LOWERCASE_PATTERN = re.compile(r'((?:^|\n)(?:  |  \(|  \[)?)(the opposing team|the opposing |your team)')
+BOLD_PATTERN = re.compile(r'\*\*(.*)\*\*')
+ABBR_PATTERN = re.compile(r'\|\|([^|]*)\|\|([^|]*)\|\|')
+KWARG_PATTERN = re.compile(r'^\[([a-z]+)\](.*)$')
+PARTIAL_TRAPPING = {'bind', 'wrap', 'firespin', 'clamp', 'whirlpool', 'sandtomb'}
+
+
+def to_id(text: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+def effect_name(effect: str) -> str:
+    """strips the move:/item:/ability: prefix"""
+    if effect.startswith(('item:', 'move:')):
+        effect = effect[5:]
+    elif effect.startswith('ability:'):
+        effect = effect[8:]
+    return effect.strip()
+
+
+def effect_id(effect: str | None) -> str:
+    return to_id(effect_name(effect)) if effect else ''
+
+
+def escape_text(text: str) -> str:
+    """escapes text the way the browser serializes text nodes for inner_html"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\u00a0', '&nbsp;')
+
+
+def js_percentage(ratio: float, precision: int) -> str:
+    """mirrors the client's Pokemon.getFormattedRange for a single value"""
+    percentage = abs(ratio * 100)
+    if percentage == int(percentage):
+        return f"{int(percentage)}%"
+    # toFixed rounds half away from zero on the exact binary value
+    return str(Decimal(percentage).quantize(Decimal(1).scaleb(-precision), rounding=ROUND_HALF_UP)) + '%'
+
+
+def split_line(line: str):
+    """splits a protocol line into its positional args and [keyword] args"""
+    parts = line[1:].split('|')
+    args = [parts[0]]
+    kwargs = {}
+    for part in parts[1:]:
+        match = KWARG_PATTERN.match(part)
+        if match:
+            kwargs[match.group(1)] = match.group(2).strip() or True
+        else:
+            args.append(part)
+    return args, kwargs
+
+
+class BattleLogRenderer:
+    """Replays the protocol from one player's viewpoint and collects the battle log html"""
+    def __init__(self, perspective: str = 'p1'):
+        self.perspective = perspective
+        self.trainers = {}
+        self.active = {}  # side -> ident of the active pokemon
+        self.hp = {}  # ident -> (hp, max hp)
+        self.weather = None
+        self.section = ''
+        self.html = []
+
+    # text helpers
+
+    def own(self, side: str) -> bool:
+        return side == self.perspective
+
+    def trainer(self, side: str) -> str:
+        return self.trainers.get(side, side)
+
+    def pokemon(self, ident: str | None) -> str:
+        if not ident:
+            return ''
+        side, _, name = ident.partition(': ')
+        name = name.strip()
+        if self.own(side[:2]):
+            return name
+        return DEFAULT_TEXT['opposingPokemon'].replace('[NICKNAME]', name)
+
+    def team(self, side: str) -> str:
+        return DEFAULT_TEXT['team'] if self.own(side[:2]) else DEFAULT_TEXT['opposingTeam']
+
+    @staticmethod
+    def full_name(ident: str, details: str) -> str:
+        name = ident.partition(': ')[2].strip()
+        species = details.split(',')[0]
+        if name == species:
+            return f"**{name}**"
+        return f"{name} (**{species}**)"
+
+    def ability(self, effect, holder) -> str:
+        """prefix line shown when an ability causes the message"""
+        if not effect or not effect.startswith('ability:'):
+            return ''
+        return DEFAULT_TEXT['abilityActivation'].replace('[POKEMON]', self.pokemon(holder)).replace('[ABILITY]', effect_name(effect)) + '\n'
+
+    @staticmethod
+    def template(kind: str, effect, raw: str, default: bool = True) -> str | None:
+        """effect specific template, otherwise the default one"""
+        eid = effect_id(effect)
+        if eid:
+            if eid not in EFFECT_TEXT:
+                raise UnsupportedLogLine(raw)
+            if kind in EFFECT_TEXT[eid]:
+                return EFFECT_TEXT[eid][kind]
+        return DEFAULT_TEXT[kind] if default else None
+
+    # hp bookkeeping
+
+    @staticmethod
+    def ident_key(ident: str) -> str:
+        # p1a: Name -> p1: Name
+        side, _, name = ident.partition(': ')
+        return side[:2] + ': ' + name.strip()
+
+    def set_hp(self, ident: str, hp_text: str, raw: str):
+        hp = hp_text.split(' ')[0]
+        key = self.ident_key(ident)
+        if '/' in hp:
+            num, den = hp.split('/')
+            self.hp[key] = (int(num), int(den))
+        elif hp == '0':
+            self.hp[key] = (0, self.hp.get(key, (0, 100))[1])
+        else:
+            raise UnsupportedLogLine(raw)
+
+    def damage_info(self, ident: str, hp_text: str, raw: str) -> str:
+        key = self.ident_key(ident)
+        old_hp, old_max = self.hp.get(key, (1, 0))
+        self.set_hp(ident, hp_text, raw)
+        new_hp, max_hp = self.hp[key]
+        if max_hp == 48:  # pixel based hp is displayed as a range
+            raise UnsupportedLogLine(raw)
+        if old_max == 0:
+            old_hp, old_max = max_hp, max_hp
+        old_num = (int(max_hp * old_hp / old_max) or 1) if old_hp else 0
+        delta = new_hp - old_num
+        info = js_percentage(delta / max_hp, 0 if max_hp == 100 else 1)
+        if max_hp != 100:
+            hover = ('−' if delta < 0 else '') + f"{abs(delta)}/{max_hp}"
+            info = f"||{hover}||{info}||"
+        return info
+
+    # output
+
+    @staticmethod
+    def line_section(cmd: str, args, kwargs) -> str:
+        if cmd in ('done', 'turn'):
+            return 'break'
+        if cmd in ('move', 'cant', 'switch', 'drag', 'upkeep', 'start'):
+            return 'major'
+        if cmd in ('switchout', 'faint'):
+            return 'preMajor'
+        if cmd == '-damage':
+            return 'major' if effect_id(kwargs.get('from')) == 'confusion' else 'postMajor'
+        if cmd == '-activate':
+            return 'preMajor' if effect_id(args[2] if len(args) > 2 else '') in ('confusion', 'attract') else 'postMajor'
+        return 'postMajor' if cmd.startswith('-') else ''
+
+    def section_break(self, cmd: str, args, kwargs) -> bool:
+        previous = self.section
+        current = self.line_section(cmd, args, kwargs)
+        if not current:
+            return False
+        self.section = current
+        if current == 'break':
+            return previous != 'break'
+        if current in ('preMajor', 'major'):
+            return previous in ('postMajor', 'major')
+        return False
+
+    def add_div(self, class_name: str, inner: str):
+        self.html.append(f'<div class="{class_name}">{inner}</div>')
+
+    def message(self, text: str):
+        lines = []
+        for line in text.split('\n'):
+            line = escape_text(line)
+            line = BOLD_PATTERN.sub(r'<strong>\1</strong>', line, count=1)
+            line = ABBR_PATTERN.sub(lambda m: f'<abbr title="{m.group(1).replace(chr(34), "&quot;")}">{m.group(2)}</abbr>', line, count=1)
+            if line.startswith('  '):
+                line = '<small>' + line.strip() + '</small>'
+            lines.append(line)
+        self.add_div('battle-history', '<br>'.join(lines))
+
+    def log(self, cmd: str, args, kwargs, text: str):
+        prefix = '\n' if self.section_break(cmd, args, kwargs) else ''
+        text = LOWERCASE_PATTERN.sub(lambda m: m.group(1) + m.group(2)[0].upper() + m.group(2)[1:], text)
+        line = prefix + text
+        if line:
+            self.message(line)
+
+    # protocol
+
+    def feed(self, line: str):
+        if not line.startswith('|'):
+            return
+        try:
+            self.feed_line(line)
+        except UnsupportedLogLine:
+            raise
+        except Exception as e:  # malformed or cut short (|-boost|p1a: X|atk), the replay page knows what to make of it
+            raise UnsupportedLogLine(line) from e
+
+    def feed_line(self, line: str):
+        args, kwargs = split_line(line)
+        cmd = args[0]
+        if cmd in IGNORED or kwargs.get('silent'):
+            if cmd == 'player' and len(args) > 2 and args[2]:
+                self.trainers[args[1]] = args[2]
+            return
+        handler = getattr(self, 'on_' + cmd.lstrip('-').replace('-', '_'), None)
+        if handler is None:
+            raise UnsupportedLogLine(line)
+        handler(cmd, args, kwargs, line)
+
+    def on_tier(self, cmd, args, kwargs, raw):
+        self.add_div('', f'<small>Format:</small> <br><strong>{escape_text(args[1])}</strong>')
+
+    def on_rated(self, cmd, args, kwargs, raw):
+        self.add_div('rated', f'<strong>{escape_text(args[1] if len(args) > 1 and args[1] else "Rated battle")}</strong>')
+
+    def on_rule(self, cmd, args, kwargs, raw):
+        name, _, desc = args[1].partition(': ')
+        self.add_div('', f'<small><em>{escape_text(name)}{":" if desc else ""}</em> {escape_text(desc)}</small>')
+
+    def on_raw(self, cmd, args, kwargs, raw):
+        # shown as chat which gets stripped, unless nested divs would confuse the chat filter
+        if '<div' in raw:
+            raise UnsupportedLogLine(raw)
+        self.add_div('chat', '|'.join(args[1:]))
+
+    def on_upkeep(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, '')
+
+    def on_turn(self, cmd, args, kwargs, raw):
+        self.section_break(cmd, args, kwargs)
+        turn = DEFAULT_TEXT['turn'].replace('[NUMBER]', args[1])[2:-2].strip()
+        self.html.append(SPACER)
+        self.html.append(f'<h2 class="battle-history">{escape_text(turn)}</h2>')
+
+    def on_switch(self, cmd, args, kwargs, raw):
+        ident, details = args[1], args[2]
+        side = ident[:2]
+        previous = self.active.get(side)
+        if cmd == 'switch' and previous is not None and self.hp.get(self.ident_key(previous), (1, 1))[0] > 0:
+            if kwargs.get('from'):
+                raise UnsupportedLogLine(raw)
+            template = DEFAULT_TEXT['switchOutOwn' if self.own(side) else 'switchOut']
+            name = previous.partition(': ')[2].strip()
+            self.log('switchout', [cmd, previous], {}, template.replace('[TRAINER]', self.trainer(side)).replace('[NICKNAME]', name))
+        self.active[side] = ident
+        if len(args) > 3:
+            self.set_hp(ident, args[3], raw)
+        if cmd == 'drag':
+            template = DEFAULT_TEXT['drag']
+        else:
+            template = DEFAULT_TEXT['switchInOwn' if self.own(side) else 'switchIn']
+        self.log(cmd, args, kwargs, template.replace('[TRAINER]', self.trainer(side)).replace('[FULLNAME]', self.full_name(ident, details)))
+
+    on_drag = on_switch
+
+    def on_faint(self, cmd, args, kwargs, raw):
+        key = self.ident_key(args[1])
+        self.hp[key] = (0, self.hp.get(key, (0, 100))[1])
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['faint'].replace('[POKEMON]', self.pokemon(args[1])))
+
+    def on_move(self, cmd, args, kwargs, raw):
+        if effect_id(kwargs.get('from')) in ('magiccoat', 'snatch') or kwargs.get('zeffect'):
+            raise UnsupportedLogLine(raw)
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['move'].replace('[POKEMON]', self.pokemon(args[1])).replace('[MOVE]', args[2]))
+
+    def on_cant(self, cmd, args, kwargs, raw):
+        pokemon, effect = args[1], args[2]
+        move = args[3] if len(args) > 3 else ''
+        template = self.template('cant', effect, raw, default=False)
+        if template is None:
+            template = DEFAULT_TEXT['cant' if move else 'cantNoMove']
+        text = self.ability(effect, kwargs.get('of') or pokemon) + template.replace('[POKEMON]', self.pokemon(pokemon)).replace('[MOVE]', move)
+        self.log(cmd, args, kwargs, text)
+
+    def on_win(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['winBattle'].replace('[TRAINER]', args[1]))
+
+    def on_tie(self, cmd, args, kwargs, raw):
+        text = DEFAULT_TEXT['tieBattle'].replace('[TRAINER]', self.trainer('p1'), 1).replace('[TRAINER]', self.trainer('p2'), 1)
+        self.log(cmd, args, kwargs, text)
+
+    def on_damage(self, cmd, args, kwargs, raw):
+        pokemon = args[1]
+        source = kwargs.get('from')
+        info = self.damage_info(pokemon, args[2], raw)
+        line1 = self.ability(source, kwargs.get('of') or pokemon)
+        if line1:
+            raise UnsupportedLogLine(raw)
+        if not source:
+            text = DEFAULT_TEXT['damagePercentage'].replace('[PERCENTAGE]', info)
+        elif kwargs.get('partiallytrapped') or effect_id(source) in PARTIAL_TRAPPING:
+            text = DEFAULT_TEXT['damageFromPartialTrapping'].replace('[MOVE]', effect_name(source))
+        else:
+            text = self.template('damage', source, raw)
+        self.log(cmd, args, kwargs, text.replace('[POKEMON]', self.pokemon(pokemon)))
+
+    def on_heal(self, cmd, args, kwargs, raw):
+        pokemon = args[1]
+        source = kwargs.get('from')
+        self.set_hp(pokemon, args[2], raw)
+        line1 = self.ability(source, pokemon)
+        sid = effect_id(source)
+        if source and not line1 and sid not in EFFECT_TEXT and not sid.endswith('berry'):
+            raise UnsupportedLogLine(raw)
+        template = EFFECT_TEXT.get(sid, {}).get('heal')
+        if template is not None:
+            text = template.replace('[SOURCE]', self.pokemon(kwargs.get('of'))).replace('[NICKNAME]', kwargs.get('wisher') or '')
+        elif source and not line1:
+            text = DEFAULT_TEXT['healFromEffect'].replace('[EFFECT]', effect_name(source))
+        else:
+            text = DEFAULT_TEXT['heal']
+        self.log(cmd, args, kwargs, line1 + text.replace('[POKEMON]', self.pokemon(pokemon)))
+
+    def on_sethp(self, cmd, args, kwargs, raw):
+        raise UnsupportedLogLine(raw)
+
+    def on_status(self, cmd, args, kwargs, raw):
+        pokemon, status = args[1], args[2]
+        source = kwargs.get('from')
+        if source and effect_id(source) != 'rest' and not source.startswith('ability:'):
+            raise UnsupportedLogLine(raw)
+        line1 = self.ability(source, kwargs.get('of') or pokemon)
+        kind = 'startFromRest' if effect_id(source) == 'rest' else 'start'
+        self.log(cmd, args, kwargs, line1 + self.template(kind, status, raw).replace('[POKEMON]', self.pokemon(pokemon)))
+
+    def on_curestatus(self, cmd, args, kwargs, raw):
+        pokemon, status = args[1], args[2]
+        if kwargs.get('from') or kwargs.get('thaw'):
+            raise UnsupportedLogLine(raw)
+        self.log(cmd, args, kwargs, self.template('end', status, raw).replace('[POKEMON]', self.pokemon(pokemon)))
+
+    def on_boost(self, cmd, args, kwargs, raw):
+        pokemon, stat, amount = args[1], args[2], int(args[3])
+        source = kwargs.get('from')
+        if stat not in STAT_NAMES or (source and not source.startswith('ability:')):
+            raise UnsupportedLogLine(raw)
+        kind = cmd[1:]
+        if amount >= 3:
+            kind += '3'
+        elif amount >= 2:
+            kind += '2'
+        elif amount == 0:
+            kind += '0'
+        text = self.ability(source, kwargs.get('of') or pokemon) + DEFAULT_TEXT[kind]
+        self.log(cmd, args, kwargs, text.replace('[POKEMON]', self.pokemon(pokemon)).replace('[STAT]', STAT_NAMES[stat]))
+
+    on_unboost = on_boost
+
+    def on_clearallboost(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['clearAllBoost'])
+
+    def on_weather(self, cmd, args, kwargs, raw):
+        weather = args[1]
+        if not weather or weather == 'none':
+            text = self.template('end', self.weather, raw) if self.weather else None
+            if text is None:
+                raise UnsupportedLogLine(raw)
+            self.weather = None
+        elif kwargs.get('upkeep'):
+            text = self.template('upkeep', weather, raw)
+        else:
+            text = self.ability(kwargs.get('from'), kwargs.get('of')) + self.template('start', weather, raw)
+            self.weather = weather
+        self.log(cmd, args, kwargs, text)
+
+    def on_sidestart(self, cmd, args, kwargs, raw):
+        kind = 'start' if cmd == '-sidestart' else 'end'
+        template = self.template(kind, args[2], raw, default=False)
+        if template is None:
+            raise UnsupportedLogLine(raw)
+        self.log(cmd, args, kwargs, template.replace('[TEAM]', self.team(args[1])))
+
+    on_sideend = on_sidestart
+
+    def on_start(self, cmd, args, kwargs, raw):  # handles both |start and |-start
+        if cmd == 'start':
+            text = DEFAULT_TEXT['startBattle'].replace('[TRAINER]', self.trainer('p1'), 1).replace('[TRAINER]', self.trainer('p2'), 1)
+            return self.log(cmd, args, kwargs, text)
+        self.volatile('start', cmd, args, kwargs, raw)
+
+    def on_end(self, cmd, args, kwargs, raw):
+        self.volatile('end', cmd, args, kwargs, raw)
+
+    def on_activate(self, cmd, args, kwargs, raw):
+        self.volatile('activate', cmd, args, kwargs, raw)
+
+    def on_singleturn(self, cmd, args, kwargs, raw):
+        self.volatile('start', cmd, args, kwargs, raw)
+
+    def volatile(self, kind: str, cmd, args, kwargs, raw):
+        pokemon, effect = args[1], args[2]
+        if any(key in kwargs for key in ('from', 'of', 'already', 'fatigue', 'damage', 'block', 'upkeep')):
+            raise UnsupportedLogLine(raw)
+        template = self.template(kind, effect, raw, default=False)
+        if template is None:
+            raise UnsupportedLogLine(raw)
+        self.log(cmd, args, kwargs, template.replace('[POKEMON]', self.pokemon(pokemon)))
+
+    def on_crit(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['crit'])
+
+    def on_supereffective(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['superEffective'])
+
+    def on_resisted(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['resisted'])
+
+    def on_immune(self, cmd, args, kwargs, raw):
+        pokemon = args[1]
+        source = kwargs.get('from')
+        if source and effect_id(source) != 'levitate':
+            raise UnsupportedLogLine(raw)
+        text = self.ability(source, kwargs.get('of') or pokemon) + DEFAULT_TEXT['immuneOHKO' if kwargs.get('ohko') else 'immune']
+        self.log(cmd, args, kwargs, text.replace('[POKEMON]', self.pokemon(pokemon)))
+
+    def on_miss(self, cmd, args, kwargs, raw):
+        if kwargs.get('from'):
+            raise UnsupportedLogLine(raw)
+        if len(args) > 2 and args[2]:
+            text = DEFAULT_TEXT['miss'].replace('[POKEMON]', self.pokemon(args[2]))
+        else:
+            text = DEFAULT_TEXT['missNoPokemon'].replace('[SOURCE]', self.pokemon(args[1]))
+        self.log(cmd, args, kwargs, text)
+
+    def on_fail(self, cmd, args, kwargs, raw):
+        if len(args) > 2 or kwargs.get('from'):
+            raise UnsupportedLogLine(raw)
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['fail'])
+
+    def on_notarget(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['noTarget'])
+
+    def on_ohko(self, cmd, args, kwargs, raw):
+        self.log(cmd, args, kwargs, DEFAULT_TEXT['ohko'])
+
+    def on_hitcount(self, cmd, args, kwargs, raw):
+        count = args[2]
+        text = DEFAULT_TEXT['hitCountSingular'] if count == '1' else DEFAULT_TEXT['hitCount'].replace('[NUMBER]', count)
+        self.log(cmd, args, kwargs, text)
+
+    def render(self) -> str:
+        return LOG_PREFIX + ''.join(self.html) + LOG_SUFFIX
+
+
+def render_log_html(log: str, perspective: str = 'p1') -> str:
+    """
+    Renders a replay's protocol log into the html of its battle log from the given player's viewpoint
+    Raises UnsupportedLogLine for anything which can't be reproduced faithfully
+    """
+    renderer = BattleLogRenderer(perspective)
+    for line in log.splitlines():
+        renderer.feed(line)
+    return renderer.render()
+
+
+def log_battle_parser(log_text: str):
+    """
+    Handles the parsing of the .log protocol text for both viewpoints, giving the same output as html_battle_parser
+    Raises UnsupportedLogLine when the replay page is needed for rendering
+    """
+    return html_battle_parser(render_log_html(log_text, 'p1')), html_battle_parser(render_log_html(log_text, 'p2'))
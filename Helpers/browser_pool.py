@@ -0,0 +1,160 @@
+"""
+A small pool of warm playwright pages so replay renders don't each spin up a new page,
+and so only a bounded number of renders run at once while the rest wait their turn.
+
+Pages only ever read the battle log text, so everything else the replay page would download
+(sprites, backgrounds, music, fonts, analytics) is aborted before it hits the network.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from playwright.async_api import Browser, BrowserContext, Page, Route
+
+__all__ = ("BrowserPool", "DEFAULT_ALLOWED_RESOURCES", "DEFAULT_BLOCKED_HOSTS")
+
+
+# the battle log only needs the page, the client scripts and the requests those scripts make for the log
+DEFAULT_ALLOWED_RESOURCES = frozenset({"document", "script", "xhr", "fetch"})
+# scripts which aren't needed to play the replay back
+DEFAULT_BLOCKED_HOSTS = ("google-analytics.com", "googletagmanager.com", "googlesyndication.com", "doubleclick.net")
+
+
+class _PooledPage:
+    __slots__ = ("context", "page", "uses", "crashed")
+
+    def __init__(self, context: BrowserContext, page: Page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.crashed = False
+        page.on("crash", self._on_crash)
+
+    def _on_crash(self, _):
+        self.crashed = True
+
+    @property
+    def usable(self) -> bool:
+        return not self.crashed and not self.page.is_closed()
+
+    async def close(self):
+        try:
+            await self.context.close()
+        except Exception as e:  # the browser may already be gone
+            print(e)
+
+
+class BrowserPool:
+    """
+    Hands out pages from a fixed number of isolated browser contexts.
+
+    At most `size` pages are in use at any time, other callers queue on a semaphore.
+    A page is thrown away and replaced after `max_uses` renders, or as soon as it crashes or its user errors.
+    Requests whose resource type isn't in `allowed_resources`, or which go to `blocked_hosts`, are aborted.
+    Pass `allowed_resources=None` to let everything through.
+    """
+    def __init__(
+        self,
+        browser: Browser,
+        size: int = 3,
+        max_uses: int = 50,
+        allowed_resources: frozenset[str] | None = DEFAULT_ALLOWED_RESOURCES,
+        blocked_hosts: tuple[str, ...] = DEFAULT_BLOCKED_HOSTS,
+    ):
+        self.browser = browser
+        self.size = size
+        self.max_uses = max_uses
+        self.allowed_resources = allowed_resources
+        self.blocked_hosts = blocked_hosts
+        self._idle: asyncio.Queue[_PooledPage] = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(size)
+        # stats
+        self.queue_depth = 0
+        self.in_use = 0
+        self.acquired = 0
+        self.recycled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.blocked_requests = 0
+
+    async def _filter_request(self, route: Route):
+        request = route.request
+        host = request.url.split('/')[2] if '://' in request.url else ''
+        if request.resource_type not in self.allowed_resources or host.endswith(self.blocked_hosts):
+            self.blocked_requests += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_page(self) -> _PooledPage:
+        context = await self.browser.new_context()
+        if self.allowed_resources is not None:
+            await context.route("**/*", self._filter_request)
+        page = await context.new_page()
+        return _PooledPage(context, page)
+
+    async def start(self):
+        """warms up every slot of the pool"""
+        for _ in range(self.size - self._idle.qsize()):
+            self._idle.put_nowait(await self._new_page())
+
+    async def close(self):
+        while not self._idle.empty():
+            await self._idle.get_nowait().close()
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """waits for a free slot and lends out its page"""
+        self.queue_depth += 1
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queue_depth -= 1
+        waited = time.perf_counter() - start
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+        self.in_use += 1
+        try:
+            slot = self._idle.get_nowait() if not self._idle.empty() else await self._new_page()
+            if not slot.usable:
+                await slot.close()
+                slot = await self._new_page()
+            slot.uses += 1
+            try:
+                yield slot.page
+            except BaseException:
+                # unknown page state, don't hand it to anyone else
+                slot.crashed = True
+                raise
+            finally:
+                if slot.usable and slot.uses < self.max_uses:
+                    self._idle.put_nowait(slot)
+                else:
+                    self.recycled += 1
+                    await slot.close()
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "idle": self._idle.qsize(),
+            "queue_depth": self.queue_depth,
+            "acquired": self.acquired,
+            "recycled": self.recycled,
+            "average_wait": self.average_wait,
+            "max_wait": self.max_wait,
+            "blocked_requests": self.blocked_requests,
+        }
@@ -0,0 +1,271 @@
+"""
+Decides whose replay gets fetched and rendered next, so one person pasting twenty links can't starve everyone else.
+
+Work is queued per priority (people waiting on a command first, bulk ingests next, background work last)
+and within a priority it's round robin between users, so each user gets one turn per round.
+There's a global cap on how much runs at once, plus a cap per user and per guild within each priority,
+so a user's own prefetches or ingest never hold up the commands they're waiting on.
+When the queue is too deep, interactive requests are turned away and everything else waits to be queued.
+
+Who's asking is carried by the `current_requester` context variable, set by the command before it starts
+loading a replay. Tasks copy the context they're created in, so it reaches the load without being passed along.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import AsyncIterator, Hashable, NamedTuple
+
+__all__ = ("FetchScheduler", "SchedulerFull", "Priority", "Requester", "current_requester")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # someone is waiting on a command
+    BULK = 1  # ingest jobs
+    BACKGROUND = 2  # nobody is waiting on it
+
+
+class Requester(NamedTuple):
+    user_id: int | None
+    guild_id: int | None
+    priority: Priority
+
+
+current_requester: ContextVar[Requester] = ContextVar(
+    "current_requester", default=Requester(None, None, Priority.BACKGROUND)
+)
+
+
+class SchedulerFull(Exception):
+    """the queue is too deep to take an interactive request, or too much of it is already this user's"""
+
+
+def _decrement(counter: Counter, key):
+    counter[key] -= 1
+    if not counter[key]:  # so users who've come and gone don't pile up
+        del counter[key]
+
+
+class _Job:
+    __slots__ = ("key", "requester", "future", "queued_at")
+
+    def __init__(self, key: Hashable, requester: Requester, future: asyncio.Future):
+        self.key = key
+        self.requester = requester
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class FetchScheduler:
+    """
+    At most `concurrency` jobs run at once, `reserved` of those slots are only ever used by interactive jobs.
+    A user runs at most `per_user` jobs of each priority at once and a guild `per_guild`
+    (work without a guild, e.g. DMs, isn't capped).
+    Past `max_queue` queued jobs in total, or `max_user_queue` of a single user's at the same priority,
+    interactive requests raise SchedulerFull while bulk and background ones wait until there's room.
+
+    `async with scheduler.turn(key, requester):` waits for the job's turn and holds its slot for the block.
+    """
+    def __init__(
+        self,
+        concurrency: int = 4,
+        reserved: int = 1,
+        per_user: int = 2,
+        per_guild: int = 3,
+        max_queue: int = 100,
+        max_user_queue: int = 5,
+    ):
+        self.concurrency = concurrency
+        self.reserved = reserved
+        self.per_user = per_user
+        self.per_guild = per_guild
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        # per priority, each user's queued jobs in round robin order
+        self._queues: list[OrderedDict[int | None, deque[_Job]]] = [OrderedDict() for _ in Priority]
+        self._queued: dict[Hashable, _Job] = {}
+        # the per user and per guild counts are kept per priority, (user_id or guild_id, priority)
+        self._queued_users: Counter = Counter()
+        self._running_users: Counter = Counter()
+        self._running_guilds: Counter = Counter()
+        self._room = asyncio.Event()  # set whenever a job leaves the queue, wakes deferred jobs
+        self.running = 0
+        self.running_background = 0  # bulk and background
+        # running average of how long a job holds its slot (seconds), for the queue ETA
+        self.average_duration = 5.0
+        # stats
+        self.scheduled = 0
+        self.started = 0
+        self.rejected = 0
+        self.deferred = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queued)
+
+    def _full(self, requester: Requester) -> bool:
+        return (
+            len(self._queued) >= self.max_queue
+            or self._queued_users[requester.user_id, requester.priority] >= self.max_user_queue
+        )
+
+    def _can_start(self, requester: Requester) -> bool:
+        if requester.priority != Priority.INTERACTIVE and self.running_background >= self.concurrency - self.reserved:
+            return False
+        if self._running_users[requester.user_id, requester.priority] >= self.per_user:
+            return False
+        return requester.guild_id is None or self._running_guilds[requester.guild_id, requester.priority] < self.per_guild
+
+    def _next_job(self) -> _Job | None:
+        for queues in self._queues:
+            for user_id, jobs in queues.items():
+                if not self._can_start(jobs[0].requester):
+                    continue
+                job = jobs.popleft()
+                if jobs:
+                    queues.move_to_end(user_id)  # their next job waits for everyone else's turn
+                else:
+                    del queues[user_id]
+                return job
+        return None
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            self._unqueue(job)
+            requester = job.requester
+            self.running += 1
+            if requester.priority != Priority.INTERACTIVE:
+                self.running_background += 1
+            self._running_users[requester.user_id, requester.priority] += 1
+            if requester.guild_id is not None:
+                self._running_guilds[requester.guild_id, requester.priority] += 1
+            self.started += 1
+            waited = time.perf_counter() - job.queued_at
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            job.future.set_result(None)
+
+    def _unqueue(self, job: _Job):
+        if self._queued.get(job.key) is job:
+            del self._queued[job.key]
+        _decrement(self._queued_users, (job.requester.user_id, job.requester.priority))
+        self._room.set()
+
+    def _remove(self, job: _Job):
+        """drops a job which gave up waiting"""
+        queues = self._queues[job.requester.priority]
+        jobs = queues.get(job.requester.user_id)
+        if jobs is None or job not in jobs:
+            return
+        jobs.remove(job)
+        if not jobs:
+            del queues[job.requester.user_id]
+        self._unqueue(job)
+
+    def _release(self, job: _Job, duration: float | None):
+        requester = job.requester
+        self.running -= 1
+        if requester.priority != Priority.INTERACTIVE:
+            self.running_background -= 1
+        _decrement(self._running_users, (requester.user_id, requester.priority))
+        if requester.guild_id is not None:
+            _decrement(self._running_guilds, (requester.guild_id, requester.priority))
+        if duration is not None:
+            self.average_duration = 0.8 * self.average_duration + 0.2 * duration
+        self._dispatch()
+
+    async def _wait_for_room(self, requester: Requester):
+        if not self._full(requester):
+            return
+        if requester.priority == Priority.INTERACTIVE:
+            self.rejected += 1
+            raise SchedulerFull
+        self.deferred += 1
+        while self._full(requester):
+            self._room.clear()
+            await self._room.wait()
+
+    @asynccontextmanager
+    async def turn(self, key: Hashable, requester: Requester | None = None) -> AsyncIterator[None]:
+        """waits until the job is allowed to run, requester defaults to current_requester"""
+        requester = requester or current_requester.get()
+        await self._wait_for_room(requester)
+        job = _Job(key, requester, asyncio.get_running_loop().create_future())
+        self._queues[requester.priority].setdefault(requester.user_id, deque()).append(job)
+        self._queued[key] = job
+        self._queued_users[requester.user_id, requester.priority] += 1
+        self.scheduled += 1
+        self._dispatch()
+        try:
+            await job.future
+        except BaseException:
+            if job.future.done() and not job.future.cancelled():  # got its turn just as it was cancelled
+                self._release(job, None)
+            else:
+                self._remove(job)
+            raise
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(job, time.perf_counter() - start)
+
+    def promote(self, key: Hashable, requester: Requester):
+        """someone more urgent is now waiting on a queued job, e.g. a user asking for a replay being bulk ingested"""
+        job = self._queued.get(key)
+        if job is None or requester.priority >= job.requester.priority:
+            return
+        self._remove(job)
+        job.requester = requester
+        self._queues[requester.priority].setdefault(requester.user_id, deque()).append(job)
+        self._queued[key] = job
+        self._queued_users[requester.user_id, requester.priority] += 1
+        self._dispatch()
+
+    def position(self, key: Hashable) -> tuple[int, float] | None:
+        """
+        Place in the queue (1 is next) and the estimated seconds until the job starts,
+        or None when it isn't queued. Assumes the caps don't get in the way, so it's an estimate.
+        """
+        job = self._queued.get(key)
+        if job is None:
+            return None
+        requester = job.requester
+        ahead = 0
+        for queues in self._queues[:requester.priority]:
+            ahead += sum(map(len, queues.values()))
+        queues = self._queues[requester.priority]
+        # job's round of the round robin, each user before this one in the rotation goes once more
+        round_ = queues[requester.user_id].index(job)
+        before = True
+        for user_id, jobs in queues.items():
+            if user_id == requester.user_id:
+                before = False
+                ahead += round_
+            else:
+                ahead += min(len(jobs), round_ + 1 if before else round_)
+        slots = self.concurrency if requester.priority == Priority.INTERACTIVE else self.concurrency - self.reserved
+        eta = math.ceil((ahead + 1) / max(1, slots)) * self.average_duration
+        return ahead + 1, eta
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "scheduled": self.scheduled,
+            "rejected": self.rejected,
+            "deferred": self.deferred,
+            "average_wait": self.total_wait / self.started if self.started else 0.0,
+            "max_wait": self.max_wait,
+            "average_duration": self.average_duration,
+        }
@@ -0,0 +1,71 @@
+"""
+Parsing of the replay page's html battle log (not same as .log file) into discord formatted turn texts
+
+html_battle_parser is a cascade of regex passes over the whole log. A single pass tokenizer giving the same output
+was tried and was about half as fast on 20, 80 and 400 turn logs (Scripts/html_parser_bench.py), every pass here
+being one scan in C, so the cascade stays.
+"""
+import re
+
+__all__ = ("html_battle_parser", "html_battle_views")
+
+
+def html_battle_parser(html_text: str) -> tuple[str, list[str]]:
+    """
+    Handles the parsing of html battle text log (not same as .log file)
+    """
+    # Filtering at the very beginning
+    text = html_text.replace('<div class="battle-options"></div><div class="inner message-log">', '').replace('</div><div class="inner-preempt message-log"></div>', '')
+    # Now there are four types of divs at the topmost layer, along with h2 tags
+    # - chat
+    # - spacer
+    # - battle-history
+    # with the fourth being no class divs that are present at turn 0 stating the format and clauses,mods
+    # Take out all chat from the replays  i.e. joins/leaves/timers/chat messages
+    chat_pattern = re.compile(r'<div class="chat.*?">.*?</div>')
+    text = chat_pattern.sub('', text)
+    # Replace all of the spacer divs with a newline
+    text = text.replace('<div class="spacer battle-history"><br></div>', '\n')
+    # Find strong tags
+    strong_pattern = re.compile(r'<strong.*?>(.*?)</strong>')
+    text = strong_pattern.sub(lambda match: f'**{match.group(1)}**', text)
+    # clear out any small tags
+    text = text.replace('<small>', '').replace('</small>', '')
+    # Now separate the battle-history and no class divs
+    battle_start_index = text.find('<div class="battle-history">')
+    format_text = text[:battle_start_index]
+    text = text[battle_start_index:]
+    # Find em tags
+    em_pattern = re.compile(r'<em.*?>(.*?)</em>')
+    text = em_pattern.sub(lambda match: f'_{match.group(1)}_', text)
+    format_text = em_pattern.sub(lambda match: f'- {match.group(1)}', format_text)
+    # Replace all of the divs with a newline
+    div_pattern = re.compile(r'<div.*?>(.*?)</div>')
+    text = div_pattern.sub(lambda match: f'{match.group(1)}\n', text)
+    format_text = div_pattern.sub(lambda match: f'{match.group(1)}\n', format_text)
+    # replace br tags where it doesn't end at a newline with newline
+    br_pattern = re.compile(r'<br>(?!\n)')
+    text = br_pattern.sub('\n', text)
+    # now clear out any remaining br tags
+    text = text.replace('<br>', '')
+    format_text = format_text.replace('<br>', '')
+    # Replace all of the abbr in battle text with percentages
+    abbr_pattern = re.compile(r'<abbr.*?>(.*?)</abbr>')
+    text = abbr_pattern.sub(lambda match: f'{match.group(1)}', text)
+    # finally lets parse out the h2 tags for turn text
+    h2_pattern = re.compile(r'<h2.*?>(.*?)</h2>')
+    # ^-^  random encoding to split on
+    text = h2_pattern.sub(lambda match: f'^-^ ## ```{match.group(1)}```', text)
+
+    # now separate the text into a list of turns, while keeping the turn text
+    text = [t.strip() for t in text.split('^-^ ')]
+    # don't forget turn 0
+    text[0] = "## ```Turn 0```\n" + text[0]
+    # some formatting
+    format_text = format_text.strip()
+    return format_text, text
+
+
+def html_battle_views(html_log: str, html_log2: str):
+    """parses both viewpoints of a replay in one go, so they make a single trip to a worker"""
+    return html_battle_parser(html_log), html_battle_parser(html_log2)
@@ -0,0 +1,195 @@
+"""
+Chromium only while it's needed. Most replays are rendered from their log or served from the archive,
+so the browser is launched on the first render that needs it and closed again once it's been idle for a while.
+
+Also has the resident memory of the bot's process tree, chromium and the playwright driver being its children.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Mapping
+
+from playwright.async_api import Browser, Page, Playwright, async_playwright
+
+from Helpers.browser_pool import BrowserPool
+
+__all__ = ("LazyBrowser", "process_tree_rss")
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as file:
+                children.extend(map(int, file.read().split()))
+    except OSError:  # gone already
+        pass
+    return children
+
+
+def _rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree_rss(pid: int | None = None) -> int | None:
+    """bytes of memory held by a process and all of its descendants, None where /proc isn't available (not linux)"""
+    if not os.path.exists("/proc/self/status"):
+        return None
+    pid = pid or os.getpid()
+    total = 0
+    pending = [pid]
+    while pending:
+        pid = pending.pop()
+        total += _rss(pid)
+        pending.extend(_children(pid))
+    return total
+
+
+class LazyBrowser:
+    """
+    Stands in for a BrowserPool, launching playwright, chromium and the pool on the first page() call.
+
+    Concurrent first calls wait on one launch. Once no page has been lent out for `idle_timeout` seconds,
+    everything is closed again (None keeps it running). If chromium crashes it is relaunched on the next call.
+    `pool_size` and `max_uses` go to the BrowserPool, `launch_options` to chromium.launch().
+    """
+    def __init__(
+        self,
+        pool_size: int = 3,
+        max_uses: int = 50,
+        idle_timeout: float | None = 600,
+        launch_options: Mapping[str, Any] | None = None,
+    ):
+        self.pool_size = pool_size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.launch_options = dict(launch_options or {})
+        self.playwright: Playwright | None = None
+        self.browser: Browser | None = None
+        self.pool: BrowserPool | None = None
+        self._lock = asyncio.Lock()
+        self._idle_handle: asyncio.TimerHandle | None = None
+        self._idle_task: asyncio.Task | None = None
+        self.in_use = 0
+        # stats
+        self.launches = 0
+        self.crashes = 0
+        self.idle_closes = 0
+        self.last_launch_time = 0.0  # seconds the last launch took
+        self.running_since: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.pool is not None
+
+    def _on_disconnected(self, browser: Browser):
+        if browser is not self.browser:  # closed on purpose, or an older one
+            return
+        print("Browser disconnected, it will be relaunched when it's needed again")
+        self.crashes += 1
+        self.browser = None
+        self.pool = None
+        self.running_since = None
+
+    async def _launch(self):
+        start = time.perf_counter()
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        browser = await self.playwright.chromium.launch(**self.launch_options)
+        browser.on("disconnected", self._on_disconnected)
+        self.browser = browser
+        pool = BrowserPool(browser, size=self.pool_size, max_uses=self.max_uses)
+        await pool.start()
+        self.pool = pool
+        self.launches += 1
+        self.last_launch_time = time.perf_counter() - start
+        self.running_since = time.time()
+        print(f"Browser started in {self.last_launch_time:.1f}s")
+
+    async def _ensure_started(self) -> BrowserPool:
+        if self.pool is None:
+            async with self._lock:
+                if self.pool is None:  # someone else may have launched it while this waited
+                    await self._launch()
+        return self.pool
+
+    async def _shutdown(self):
+        """closes everything, the caller holds the lock"""
+        pool, browser, playwright = self.pool, self.browser, self.playwright
+        self.pool = self.browser = self.playwright = None
+        self.running_since = None
+        try:
+            if pool is not None:
+                await pool.close()
+            if browser is not None:
+                await browser.close()
+        except Exception as e:  # may have crashed already
+            print(e)
+        if playwright is not None:
+            await playwright.stop()
+
+    def _schedule_idle_close(self):
+        if self.idle_timeout is None or self.pool is None:
+            return
+        loop = asyncio.get_running_loop()
+        self._idle_handle = loop.call_later(self.idle_timeout, self._start_idle_close)
+
+    def _start_idle_close(self):
+        self._idle_handle = None
+        self._idle_task = asyncio.create_task(self._close_if_idle())
+
+    async def _close_if_idle(self):
+        async with self._lock:
+            if self.in_use or self.pool is None:  # picked up again in the meantime
+                return
+            await self._shutdown()
+            self.idle_closes += 1
+            print(f"Browser closed after {self.idle_timeout:.0f}s idle")
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """lends out a page of the pool, launching the browser first if it isn't running"""
+        self.in_use += 1
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        try:
+            pool = await self._ensure_started()
+            async with pool.page() as page:
+                yield page
+        finally:
+            self.in_use -= 1
+            if not self.in_use:
+                self._schedule_idle_close()
+
+    async def close(self):
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+        async with self._lock:
+            await self._shutdown()
+
+    def stats(self) -> dict:
+        stats = {
+            "running": self.running,
+            "in_use": self.in_use,
+            "launches": self.launches,
+            "crashes": self.crashes,
+            "idle_closes": self.idle_closes,
+            "last_launch_time": self.last_launch_time,
+            "uptime": time.time() - self.running_since if self.running_since else 0.0,
+            "rss": process_tree_rss(),
+        }
+        if self.pool is not None:
+            stats.update(self.pool.stats())
+        return stats
@@ -0,0 +1,47 @@
+"""
+Measures how late the event loop wakes up, anything that blocks the loop shows up here as lag
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+
+__all__ = ("LoopLagMonitor",)
+
+
+class LoopLagMonitor:
+    """Sleeps for `interval` seconds in a loop and records how much longer than that the sleep actually took"""
+    def __init__(self, interval: float = 0.5, warn_after: float = 0.25, history: int = 120):
+        self.interval = interval
+        self.warn_after = warn_after
+        self.samples: deque[float] = deque(maxlen=history)
+        self.max_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0.0)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.warn_after:
+                print(f"Event loop was blocked for {lag * 1000:.0f}ms")
+
+    @property
+    def last_lag(self) -> float:
+        return self.samples[-1] if self.samples else 0.0
+
+    @property
+    def recent_max_lag(self) -> float:
+        return max(self.samples, default=0.0)
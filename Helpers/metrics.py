@@ -0,0 +1,147 @@
+"""
+In-process latency histograms and counters, cheap enough to leave on all the time.
+
+Stages are timed with `with metrics.span("stage"):` and end up in fixed bucket histograms,
+so memory doesn't grow with traffic and percentiles are estimated from the buckets.
+Everything can optionally be served on localhost in the prometheus text format for scraping.
+"""
+from __future__ import annotations
+
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+__all__ = ("Histogram", "Metrics", "DEFAULT_BUCKETS")
+
+
+# upper bounds in seconds, roughly 1.5x apart from 0.5ms to 2 minutes
+DEFAULT_BUCKETS = tuple(round(0.0005 * 1.5 ** i, 6) for i in range(31))
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is past every bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """estimate of the q-th percentile (0-100), interpolated within its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+    """
+    Named histograms (seconds) and counters.
+
+    `export_port` serves /metrics in the prometheus text format on `export_host` once start() is called,
+    None leaves the export off.
+    """
+    def __init__(self, export_port: int | None = None, export_host: str = "127.0.0.1", prefix: str = "tyranitar"):
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+        self.export_port = export_port
+        self.export_host = export_host
+        self.prefix = prefix
+        self.started = time.time()
+        self._runner = None
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """times the block into the name's histogram, whether it finishes or raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def rate(self, hits: str, misses: str) -> float | None:
+        """share of hits among hits and misses, None before either happened"""
+        hit, miss = self.counters.get(hits, 0), self.counters.get(misses, 0)
+        return hit / (hit + miss) if hit + miss else None
+
+    def summary(self) -> dict[str, tuple[int, float, float, float]]:
+        """count, p50, p95, p99 (seconds) of every histogram"""
+        return {
+            name: (histogram.count, histogram.percentile(50), histogram.percentile(95), histogram.percentile(99))
+            for name, histogram in sorted(self.histograms.items())
+        }
+
+    def render_text(self, gauges: dict[str, float] | None = None) -> str:
+        """everything in the prometheus text format, along with any extra gauges given"""
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+        for name, value in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, value in sorted((gauges or {}).items()):
+            if value is None:
+                continue
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
+
+    async def start(self, gauges=None):
+        """starts the export if there's a port for it, `gauges` is called for extra values on every scrape"""
+        if self.export_port is None:
+            return
+        from aiohttp import web
+
+        async def handle(_):
+            return web.Response(text=self.render_text(gauges() if gauges else None), content_type="text/plain")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.export_host, self.export_port).start()
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
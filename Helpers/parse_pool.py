@@ -0,0 +1,76 @@
+"""
+Runs the cpu bound replay parsing away from the event loop,
+so a huge log being parsed doesn't hold up other commands, button callbacks or the gateway heartbeat.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+__all__ = ("ParsePool",)
+
+
+T = TypeVar("T")
+
+# where the functions handed to run() live
+_JOB_MODULES = (
+    "Helpers.battle_log",
+    "Helpers.html_parser",
+    "Helpers.replay_analytics",
+    "Helpers.replay_codec",
+    "Helpers.replay_search",
+)
+
+
+def _warm_up():
+    """imports the job modules inside a worker so the first real job doesn't pay for it"""
+    for module in _JOB_MODULES:
+        importlib.import_module(module)
+    return True
+
+
+class ParsePool:
+    """
+    Thin wrapper over either a process pool or a thread pool.
+
+    kind="process" keeps parsing off the GIL entirely, kind="thread" is lighter but only helps while
+    the parser is inside C code (the regex passes), which is most of its time.
+    Functions run through a process pool have to be importable module level functions.
+
+    Once render workers are connected (RenderQueue) the replays they render are parsed over there, so this pool
+    is left with the analytics, search indexing and turn encoding of every replay, archive backfills, and parsing
+    only for replays rendered in the bot itself while no worker is connected.
+    That's why it's kept at a couple of workers rather than one per core.
+    """
+    def __init__(self, kind: str = "process", workers: int = 2):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown pool kind {kind!r}, expected 'process' or 'thread'")
+        self.kind = kind
+        self.workers = workers
+        self.executor: Executor | None = None
+        self.submitted = 0
+
+    async def start(self):
+        if self.kind == "process":
+            # spawn instead of fork, forking a process which has live playwright/aiohttp threads isn't safe
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="replay-parser")
+        # one job per worker so each of them starts up and imports the parsers now instead of on first use
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers)))
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self.executor is None:  # not started, parse inline rather than fail
+            return func(*args)
+        self.submitted += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,247 @@
+"""
+Hands replay renders (log parsing, or chromium when the log can't be parsed) to worker processes,
+so none of that shares a process or an event loop with the gateway.
+
+The bot listens on a local socket, workers (python -m Scripts.render_worker) connect to it and take one job at a time.
+A worker sends the turn texts it rendered back, and the bot archives them like any replay it rendered itself,
+so the archive keeps its single writer. Messages are single lines of json both ways.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Any
+
+__all__ = ("RenderQueue", "RenderWorkerError", "MESSAGE_LIMIT", "read_message", "send_message")
+
+
+# battle logs of long replays easily pass asyncio's default line limit of 64KiB
+MESSAGE_LIMIT = 2 ** 24
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RenderWorkerError(Exception):
+    """a job was lost with the worker which had it, or no worker took it in time"""
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict | None:
+    """the next message, None once the other side is gone"""
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+async def send_message(writer: asyncio.StreamWriter, message: dict):
+    writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+    await writer.drain()
+
+
+class _Job:
+    __slots__ = ("id", "payload", "future", "attempts", "queued_at", "waited")
+
+    def __init__(self, job_id: int, payload: dict, future: asyncio.Future):
+        self.id = job_id
+        self.payload = payload
+        self.future = future
+        self.attempts = 0
+        self.queued_at = time.perf_counter()
+        self.waited = 0.0  # seconds until a worker took it
+
+
+class RenderQueue:
+    """
+    Job queue on `host`:`port` (0 picks a free port) plus `workers` worker processes started and restarted by it.
+
+    Workers started by hand can connect as well, they only need the port.
+    A job whose worker dies is given to another one, up to `max_attempts` times in total,
+    and one nobody has finished within `job_timeout` seconds fails.
+    render() needs at least one connected worker, check `connected` first and render locally without one.
+    """
+    def __init__(
+        self,
+        workers: int | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        job_timeout: float = 120,
+        max_attempts: int = 2,
+        worker_args: tuple[str, ...] = (),
+    ):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.host = host
+        self.port = port
+        self.job_timeout = job_timeout
+        self.max_attempts = max_attempts
+        self.worker_args = worker_args
+        self.server: asyncio.AbstractServer | None = None
+        self._jobs: asyncio.Queue[_Job] = asyncio.Queue()
+        self._ids = itertools.count()
+        self._supervisors: list[asyncio.Task] = []
+        self._processes: dict[int, asyncio.subprocess.Process] = {}
+        self._closing = False
+        self.connected = 0
+        self.busy = 0
+        # stats
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self.restarts = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port, limit=MESSAGE_LIMIT)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._supervisors = [asyncio.create_task(self._supervise(index)) for index in range(self.workers)]
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "Scripts.render_worker",
+            "--host", self.host, "--port", str(self.port), "--supervised", *self.worker_args,
+            cwd=_ROOT,
+        )
+
+    async def _supervise(self, index: int):
+        """keeps one worker process running, restarting it whenever it exits"""
+        delay = 1.0
+        while not self._closing:
+            started = time.monotonic()
+            try:
+                process = await self._spawn()
+            except OSError as e:
+                print(f"Render worker {index} could not be started: {e}")
+            else:
+                self._processes[index] = process
+                code = await process.wait()
+                self._processes.pop(index, None)
+                if self._closing:
+                    return
+                print(f"Render worker {index} exited with code {code}, restarting it")
+                self.restarts += 1
+            # back off when it keeps dying straight away
+            delay = 1.0 if time.monotonic() - started > 60 else min(delay * 2, 60.0)
+            await asyncio.sleep(delay)
+
+    def _give_back(self, job: _Job):
+        """the worker holding the job is gone"""
+        if job.future.done():
+            return
+        if job.attempts < self.max_attempts:
+            self.retried += 1
+            self._jobs.put_nowait(job)
+        else:
+            job.future.set_exception(RenderWorkerError(f"render worker died {job.attempts} times on this job"))
+
+    async def _next_job(self, reader: asyncio.StreamReader) -> _Job | None:
+        """the next job for a worker, None if the worker disconnects while it's waiting for one"""
+        get = asyncio.ensure_future(self._jobs.get())
+        # an idle worker doesn't send anything, so this only finishes once it's gone
+        gone = asyncio.ensure_future(reader.read(1))
+        await asyncio.wait({get, gone}, return_when=asyncio.FIRST_COMPLETED)
+        gone.cancel()
+        await asyncio.wait({gone})  # the reader only takes the next read once this one has let go
+        if get.done():
+            return get.result()
+        get.cancel()
+        return None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            hello = await read_message(reader)
+        except (ConnectionError, ValueError):
+            hello = None
+        if hello is None or hello.get("type") != "hello":
+            writer.close()
+            return
+        self.connected += 1
+        job = None
+        try:
+            while True:
+                job = await self._next_job(reader)
+                if job is None:
+                    return
+                if job.future.done():  # whoever asked gave up on it
+                    job = None
+                    continue
+                job.attempts += 1
+                job.waited = time.perf_counter() - job.queued_at
+                self.busy += 1
+                try:
+                    await send_message(writer, {"type": "job", "id": job.id, **job.payload})
+                    reply = await read_message(reader)
+                finally:
+                    self.busy -= 1
+                if reply is None:
+                    return
+                if not job.future.done():
+                    reply["waited"] = job.waited
+                    job.future.set_result(reply)
+                job = None
+        except (ConnectionError, ValueError) as e:
+            print(f"Render worker {hello.get('pid')} connection lost: {e}")
+        finally:
+            self.connected -= 1
+            if job is not None:
+                self._give_back(job)
+            writer.close()
+
+    async def render(self, payload: dict[str, Any]) -> dict:
+        """
+        Queues a job and returns the worker's reply, {"type": "done" | "error", "spans": ..., "waited": ...}
+        along with "format_text", "texts" and "texts2" when done or "message" on errors
+        Raises RenderWorkerError if it was lost with its workers or timed out
+        """
+        job = _Job(next(self._ids), payload, asyncio.get_running_loop().create_future())
+        self._jobs.put_nowait(job)
+        try:
+            reply = await asyncio.wait_for(asyncio.shield(job.future), self.job_timeout)
+        except asyncio.TimeoutError:
+            self.failed += 1
+            job.future.cancel()
+            raise RenderWorkerError(f"no render worker finished the job within {self.job_timeout:.0f}s")
+        except RenderWorkerError:
+            self.failed += 1
+            raise
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        if reply.get("type") == "done":
+            self.done += 1
+        else:
+            self.failed += 1
+        return reply
+
+    async def close(self):
+        self._closing = True
+        for process in self._processes.values():
+            if process.returncode is None:
+                process.terminate()
+        await asyncio.gather(*(process.wait() for process in self._processes.values()), return_exceptions=True)
+        for task in self._supervisors:
+            task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        while not self._jobs.empty():
+            job = self._jobs.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(RenderWorkerError("render queue closed"))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._jobs.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "connected": self.connected,
+            "busy": self.busy,
+            "queue_depth": self.queue_depth,
+            "done": self.done,
+            "failed": self.failed,
+            "retried": self.retried,
+            "restarts": self.restarts,
+        }
@@ -0,0 +1,210 @@
+"""
+What happened in a replay, worked out once when it's archived: both teams, every switch-in and KO by turn,
+the winner and the number of turns. /replaystats reads them back instead of rescanning the turn texts.
+
+Everything is read from p1's viewpoint of the turn texts, which both the log and the html parsers produce,
+so replays rendered either way (and ones archived before this existed) get the same analytics.
+"""
+from __future__ import annotations
+
+import re
+from typing import NamedTuple, Sequence
+
+from Helpers.replay_codec import decode_turns, legacy_split
+
+__all__ = (
+    "ReplayEvent",
+    "ReplayAnalytics",
+    "analyse_replay",
+    "replay_winner",
+    "store_analytics",
+    "get_analytics",
+    "create_analytics_queries",
+    "analytics_backfill_query",
+    "analytics_backfill_params",
+    "SWITCH",
+    "FAINT",
+    "ANALYTICS_VERSION",
+)
+
+
+SWITCH = "switch"
+FAINT = "faint"
+# kept in psreplay_summary.analysed, replays analysed by an older version are analysed again by the backfill
+# 2: winners of battles whose last turn has nothing but the win message
+ANALYTICS_VERSION = 2
+
+# the revealed team of each side, in the order they were first sent out (no team preview in gen 3)
+create_team_query = """
+CREATE TABLE IF NOT EXISTS psreplay_team (
+    replayid TEXT,
+    side INTEGER,
+    slot INTEGER,
+    species TEXT,
+    PRIMARY KEY (replayid, side, slot)
+);
+"""
+
+# switch-ins and KOs turn by turn
+create_events_query = """
+CREATE TABLE IF NOT EXISTS psreplay_events (
+    replayid TEXT,
+    seq INTEGER,
+    turn INTEGER,
+    side INTEGER,
+    kind TEXT,
+    species TEXT,
+    PRIMARY KEY (replayid, seq)
+);
+"""
+
+# one statement each, for the archive's writer
+create_analytics_queries = (
+    create_team_query,
+    "CREATE INDEX IF NOT EXISTS psreplay_team_species ON psreplay_team (species)",
+    create_events_query,
+    "CREATE INDEX IF NOT EXISTS psreplay_events_kind ON psreplay_events (kind, species)",
+    "CREATE INDEX IF NOT EXISTS psreplay_summary_winner ON psreplay_summary (winner)",
+)
+
+summary_update_query = "UPDATE psreplay_summary SET winner = ?, tie = ?, analysed = ? WHERE replayid = ?"
+team_delete_query = "DELETE FROM psreplay_team WHERE replayid = ?"
+team_query = "INSERT INTO psreplay_team (replayid, side, slot, species) VALUES (?, ?, ?, ?)"
+events_delete_query = "DELETE FROM psreplay_events WHERE replayid = ?"
+events_query = "INSERT INTO psreplay_events (replayid, seq, turn, side, kind, species) VALUES (?, ?, ?, ?, ?, ?)"
+
+# the turn's heading runs straight into its first line
+turn_header_pattern = re.compile(r'^## ```.+?```\n?')
+# p1's pokemon: "Go! **Tyranitar**!" or "Go! Ttar (**Tyranitar**)!"
+own_switch_pattern = re.compile(r'^Go! (?:(.+?) \()?\*\*(.+?)\*\*\)?!$', re.MULTILINE)
+# p2's: "Trainer sent out **Salamence**!" or "Trainer sent out Mence (**Salamence**)!"
+opposing_switch_pattern = re.compile(r'^.+? sent out (?:(.+?) \()?\*\*(.+?)\*\*\)?!$', re.MULTILINE)
+# either side, the side is worked out from whoever used the move which dragged it out
+drag_pattern = re.compile(r'^(?:(.+?) \()?\*\*(.+?)\*\*\)? was dragged out!$', re.MULTILINE)
+move_pattern = re.compile(r'^(The opposing )?.+? used \*\*.+?\*\*!$', re.MULTILINE)
+faint_pattern = re.compile(r'^(The opposing )?(.+?) fainted!$', re.MULTILINE)
+win_pattern = re.compile(r'^\*\*(.+)\*\* won the battle!$', re.MULTILINE)
+tie_pattern = re.compile(r'^Tie between .+ and .+!$', re.MULTILINE)
+
+
+class ReplayEvent(NamedTuple):
+    turn: int
+    side: int  # 0 for p1, 1 for p2
+    kind: str  # SWITCH or FAINT
+    species: str
+
+
+class ReplayAnalytics(NamedTuple):
+    teams: tuple[tuple[str, ...], tuple[str, ...]]
+    events: tuple[ReplayEvent, ...]
+    winner: str | None  # None for ties, and replays which didn't finish
+    tie: bool
+    turn_count: int
+
+    def kos(self, side: int) -> list[ReplayEvent]:
+        """the pokemon of `side` which fainted"""
+        return [event for event in self.events if event.kind == FAINT and event.side == side]
+
+    def switches(self, side: int) -> int:
+        return sum(event.kind == SWITCH and event.side == side for event in self.events)
+
+
+def replay_winner(texts: Sequence[str]) -> tuple[str | None, bool]:
+    """the winner's name (None if nobody won) and whether it was a tie, read from the end of the battle"""
+    for text in reversed(texts):
+        # the last turn's heading runs straight into "**X** won the battle!" when nothing else happened in it
+        text = turn_header_pattern.sub('', text, count=1)
+        match = win_pattern.search(text)
+        if match is not None:
+            return match.group(1), False
+        if tie_pattern.search(text):
+            return None, True
+    return None, False
+
+
+def analyse_replay(texts: Sequence[str]) -> ReplayAnalytics:
+    """analytics of a replay from its turn texts of p1's viewpoint"""
+    teams = ({}, {})  # species -> None, ordered sets
+    nicknames = ({}, {})  # nickname -> species, faint messages only give the nickname
+    events = []
+    for turn, text in enumerate(texts):
+        text = turn_header_pattern.sub('', text, count=1)
+        found = []  # (position in the text, event), the patterns run one after the other
+        for side, pattern in ((0, own_switch_pattern), (1, opposing_switch_pattern)):
+            for match in pattern.finditer(text):
+                found.append((match.start(), side, SWITCH, match.group(1), match.group(2)))
+        for match in drag_pattern.finditer(text):
+            moves = [move for move in move_pattern.finditer(text, 0, match.start())]
+            if moves:  # dragged out by the other side's roar/whirlwind
+                found.append((match.start(), 0 if moves[-1].group(1) else 1, SWITCH, match.group(1), match.group(2)))
+        for match in faint_pattern.finditer(text):
+            found.append((match.start(), 1 if match.group(1) else 0, FAINT, match.group(2), None))
+        for _, side, kind, nickname, species in sorted(found, key=lambda event: event[0]):
+            if kind == SWITCH:
+                teams[side][species] = None
+                nicknames[side][nickname or species] = species
+            else:
+                species = nicknames[side].get(nickname, nickname)
+            events.append(ReplayEvent(turn, side, kind, species))
+    winner, tie = replay_winner(texts)
+    return ReplayAnalytics((tuple(teams[0]), tuple(teams[1])), tuple(events), winner, tie, max(len(texts) - 1, 0))
+
+
+def store_analytics(archive, replay_id: str, analytics: ReplayAnalytics):
+    """queues the analytics on the archive's writer, the replay's psreplay_summary row has to be queued first"""
+    archive.write(summary_update_query, (analytics.winner, analytics.tie, ANALYTICS_VERSION, replay_id))
+    # replaced outright when a replay is rendered again
+    archive.write(team_delete_query, (replay_id,))
+    archive.write_many(team_query, (
+        (replay_id, side, slot, species) for side, team in enumerate(analytics.teams) for slot, species in enumerate(team)
+    ))
+    archive.write(events_delete_query, (replay_id,))
+    return archive.write_many(events_query, (
+        (replay_id, seq, event.turn, event.side, event.kind, event.species) for seq, event in enumerate(analytics.events)
+    ))
+
+
+async def get_analytics(archive, replay_id: str) -> ReplayAnalytics | None:
+    """the stored analytics of a replay, None if it isn't archived or wasn't analysed (by this version) yet"""
+    async with archive.read() as conn:
+        async with conn.execute(
+            "SELECT winner, tie, turn_count FROM psreplay_summary WHERE replayid = ? AND analysed = ?",
+            (replay_id, ANALYTICS_VERSION),
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        winner, tie, turn_count = row
+        async with conn.execute(
+            "SELECT side, species FROM psreplay_team WHERE replayid = ? ORDER BY side, slot", (replay_id,)
+        ) as cursor:
+            teams = ([], [])
+            for side, species in await cursor.fetchall():
+                teams[side].append(species)
+        async with conn.execute(
+            "SELECT turn, side, kind, species FROM psreplay_events WHERE replayid = ? ORDER BY seq", (replay_id,)
+        ) as cursor:
+            events = tuple(ReplayEvent(*row) for row in await cursor.fetchall())
+    return ReplayAnalytics((tuple(teams[0]), tuple(teams[1])), events, winner, bool(tie), turn_count)
+
+
+# summarised replays which were archived before analytics existed, or analysed by an older version
+analytics_backfill_query = f"""
+SELECT s.rowid, s.replayid, p.battle_text1, p.battle_text2, p.turns
+FROM psreplay_summary s JOIN psreplays p ON p.replayid = s.replayid
+WHERE s.rowid > ? AND s.analysed < {ANALYTICS_VERSION}
+ORDER BY s.rowid LIMIT ?
+"""
+
+
+def analytics_backfill_params(rows: Sequence[tuple]) -> list[tuple[str, ReplayAnalytics]]:
+    """analytics of rows of analytics_backfill_query, decodes every replay so it belongs in the parse pool"""
+    results = []
+    for _, replay_id, battle_text1, battle_text2, turns in rows:
+        try:
+            texts = decode_turns(turns)[0] if turns is not None else legacy_split(battle_text1, battle_text2)[0]
+        except Exception as e:  # unreadable row
+            print(f"{replay_id}: {e}")
+            continue
+        results.append((replay_id, analyse_replay(texts)))
+    return results
@@ -0,0 +1,301 @@
+"""
+The sqlite database behind the replay archive.
+
+Reads go through a pool of connections, while every write goes through one dedicated writer connection.
+Writes are queued and committed together in batches, so a burst of saves costs one transaction (and fsync)
+instead of one each, and never makes readers wait since the database runs in WAL mode.
+"""
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Iterable, Mapping
+
+import asqlite
+
+from Helpers.replay_analytics import create_analytics_queries
+from Helpers.replay_search import create_search_query, create_summary_query
+
+__all__ = ("ReplayArchive", "DEFAULT_PRAGMAS", "apply_pragmas", "ensure_schema")
+
+
+create_query = """
+CREATE TABLE IF NOT EXISTS psreplays (
+    replayid TEXT PRIMARY KEY,
+    format_text TEXT,
+    battle_text1 TEXT[],
+    battle_text2 TEXT[],
+    turns BLOB
+);
+"""
+
+create_meta_query = """
+CREATE TABLE IF NOT EXISTS psreplay_meta (
+    replayid TEXT PRIMARY KEY,
+    p1 TEXT,
+    p2 TEXT,
+    format TEXT,
+    rating INTEGER,
+    uploadtime INTEGER,
+    views INTEGER,
+    views_checked REAL
+);
+"""
+
+# progress of bulk ingest jobs, so a job picks up where it stopped when it's run again
+create_ingest_query = """
+CREATE TABLE IF NOT EXISTS psreplay_ingest (
+    job TEXT,
+    replayid TEXT,
+    status TEXT,
+    error TEXT,
+    PRIMARY KEY (job, replayid)
+);
+"""
+
+# guilds which opted into having replay links posted in their chat archived ahead of time
+create_prefetch_query = """
+CREATE TABLE IF NOT EXISTS psreplay_prefetch_guilds (
+    guild_id INTEGER PRIMARY KEY
+);
+"""
+
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "wal",  # readers and the writer don't block each other
+    "synchronous": "normal",  # safe with wal, a power cut can only lose the last commits and never corrupts
+    "cache_size": -32000,  # negative is in KiB, per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "memory",
+    "busy_timeout": 5000,  # ms, for other processes (scripts) holding the write lock
+}
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Mapping[str, Any] = DEFAULT_PRAGMAS):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+class _Write:
+    __slots__ = ("query", "params", "many", "future")
+
+    def __init__(self, query: str, params, many: bool, future: asyncio.Future):
+        self.query = query
+        self.params = params
+        self.many = many
+        self.future = future
+
+    def run(self, conn: sqlite3.Connection):
+        if self.many:
+            conn.executemany(self.query, self.params)
+        else:
+            conn.execute(self.query, self.params)
+
+
+def _mark_retrieved(future: asyncio.Future):
+    # write-behind callers don't have to await their write, errors are printed by the writer instead
+    if not future.cancelled():
+        future.exception()
+
+
+class ReplayArchive:
+    """
+    Pool of `readers` read connections plus a single writer with a write-behind queue.
+
+    write() queues a statement and returns a future which resolves once it's committed,
+    awaiting it is optional. Queued writes are committed `batch_size` at a time in one transaction,
+    so whatever queues up while a batch is being committed goes into the next one.
+    `max_delay` makes the writer also wait that many seconds for more writes before committing a small batch.
+    Pragmas are applied to every connection, close() commits whatever is still queued (if the writer can).
+    """
+    def __init__(
+        self,
+        path: str,
+        readers: int = 4,
+        batch_size: int = 64,
+        max_delay: float = 0.0,
+        pragmas: Mapping[str, Any] = DEFAULT_PRAGMAS,
+    ):
+        self.path = path
+        self.readers = readers
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.pragmas = pragmas
+        self.pool: asqlite.Pool | None = None
+        self._queue: asyncio.Queue[_Write] = asyncio.Queue()
+        self._executor: ThreadPoolExecutor | None = None
+        self._conn: sqlite3.Connection | None = None
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        # stats
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_batch = 0
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    async def start(self):
+        self.pool = await asqlite.create_pool(self.path, size=self.readers, init=partial(apply_pragmas, pragmas=self.pragmas))
+        # the writer connection lives on its own thread, so a batch makes one trip off the event loop
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="archive-writer")
+        self._conn = await asyncio.get_running_loop().run_in_executor(self._executor, self._connect_writer)
+        self._task = asyncio.create_task(self._write_loop())
+
+    def read(self):
+        """acquires a read connection, `async with archive.read() as conn:`"""
+        return self.pool.acquire()
+
+    def _enqueue(self, query: str, params, many: bool) -> asyncio.Future:
+        if self._closed:
+            raise RuntimeError("Replay archive is closed")
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_mark_retrieved)
+        self._queue.put_nowait(_Write(query, params, many, future))
+        return future
+
+    def write(self, query: str, params: Iterable[Any] = ()) -> asyncio.Future:
+        return self._enqueue(query, tuple(params), False)
+
+    def write_many(self, query: str, seq_of_params: Iterable[Iterable[Any]]) -> asyncio.Future:
+        return self._enqueue(query, [tuple(params) for params in seq_of_params], True)
+
+    def _commit(self, batch: list[_Write]) -> list[Exception | None]:
+        """runs on the writer thread"""
+        conn = self._conn
+        try:
+            conn.execute("BEGIN")
+            for write in batch:
+                write.run(conn)
+            conn.execute("COMMIT")
+            return [None] * len(batch)
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        # something in the batch is bad, redo them one by one so only that one fails
+        errors = []
+        for write in batch:
+            try:
+                write.run(conn)
+                errors.append(None)
+            except sqlite3.Error as e:
+                errors.append(e)
+        return errors
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.max_delay and self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.max_delay)  # let more writes join this transaction
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                errors = await loop.run_in_executor(self._executor, self._commit, batch)
+            except Exception as e:  # writer connection itself is broken
+                errors = [e] * len(batch)
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            for write, error in zip(batch, errors):
+                if error is None:
+                    self.written += 1
+                    if not write.future.done():
+                        write.future.set_result(None)
+                else:
+                    self.failed += 1
+                    print(f"Archive write failed: {error} ({write.query.strip().splitlines()[0]})")
+                    if not write.future.done():
+                        write.future.set_exception(error)
+                self._queue.task_done()
+
+    async def flush(self):
+        """waits until everything queued so far is committed"""
+        await self._queue.join()
+
+    def _fail_queued(self, error: Exception) -> int:
+        """fails every write still queued, returns how many there were"""
+        dropped = 0
+        while not self._queue.empty():
+            write = self._queue.get_nowait()
+            if not write.future.done():
+                write.future.set_exception(error)
+            self._queue.task_done()
+            dropped += 1
+        self.failed += dropped
+        return dropped
+
+    async def close(self, timeout: float | None = 60):
+        """commits what's still queued, waiting at most `timeout` seconds for it, and closes every connection"""
+        self._closed = True
+        flushed = True
+        if self._task is not None:
+            if self._task.done():  # the writer died, nothing would ever take the queued writes
+                flushed = False
+                reason = "cancelled" if self._task.cancelled() else repr(self._task.exception())
+                dropped = self._fail_queued(RuntimeError("Archive writer stopped"))
+                print(f"Archive writer had stopped ({reason}), {dropped} queued writes dropped")
+            else:
+                try:
+                    await asyncio.wait_for(self.flush(), timeout)
+                except asyncio.TimeoutError:
+                    flushed = False
+                self._task.cancel()
+                if not flushed:
+                    dropped = self._fail_queued(RuntimeError("Archive closed before this was committed"))
+                    print(f"Archive writer didn't finish within {timeout:g}s, {dropped} queued writes dropped")
+            self._task = None
+        if self._conn is not None and flushed:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._conn.close)
+            self._conn = None
+        if self._executor is not None:
+            # a writer thread stuck in a commit isn't waited on
+            self._executor.shutdown(wait=flushed, cancel_futures=True)
+            self._executor = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "average_batch": (self.written + self.failed) / self.batches if self.batches else 0.0,
+        }
+
+
+async def ensure_schema(archive: ReplayArchive):
+    """creates the archive's tables, and brings databases made by older versions up to date"""
+    for query in (
+        create_query, create_meta_query, create_summary_query, create_search_query, create_ingest_query,
+        create_prefetch_query,
+    ):
+        await archive.write(query)
+    # archives from before the compact storage format get its column, old rows are converted as they're read
+    # (or all at once with python -m Scripts.migrate_archive)
+    async with archive.read() as conn:
+        async with conn.execute("PRAGMA table_info(psreplays)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+    if "turns" not in columns:
+        await archive.write("ALTER TABLE psreplays ADD COLUMN turns BLOB")
+    # summaries from before replay analytics, their replays are analysed by .replaystatsindex (as are replays
+    # analysed by an older version, see ANALYTICS_VERSION)
+    async with archive.read() as conn:
+        async with conn.execute("PRAGMA table_info(psreplay_summary)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+    for column, definition in (("winner", "TEXT"), ("tie", "INTEGER DEFAULT 0"), ("analysed", "INTEGER DEFAULT 0")):
+        if column not in columns:
+            await archive.write(f"ALTER TABLE psreplay_summary ADD COLUMN {column} {definition}")
+    for query in create_analytics_queries:
+        await archive.write(query)
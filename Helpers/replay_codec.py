@@ -0,0 +1,131 @@
+"""
+Compact storage format of the archived turn texts.
+
+Both viewpoints of a replay are nearly the same text, mostly differing by whose pokemon gets called "The opposing".
+So the first viewpoint's turns are stored as is and the second one's only as edits against them.
+
+blob    = version byte + zlib(body)
+body    = uint32 count of numbers + numbers + text
+numbers = little endian uint32s: turn count, then for each turn the length of its text followed by its delta ops
+text    = utf-8, for each turn its text followed by the literal strings its delta ops consume
+delta ops:
+    COPY start count          lines start..start+count of the first viewpoint's turn
+    LINES count [length]      count lines taken from the text
+    EDIT line prefix suffix length
+                              the first viewpoint's line, keeping `prefix` chars from the start and `suffix`
+                              from the end, with a string taken from the text in between
+    END                       end of this turn
+Lengths are in characters. Numbers and text are kept apart since compressing the strings together is
+what makes zlib effective, and the numbers load back in one go as an array.
+"""
+from __future__ import annotations
+
+import struct
+import sys
+import zlib
+from array import array
+from difflib import SequenceMatcher
+from os.path import commonprefix
+from typing import Sequence
+
+__all__ = ("STORAGE_VERSION", "encode_turns", "decode_turns", "legacy_split", "LEGACY_SEPARATOR")
+
+
+STORAGE_VERSION = 1
+# the old format joined turns with this, which breaks if a turn ever contains it
+LEGACY_SEPARATOR = "\n-\n-\n"
+
+_uint = struct.Struct('<I')
+COPY, LINES, EDIT, END = range(4)
+
+
+def _edit(line: str, other: str) -> tuple[int, int, str]:
+    """common prefix and suffix lengths of two lines and what's between them in `other`"""
+    prefix = len(commonprefix((line, other)))
+    suffix = len(commonprefix((line[prefix:][::-1], other[prefix:][::-1])))
+    return prefix, suffix, other[prefix:len(other) - suffix]
+
+
+def _delta(numbers: array, strings: list[str], text: str, other: str):
+    """ops rebuilding `other` from the lines of `text`"""
+    lines = text.split('\n')
+    if text == other:
+        numbers.extend((COPY, 0, len(lines)))
+    else:
+        other_lines = other.split('\n')
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, lines, other_lines, autojunk=False).get_opcodes():
+            if tag == 'equal':
+                numbers.extend((COPY, i1, i2 - i1))
+            elif tag == 'replace' and i2 - i1 == j2 - j1:  # usually only "The opposing " moved around
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    prefix, suffix, middle = _edit(lines[i], other_lines[j])
+                    numbers.extend((EDIT, i, prefix, suffix, len(middle)))
+                    strings.append(middle)
+            elif tag != 'delete':
+                numbers.extend((LINES, j2 - j1))
+                numbers.extend(map(len, other_lines[j1:j2]))
+                strings.extend(other_lines[j1:j2])
+    numbers.append(END)
+
+
+def encode_turns(texts: Sequence[str], texts2: Sequence[str], level: int = 6) -> bytes:
+    """packs the turn texts of both viewpoints, cpu heavy enough (the diffing) to belong in the parse pool"""
+    if len(texts) != len(texts2):
+        raise ValueError(f"Viewpoints have a different number of turns ({len(texts)} and {len(texts2)})")
+    numbers = array('I', (len(texts),))
+    strings = []
+    for text, text2 in zip(texts, texts2):
+        numbers.append(len(text))
+        strings.append(text)
+        _delta(numbers, strings, text, text2)
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    body = _uint.pack(len(numbers)) + numbers.tobytes() + ''.join(strings).encode()
+    return bytes((STORAGE_VERSION,)) + zlib.compress(body, level)
+
+
+def decode_turns(blob: bytes) -> tuple[list[str], list[str]]:
+    """the turn texts of both viewpoints back from encode_turns"""
+    version = blob[0]
+    if version != STORAGE_VERSION:
+        raise ValueError(f"Unknown replay storage version {version}")
+    body = zlib.decompress(blob[1:])
+    count, = _uint.unpack_from(body, 0)
+    end = _uint.size + count * 4
+    numbers = array('I', body[_uint.size:end])
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    text = body[end:].decode()
+    pos = 0
+    next_number = iter(numbers).__next__
+    texts = []
+    texts2 = []
+    for _ in range(next_number()):
+        size = next_number()
+        turn_text = text[pos:pos + size]
+        pos += size
+        lines = turn_text.split('\n')
+        out = []
+        while (op := next_number()) != END:
+            if op == COPY:
+                start = next_number()
+                out.extend(lines[start:start + next_number()])
+            elif op == EDIT:
+                line = lines[next_number()]
+                prefix = next_number()
+                suffix = next_number()
+                size = next_number()
+                out.append(line[:prefix] + text[pos:pos + size] + line[len(line) - suffix:])
+                pos += size
+            else:
+                for size in [next_number() for _ in range(next_number())]:
+                    out.append(text[pos:pos + size])
+                    pos += size
+        texts.append(turn_text)
+        texts2.append('\n'.join(out))
+    return texts, texts2
+
+
+def legacy_split(battle_text1: str, battle_text2: str) -> tuple[list[str], list[str]]:
+    """turn texts of rows saved before the archive was compacted"""
+    return battle_text1.split(LEGACY_SEPARATOR), battle_text2.split(LEGACY_SEPARATOR)
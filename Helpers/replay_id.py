@@ -0,0 +1,52 @@
+"""
+One canonical id per replay, however the link to it was pasted
+"""
+from __future__ import annotations
+
+import re
+
+__all__ = ("REPLAY_BASE_URL", "parse_replay_id", "find_replay_ids", "replay_url", "replay_format_id")
+
+
+REPLAY_BASE_URL = "https://replay.pokemonshowdown.com/"
+
+# https://replay.pokemonshowdown.com/[server-]format-123456789[-passwordpw][.json|.log|.html][/][?p2][#...]
+# the optional leading server id is for replays from side servers such as smogtours, the bare id works too
+replay_link_pattern = re.compile(
+    r'^(?:(?:https?://)?replay\.pokemonshowdown\.com/)?'
+    r'((?:[a-z0-9]+-)?[a-z0-9]+-[0-9]+(?:-[a-z0-9]+pw)?)'
+    r'(?:\.(?:json|log|html))?/?(?:[?#].*)?$',
+    re.IGNORECASE
+)
+# links somewhere in a chat message, only full links since bare ids are too easy to run into by accident
+replay_link_search_pattern = re.compile(
+    r'replay\.pokemonshowdown\.com/((?:[a-z0-9]+-)?[a-z0-9]+-[0-9]+(?:-[a-z0-9]+pw)?)(?![a-z0-9])',
+    re.IGNORECASE
+)
+format_id_pattern = re.compile(r'^(?:[a-z0-9]+-)?([a-z0-9]+)-[0-9]+(?:-[a-z0-9]+pw)?$')
+
+
+def parse_replay_id(link: str) -> str | None:
+    """
+    gen3ou-123456789 for any link to that replay (or the id itself), or None if it isn't a replay link
+    password protected replays keep their password as part of the id, it's needed to open them
+    """
+    match = replay_link_pattern.match(link.strip())
+    if match is None:
+        return None
+    return match.group(1).lower()
+
+
+def find_replay_ids(text: str) -> list[str]:
+    """ids of every replay linked in a message, in order and without duplicates"""
+    return list(dict.fromkeys(match.group(1).lower() for match in replay_link_search_pattern.finditer(text)))
+
+
+def replay_url(replay_id: str) -> str:
+    return REPLAY_BASE_URL + replay_id
+
+
+def replay_format_id(replay_id: str) -> str:
+    """gen3ou for gen3ou-123456789 (or smogtours-gen3ou-123456789)"""
+    match = format_id_pattern.match(replay_id)
+    return match.group(1) if match else ''
@@ -0,0 +1,168 @@
+"""
+Archiving replays in bulk, e.g. a whole tournament's worth, through a bounded number of workers.
+
+Every replay's outcome is checkpointed in psreplay_ingest under the job's name,
+so running the same job again only works on what's left.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+import time
+from typing import Awaitable, Callable, Iterable, Sequence
+
+from Helpers.replay_id import parse_replay_id
+
+__all__ = ("BulkIngest", "IngestReport", "parse_replay_list", "job_name")
+
+
+def parse_replay_list(text: str) -> tuple[list[str], list[str]]:
+    """replay ids out of links/ids separated by whitespace or commas, without duplicates, and what wasn't one"""
+    ids = {}
+    invalid = []
+    for entry in re.split(r'[\s,<>]+', text):
+        if not entry:
+            continue
+        replay_id = parse_replay_id(entry)
+        if replay_id is None:
+            invalid.append(entry)
+        else:
+            ids[replay_id] = None
+    return list(ids), invalid
+
+
+def job_name(replay_ids: Sequence[str]) -> str:
+    """the same list of replays is the same job"""
+    return hashlib.sha1('\n'.join(sorted(replay_ids)).encode()).hexdigest()[:12]
+
+
+class IngestReport:
+    __slots__ = ("job", "total", "skipped", "done", "failed", "errors", "started", "finished")
+
+    def __init__(self, job: str, total: int):
+        self.job = job
+        self.total = total
+        self.skipped = 0  # archived already or finished by an earlier run of the job
+        self.done = 0
+        self.failed = 0
+        self.errors: dict[str, str] = {}
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self) -> float:
+        """replays archived per second"""
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.skipped - self.done - self.failed
+
+    def summary(self) -> str:
+        text = (
+            f"Job {self.job}: {self.done} archived, {self.skipped} skipped, {self.failed} failed, "
+            f"{self.remaining} left of {self.total} ({self.rate:.2f} replays/s over {self.elapsed:.0f}s)"
+        )
+        return text
+
+
+class BulkIngest:
+    """
+    Runs `load(replay_id)` for every replay which isn't archived yet, `workers` at a time.
+
+    load is expected to archive the replay and raise on failure (Replay.load_replay).
+    Replays which failed in an earlier run of the job are tried again only with retry_failed.
+    `on_progress(report)` is called at most every `progress_interval` seconds while the job runs.
+    """
+    def __init__(
+        self,
+        archive,
+        load: Callable[[str], Awaitable],
+        workers: int = 4,
+        retry_failed: bool = False,
+        on_progress: Callable[[IngestReport], Awaitable] | None = None,
+        progress_interval: float = 5.0,
+    ):
+        self.archive = archive
+        self.load = load
+        self.workers = workers
+        self.retry_failed = retry_failed
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.report: IngestReport | None = None  # of the running (or last) job
+
+    async def _already_done(self, job: str, replay_ids: Sequence[str]) -> set[str]:
+        statuses = ('done', 'failed') if not self.retry_failed else ('done',)
+        done = set()
+        async with self.archive.read() as conn:
+            for start in range(0, len(replay_ids), 500):  # stays under sqlite's variable limit
+                chunk = replay_ids[start:start + 500]
+                marks = ', '.join('?' * len(chunk))
+                query = f"SELECT replayid FROM psreplays WHERE replayid IN ({marks})"
+                async with conn.execute(query, tuple(chunk)) as cursor:
+                    done.update(row[0] for row in await cursor.fetchall())
+                query = (
+                    f"SELECT replayid FROM psreplay_ingest WHERE job = ? AND replayid IN ({marks})"
+                    f" AND status IN ({', '.join('?' * len(statuses))})"
+                )
+                async with conn.execute(query, (job, *chunk, *statuses)) as cursor:
+                    done.update(row[0] for row in await cursor.fetchall())
+        return done
+
+    def _checkpoint(self, job: str, replay_id: str, status: str, error: str | None = None):
+        self.archive.write(
+            "INSERT OR REPLACE INTO psreplay_ingest (job, replayid, status, error) VALUES (?, ?, ?, ?)",
+            (job, replay_id, status, error)
+        )
+
+    async def _worker(self, job: str, queue: asyncio.Queue, report: IngestReport):
+        while True:
+            replay_id = await queue.get()
+            try:
+                await self.load(replay_id)
+            except Exception as e:
+                report.failed += 1
+                report.errors[replay_id] = str(e) or type(e).__name__
+                self._checkpoint(job, replay_id, 'failed', report.errors[replay_id])
+            else:
+                report.done += 1
+                self._checkpoint(job, replay_id, 'done')
+            finally:
+                queue.task_done()
+
+    async def _report_progress(self, report: IngestReport):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                await self.on_progress(report)
+            except Exception as e:  # progress reports are best effort
+                print(e)
+
+    async def run(self, replay_ids: Iterable[str], job: str | None = None) -> IngestReport:
+        replay_ids = list(replay_ids)
+        job = job or job_name(replay_ids)
+        self.report = report = IngestReport(job, len(replay_ids))
+        done = await self._already_done(job, replay_ids)
+        report.skipped = len(done)
+
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        for replay_id in replay_ids:
+            if replay_id not in done:
+                queue.put_nowait(replay_id)
+        tasks = [asyncio.create_task(self._worker(job, queue, report)) for _ in range(self.workers)]
+        if self.on_progress is not None:
+            tasks.append(asyncio.create_task(self._report_progress(report)))
+        try:
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            report.finished = time.perf_counter()
+            # the checkpoints are write-behind, make sure they're in before reporting back
+            await self.archive.flush()
+        return report
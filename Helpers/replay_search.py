@@ -0,0 +1,162 @@
+"""
+Full text search over the archived replays, an FTS5 index of the players, format, pokemon and turn texts.
+
+Only the index is stored (content=''), the turn texts themselves stay compressed in psreplays.
+Index rows share their rowid with psreplay_summary, which holds what the search filters on besides text.
+"""
+from __future__ import annotations
+
+import re
+from typing import Iterable, Sequence
+
+from Helpers.replay_codec import decode_turns, legacy_split
+from Helpers.replay_id import replay_format_id
+from Helpers.replay_store import opposing_mon_pattern, player_mon_pattern
+
+__all__ = (
+    "create_summary_query",
+    "create_search_query",
+    "summary_query",
+    "index_query",
+    "search_document",
+    "index_replay",
+    "backfill_query",
+    "backfill_params",
+    "build_match",
+    "search_replays",
+    "SEARCH_PAGE_SIZE",
+)
+
+
+SEARCH_PAGE_SIZE = 10
+
+create_summary_query = """
+CREATE TABLE IF NOT EXISTS psreplay_summary (
+    replayid TEXT PRIMARY KEY,
+    turn_count INTEGER,
+    winner TEXT,
+    tie INTEGER DEFAULT 0,
+    analysed INTEGER DEFAULT 0
+);
+"""
+
+create_search_query = """
+CREATE VIRTUAL TABLE IF NOT EXISTS psreplay_search USING fts5(
+    players,
+    format,
+    pokemon,
+    turns,
+    content='',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+summary_query = "INSERT OR IGNORE INTO psreplay_summary (replayid, turn_count) VALUES (?, ?)"
+# skips replays which are indexed already, contentless rows can't be replaced
+index_query = """
+INSERT INTO psreplay_search (rowid, players, format, pokemon, turns)
+SELECT rowid, ?, ?, ?, ? FROM psreplay_summary
+WHERE replayid = ? AND NOT EXISTS (SELECT 1 FROM psreplay_search WHERE rowid = psreplay_summary.rowid)
+"""
+
+
+def search_document(replay_id: str, battle_format: str, texts: Sequence[str]) -> tuple[str, str, str]:
+    """format, pokemon and turn text columns of a replay, cheap enough to run on the event loop for one replay"""
+    pokemon = {}  # ordered set
+    for text in texts:
+        for name in player_mon_pattern.findall(text) + opposing_mon_pattern.findall(text):
+            pokemon[name] = None
+    # along with the id's format (gen3ou) so both "gen3ou" and "gen 3 ou" find it
+    return f"{battle_format} {replay_format_id(replay_id)}", ' '.join(pokemon), '\n'.join(texts)
+
+
+def index_replay(archive, replay_id: str, players: Iterable[str], battle_format: str, texts: Sequence[str]):
+    """queues the summary and search index rows of a replay on the archive's writer"""
+    format_column, pokemon, turns = search_document(replay_id, battle_format, texts)
+    archive.write(summary_query, (replay_id, len(texts) - 1))
+    return archive.write(index_query, (' '.join(players), format_column, pokemon, turns, replay_id))
+
+
+# replays archived before the index existed, players are only known for replays with metadata
+backfill_query = """
+SELECT p.rowid, p.replayid, p.format_text, p.battle_text1, p.battle_text2, p.turns, m.p1, m.p2, m.format
+FROM psreplays p LEFT JOIN psreplay_meta m ON m.replayid = p.replayid
+WHERE p.rowid > ? AND NOT EXISTS (SELECT 1 FROM psreplay_summary s WHERE s.replayid = p.replayid)
+ORDER BY p.rowid LIMIT ?
+"""
+
+
+def backfill_params(rows: Sequence[tuple]) -> tuple[list[tuple], list[tuple]]:
+    """summary and index params for rows of backfill_query, decodes every replay so it belongs in the parse pool"""
+    summaries = []
+    documents = []
+    for _, replay_id, format_text, battle_text1, battle_text2, turns, p1, p2, battle_format in rows:
+        try:
+            texts = decode_turns(turns)[0] if turns is not None else legacy_split(battle_text1, battle_text2)[0]
+        except Exception as e:  # unreadable row, nothing to index
+            print(f"{replay_id}: {e}")
+            continue
+        battle_format = battle_format or (format_text or '').partition('\n')[0]
+        format_column, pokemon, text = search_document(replay_id, battle_format, texts)
+        summaries.append((replay_id, len(texts) - 1))
+        documents.append((' '.join(filter(None, (p1, p2))), format_column, pokemon, text, replay_id))
+    return summaries, documents
+
+
+def _phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _terms(value: str) -> list[str]:
+    # "Tyranitar vs Skarmory", "Tyranitar, Skarmory" and "Tyranitar/Skarmory" all mean both
+    return [term.strip() for term in re.split(r',|/|\s+vs\.?\s+', value, flags=re.IGNORECASE) if term.strip()]
+
+
+def build_match(
+    pokemon: str | None = None,
+    player: str | None = None,
+    battle_format: str | None = None,
+    text: str | None = None,
+) -> str | None:
+    """FTS5 query matching every given filter, user input is only ever used as quoted phrases"""
+    parts = []
+    for column, value in (("pokemon", pokemon), ("players", player), ("format", battle_format), ("turns", text)):
+        if value:
+            terms = _terms(value) if column != "turns" else [value]
+            parts.append(f"{column} : ({' AND '.join(map(_phrase, terms))})")
+    return ' AND '.join(parts) or None
+
+
+async def search_replays(
+    archive,
+    match: str | None,
+    min_turns: int | None = None,
+    max_turns: int | None = None,
+    page: int = 0,
+) -> tuple[int, list]:
+    """
+    Total number of results and the rows of the requested page, best matches first
+    Rows are replayid, turn_count, p1, p2, format, uploadtime (the last four are None without metadata)
+    """
+    filters = "s.turn_count BETWEEN ? AND ?"
+    params = [min_turns if min_turns is not None else 0, max_turns if max_turns is not None else 2 ** 31]
+    if match is not None:
+        source = "psreplay_search f JOIN psreplay_summary s ON s.rowid = f.rowid"
+        filters = "psreplay_search MATCH ? AND " + filters
+        params.insert(0, match)
+        order = "f.rank"
+    else:  # only filtering on the summary
+        source = "psreplay_summary s"
+        order = "s.rowid DESC"
+    count_query = f"SELECT count(*) FROM {source} WHERE {filters}"
+    page_query = f"""
+    SELECT s.replayid, s.turn_count, m.p1, m.p2, m.format, m.uploadtime
+    FROM {source} LEFT JOIN psreplay_meta m ON m.replayid = s.replayid
+    WHERE {filters} ORDER BY {order} LIMIT ? OFFSET ?
+    """
+    async with archive.read() as conn:
+        async with conn.execute(count_query, tuple(params)) as cursor:
+            total, = await cursor.fetchone()
+        async with conn.execute(page_query, (*params, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE)) as cursor:
+            rows = await cursor.fetchall()
+    return total, rows
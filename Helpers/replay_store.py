@@ -0,0 +1,91 @@
+"""
+Parsed replays shared between every viewer showing them, instead of each viewer holding its own copy of every turn
+(the replays cog keeps them in its viewer cache, one per replay id)
+"""
+from __future__ import annotations
+
+import re
+from typing import Sequence
+
+__all__ = ("ParsedReplay", "active_mon_index", "split_pages", "DESCRIPTION_LIMIT")
+
+
+# discord's limit on an embed description, and on all the text of a message's embeds together
+DESCRIPTION_LIMIT = 4096
+MESSAGE_EMBEDS_LIMIT = 6000
+# room kept for the title, fields and footer of the replay's embeds
+HEADER_ALLOWANCE = 600
+
+
+# pattern is to prevent trainer names from leading to issues for example a player named "sent out **Gyarados**!"
+# p1: "Go! **Pikachu**!"
+# p2: "Player 2 name sent out **Bulbasaur**!"
+player_mon_pattern = re.compile(r'^Go!.+?\*\*(.+?)\*\*\)?!$', re.MULTILINE)
+opposing_mon_pattern = re.compile(r'^.+?sent out.+?\*\*(.+?)\*\*\)?!$', re.MULTILINE)
+
+
+def active_mon_index(turn_texts: Sequence[str]) -> tuple[tuple[str | None, str | None], ...]:
+    """
+    For every turn, the pokemon last sent out by the player and by the opponent (None until there was one)
+    Cannot deal with doubles properly
+    """
+    index = []
+    mon1 = mon2 = None
+    for turn_text in turn_texts:
+        player_mons = player_mon_pattern.findall(turn_text)
+        if player_mons:
+            mon1 = player_mons[-1]  # last one here
+        opposing_mons = opposing_mon_pattern.findall(turn_text)
+        if opposing_mons:
+            mon2 = opposing_mons[-1]
+        index.append((mon1, mon2))
+    return tuple(index)
+
+
+def split_pages(text: str, limit: int = DESCRIPTION_LIMIT) -> tuple[str, ...]:
+    """splits a turn's text into pages of at most limit characters, between lines where possible"""
+    if len(text) <= limit:
+        return (text,)
+    pages = []
+    page = ''
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:  # no way around cutting this one
+            if page:
+                pages.append(page)
+                page = ''
+            pages.append(line[:limit])
+            line = line[limit:]
+        if len(page) + len(line) > limit:
+            pages.append(page)
+            page = ''
+        page += line
+    if page:
+        pages.append(page)
+    return tuple(page.rstrip('\n') for page in pages)
+
+
+class ParsedReplay:
+    """Read only turn texts of both viewpoints along with their sprite index and their pages as shown on discord"""
+    __slots__ = (
+        "replay_id", "format_text", "texts", "texts2", "active_mons", "active_mons2", "pages", "pages2"
+    )
+
+    def __init__(self, replay_id: str, format_text: str, texts: Sequence[str], texts2: Sequence[str]):
+        self.replay_id = replay_id
+        self.format_text = format_text
+        self.texts = tuple(texts)
+        self.texts2 = tuple(texts2)
+        self.active_mons = active_mon_index(self.texts)
+        self.active_mons2 = active_mon_index(self.texts2)
+        self.pages = self._paginate(self.texts)
+        self.pages2 = self._paginate(self.texts2)
+
+    def _paginate(self, texts: tuple[str, ...]) -> tuple[tuple[str, ...], ...]:
+        # turn 0 is shown along with the format text, which counts towards the same message limit
+        first_limit = min(DESCRIPTION_LIMIT, max(500, MESSAGE_EMBEDS_LIMIT - HEADER_ALLOWANCE - len(self.format_text)))
+        return tuple(split_pages(text, first_limit if turn == 0 else DESCRIPTION_LIMIT) for turn, text in enumerate(texts))
+
+    @property
+    def total_turns(self) -> int:
+        return len(self.texts) - 1
+
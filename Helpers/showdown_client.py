@@ -0,0 +1,234 @@
+"""
+The one http client every request to showdown goes through, commands and background work alike.
+
+Keeps connections (and dns lookups) alive between requests, gives up on slow requests instead of hanging,
+retries what's worth retrying with jittered backoff, and stops asking altogether for a while once showdown
+keeps failing (circuit breaker), so a showdown outage fails commands fast instead of piling them up.
+Metadata of responses with an ETag or Last-Modified is revalidated instead of downloaded again.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Any
+
+import aiohttp
+
+from Helpers.replay_id import REPLAY_BASE_URL
+
+__all__ = ("ShowdownBadResponse", "ShowdownClient", "ShowdownUnavailable")
+
+
+# worth another try, anything else (404 and such) is showdown's final answer
+RETRY_STATUSES = {
+    HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.INTERNAL_SERVER_ERROR, HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.GATEWAY_TIMEOUT,
+}
+# left out of the revalidation cache, a replay's log can be hundreds of KB
+UNCACHED_FIELDS = frozenset({"log"})
+
+
+class ShowdownUnavailable(Exception):
+    """showdown didn't answer properly after every retry, or the circuit is open and it wasn't asked at all"""
+
+
+class ShowdownBadResponse(Exception):
+    """showdown answered, but not with json (an error page and such), asking again won't change that"""
+
+
+class _Cached:
+    __slots__ = ("etag", "last_modified", "data")
+
+    def __init__(self, etag: str | None, last_modified: str | None, data: Any):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.data = data
+
+
+class ShowdownClient:
+    """
+    aiohttp session with a sized keep-alive connector plus retries, a circuit breaker and revalidation.
+
+    `limit`/`limit_per_host` cap open connections, dns answers are cached for `dns_ttl` seconds.
+    Every attempt gets `timeout` seconds in total (`connect_timeout` of them to connect),
+    failed attempts are retried `retries` times after a random wait of up to `backoff` * 2^attempt seconds.
+    `breaker_threshold` failed attempts in a row open the circuit for `breaker_cooldown` seconds,
+    after which a single request is let through to see whether showdown is back.
+    Validators and bodies (without UNCACHED_FIELDS) of the last `cache_size` json responses are kept for revalidation.
+    Replays are fetched from `base_url`, another replay server (e.g. Scripts.fake_showdown) can be given for testing.
+    """
+    def __init__(
+        self,
+        limit: int = 20,
+        limit_per_host: int = 10,
+        dns_ttl: int = 300,
+        keepalive_timeout: float = 30,
+        timeout: float = 10,
+        connect_timeout: float = 3,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 5,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 30,
+        cache_size: int = 128,
+        base_url: str = REPLAY_BASE_URL,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.cache_size = cache_size
+        self.base_url = base_url.rstrip('/') + '/'
+        self.session: aiohttp.ClientSession | None = None
+        self.cache: OrderedDict[str, _Cached] = OrderedDict()
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._trial = 0.0  # when the request testing whether showdown is back was sent
+        # stats
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.circuit_opens = 0
+        self.short_circuited = 0
+        self.not_modified = 0
+        self.bad_responses = 0
+
+    def replay_url(self, replay_id: str) -> str:
+        """where the replay is fetched from, links shown to people stay Helpers.replay_id.replay_url"""
+        return self.base_url + replay_id
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    @property
+    def circuit_open(self) -> bool:
+        return time.monotonic() < self.open_until
+
+    def _allow(self):
+        """raises while the circuit is open, once it's over only one request at a time goes through until one works"""
+        now = time.monotonic()
+        # a trial which never reported back (cancelled) doesn't block everything after it
+        testing = now - self._trial < self.timeout.total
+        if self.circuit_open or (self.open_until and testing):
+            self.short_circuited += 1
+            raise ShowdownUnavailable("showdown keeps failing, not asking it again for a bit")
+        if self.open_until:
+            self._trial = now
+
+    def _succeeded(self):
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._trial = 0.0
+
+    def _failed(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self._trial or self.consecutive_failures >= self.breaker_threshold:
+            if not self.circuit_open:
+                self.circuit_opens += 1
+                print(f"Showdown failed {self.consecutive_failures} times in a row, pausing requests for {self.breaker_cooldown:.0f}s")
+            self.open_until = time.monotonic() + self.breaker_cooldown
+            self._trial = 0.0
+
+    def _delay(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _remember(self, url: str, response: aiohttp.ClientResponse, data: Any):
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            return
+        if isinstance(data, dict):
+            data = {key: value for key, value in data.items() if key not in UNCACHED_FIELDS}
+        self.cache[url] = _Cached(etag, last_modified, data)
+        self.cache.move_to_end(url)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def get_json(self, url: str, metadata_only: bool = False) -> tuple[int, Any]:
+        """
+        Status and decoded body (None unless it's 200) of a json url.
+        With metadata_only the request is conditional and an unchanged body may come from the cache,
+        which doesn't have UNCACHED_FIELDS (a replay's log).
+        Raises ShowdownUnavailable once retries run out or while the circuit is open,
+        ShowdownBadResponse if the body isn't json, aiohttp.InvalidURL for urls which can't be requested at all
+        """
+        for attempt in range(self.retries + 1):
+            self._allow()
+            self.requests += 1
+            headers = {}
+            cached = self.cache.get(url) if metadata_only else None
+            if cached is not None:
+                if cached.etag is not None:
+                    headers["If-None-Match"] = cached.etag
+                if cached.last_modified is not None:
+                    headers["If-Modified-Since"] = cached.last_modified
+            retry_after = None
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    if response.status == HTTPStatus.NOT_MODIFIED and cached is not None:
+                        self._succeeded()
+                        self.not_modified += 1
+                        self.cache.move_to_end(url)
+                        return HTTPStatus.OK, cached.data
+                    if response.status not in RETRY_STATUSES:
+                        if response.status != HTTPStatus.OK:
+                            self._succeeded()
+                            return response.status, None
+                        body = await response.read()
+                        self._succeeded()
+                        try:
+                            data = json.loads(body)
+                        except ValueError as e:
+                            # showdown is up, it just sent something else, so no retry and not a failure for the breaker
+                            self.bad_responses += 1
+                            raise ShowdownBadResponse(f"{url}: not json ({e})") from None
+                        self._remember(url, response, data)
+                        return response.status, data
+                    retry_after = response.headers.get("Retry-After")
+                    error = f"{response.status} {response.reason}"
+            except aiohttp.InvalidURL:
+                self._trial = 0.0
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            self._failed()
+            if attempt < self.retries:
+                self.retried += 1
+                await asyncio.sleep(self._delay(attempt, retry_after))
+        raise ShowdownUnavailable(f"{url}: {error}")
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "circuit_open": self.circuit_open,
+            "circuit_opens": self.circuit_opens,
+            "short_circuited": self.short_circuited,
+            "not_modified": self.not_modified,
+            "bad_responses": self.bad_responses,
+            "cached": len(self.cache),
+        }
@@ -15,11 +15,10 @@
 from __future__ import annotations
 
 import asyncio
-from functools import partial
+from collections import OrderedDict
 from typing import Any, Callable, Coroutine, TypeVar
 from typing_extensions import ParamSpec
 
-from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 # type: ignore
 
 # I have taken and modified the code from: https://github.com/unified-moderation-network/umn-async-utils/
@@ -83,15 +82,53 @@ def make_key(
     return _HashedSeq(key)
 
 
-__all__ = ("taskcache",)
+__all__ = ("taskcache", "CacheStats")
 
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
 
+class CacheStats:
+    """Counters of a taskcache, available as the `stats` attribute of the decorated function"""
+    __slots__ = ("hits", "misses", "coalesced", "stale", "evicted", "expired", "failed")
+
+    def __init__(self):
+        self.hits = 0  # served an already finished task
+        self.misses = 0  # had to start a new task
+        self.coalesced = 0  # joined a task which was still running
+        self.stale = 0  # served an expired result while it is refreshed in the background
+        self.evicted = 0  # dropped to stay within maxsize
+        self.expired = 0  # dropped once the ttl (and stale window) ran out
+        self.failed = 0  # dropped right away because the task errored or returned a failure
+
+    def as_dict(self) -> dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def default_is_failure(result: Any) -> bool:
+    """None, or an exception (class or instance) returned as a sentinel"""
+    return (
+        result is None
+        or isinstance(result, BaseException)
+        or (isinstance(result, type) and issubclass(result, BaseException))
+    )
+
+
+class _Entry:
+    __slots__ = ("task", "expires_at", "refresh")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.expires_at = float("inf")  # running tasks never expire
+        self.refresh: asyncio.Task | None = None
+
+
 def taskcache(
     ttl: float | None = None,
+    maxsize: int | None = None,
+    stale_while_revalidate: float | None = None,
+    is_failure: Callable[[Any], bool] = default_is_failure,
 ):
     """
     Decorator to modify coroutine functions to instead act as functions returning cached tasks.
@@ -99,6 +136,13 @@ def taskcache(
     For general use, this leaves the end user API largely the same,
     while leveraging tasks to allow preemptive caching.
 
+    ttl: seconds a finished task's result stays cached for
+    maxsize: number of entries kept, the least recently used finished one is dropped past that
+    stale_while_revalidate: seconds past the ttl during which the old result is still served
+        while a fresh call runs in the background and replaces it once it succeeds
+    is_failure: results for which this returns True are dropped from the cache as soon as the task finishes,
+        just like tasks which raised or were cancelled
+
     Note: This uses the args and kwargs of the original coroutine function as a cache key.
     This includes instances (self) when wrapping methods.
     Consider not wrapping instance methods, but what those methods call when feasible in cases where this may matter.
@@ -108,31 +152,90 @@ def taskcache(
         coro: Callable[[P], Coroutine[Any, Any, T]]
     ) -> Callable[[P], asyncio.Task[T]]:
 
-        internal_cache: dict[Any, asyncio.Task[T]] = {}
+        internal_cache: OrderedDict[Any, _Entry] = OrderedDict()
+        stats = CacheStats()
+
+        def failed(task: asyncio.Task) -> bool:
+            return task.cancelled() or task.exception() is not None or is_failure(task.result())
+
+        def expire(key, entry: _Entry):
+            # only remove the entry this was scheduled for, not one which replaced it since
+            if internal_cache.get(key) is entry:
+                del internal_cache[key]
+                stats.expired += 1
+
+        def trim():
+            # least recently used first, but never a running task: dropping it would let the next call for its key
+            # start a second run alongside it. Running tasks can hold the cache past maxsize until they finish
+            if maxsize is None or len(internal_cache) <= maxsize:
+                return
+            for old_key in [old_key for old_key, old in internal_cache.items() if old.task.done()]:
+                del internal_cache[old_key]
+                stats.evicted += 1
+                if len(internal_cache) <= maxsize:
+                    return
+
+        def store(key, entry: _Entry):
+            internal_cache[key] = entry
+            internal_cache.move_to_end(key)
+            trim()
+
+        def on_done(key, entry: _Entry, task: asyncio.Task):
+            if failed(task):
+                stats.failed += 1
+                if internal_cache.get(key) is entry:
+                    del internal_cache[key]
+                return
+            trim()  # may have been held past maxsize while it ran
+            if ttl is not None:
+                loop = asyncio.get_running_loop()
+                entry.expires_at = loop.time() + ttl
+                loop.call_later(ttl + (stale_while_revalidate or 0), expire, key, entry)
+
+        def start(key, args, kwargs) -> _Entry:
+            entry = _Entry(asyncio.create_task(coro(*args, **kwargs)))
+            entry.task.add_done_callback(lambda task: on_done(key, entry, task))
+            store(key, entry)
+            return entry
+
+        def on_refreshed(key, stale: _Entry, task: asyncio.Task):
+            stale.refresh = None
+            if failed(task) or internal_cache.get(key) is not stale:
+                return  # keep serving the stale result until it runs out
+            fresh = _Entry(task)
+            store(key, fresh)
+            on_done(key, fresh, task)
 
         def wrapped(*args: P.args, **kwargs: P.kwargs) -> asyncio.Task[T]:
             # prevent self object from being in args of the built hash
             key = make_key(args[1:], kwargs)
-            try:
-                # don't cache errors
-                if internal_cache[key] not in (None, Exception, PlaywrightTimeoutError):
-                    return internal_cache[key]
-                else:
-                    raise KeyError
-            except KeyError:
-                internal_cache[key] = task = asyncio.create_task(coro(*args, **kwargs))
-                if ttl is not None:
-                    # This results in internal_cache.pop(key, task) later
-                    # while avoiding a late binding issue with a lambda instead
-                    call_after_ttl = partial(
-                        asyncio.get_running_loop().call_later,
-                        ttl,
-                        internal_cache.pop,
-                        key,
-                    )
-                    task.add_done_callback(call_after_ttl)
-                return task
-
+            entry = internal_cache.get(key)
+            if entry is not None:
+                now = asyncio.get_running_loop().time()
+                if now < entry.expires_at:
+                    internal_cache.move_to_end(key)
+                    if entry.task.done():
+                        stats.hits += 1
+                    else:
+                        stats.coalesced += 1
+                    return entry.task
+                if stale_while_revalidate is not None and now < entry.expires_at + stale_while_revalidate:
+                    internal_cache.move_to_end(key)
+                    stats.stale += 1
+                    if entry.refresh is None:
+                        entry.refresh = task = asyncio.create_task(coro(*args, **kwargs))
+                        task.add_done_callback(lambda task: on_refreshed(key, entry, task))
+                    return entry.task
+                expire(key, entry)
+            stats.misses += 1
+            return start(key, args, kwargs).task
+
+        def cache_clear():
+            internal_cache.clear()
+
+        wrapped.stats = stats
+        wrapped.cache_info = lambda: {**stats.as_dict(), "size": len(internal_cache), "maxsize": maxsize}
+        wrapped.cache_clear = cache_clear
         return wrapped
 
     return wrapper
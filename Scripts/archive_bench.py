@@ -0,0 +1,84 @@
+"""
+Size and read time of archived replays in the old sentinel joined format against the compact turns blob.
+
+python -m Scripts.archive_bench [database.db] [--sample 500] [--level 6]
+Read only, replays are sampled from the archive in whichever format they're currently stored in,
+and both formats are then timed from a scratch in memory database.
+"""
+import argparse
+import sqlite3
+import statistics
+import time
+
+from Helpers.replay_codec import LEGACY_SEPARATOR, decode_turns, encode_turns, legacy_split
+
+
+def load_sample(path: str, sample: int):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(psreplays)")}
+    turns = "turns" if "turns" in columns else "NULL"  # archive which was never opened by the bot since
+    rows = conn.execute(
+        f"SELECT battle_text1, battle_text2, {turns} FROM psreplays ORDER BY random() LIMIT ?", (sample,)
+    ).fetchall()
+    conn.close()
+    replays = []
+    for battle_text1, battle_text2, turns in rows:
+        replays.append(decode_turns(turns) if turns is not None else legacy_split(battle_text1, battle_text2))
+    return replays
+
+
+def timed(func, items) -> list[float]:
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench(path: str, sample: int, level: int):
+    replays = load_sample(path, sample)
+    if not replays:
+        return print("No archived replays to benchmark with")
+    encode_times = timed(lambda replay: encode_turns(*replay, level=level), replays)
+
+    # both formats in a scratch database, so reads include fetching the row and not just the decoding
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE legacy (replayid INTEGER PRIMARY KEY, battle_text1 TEXT, battle_text2 TEXT)")
+    conn.execute("CREATE TABLE compact (replayid INTEGER PRIMARY KEY, turns BLOB)")
+    conn.executemany(
+        "INSERT INTO legacy VALUES (?, ?, ?)",
+        ((i, LEGACY_SEPARATOR.join(texts), LEGACY_SEPARATOR.join(texts2)) for i, (texts, texts2) in enumerate(replays))
+    )
+    conn.executemany(
+        "INSERT INTO compact VALUES (?, ?)", ((i, encode_turns(*replay, level=level)) for i, replay in enumerate(replays))
+    )
+    legacy_size, = conn.execute("SELECT sum(length(CAST(battle_text1 AS BLOB)) + length(CAST(battle_text2 AS BLOB))) FROM legacy").fetchone()
+    blob_size, = conn.execute("SELECT sum(length(turns)) FROM compact").fetchone()
+
+    def read_legacy(i):
+        legacy_split(*conn.execute("SELECT battle_text1, battle_text2 FROM legacy WHERE replayid = ?", (i,)).fetchone())
+
+    def read_compact(i):
+        decode_turns(conn.execute("SELECT turns FROM compact WHERE replayid = ?", (i,)).fetchone()[0])
+
+    ids = range(len(replays))
+    legacy_reads = timed(read_legacy, ids)
+    blob_reads = timed(read_compact, ids)
+    conn.close()
+
+    print(f"{len(replays)} replays, {sum(len(texts) for texts, _ in replays)} turns")
+    print(f"old format: {legacy_size / 1024:.1f} KiB")
+    print(f"compact:    {blob_size / 1024:.1f} KiB ({blob_size / legacy_size:.1%} of the old size)")
+    for name, times in (("old read", legacy_reads), ("compact read", blob_reads), ("compact write", encode_times)):
+        p95 = statistics.quantiles(times, n=20, method="inclusive")[-1] if len(times) > 1 else times[0]
+        print(f"{name:14} mean {statistics.fmean(times) * 1e3:.3f}ms  p95 {p95 * 1e3:.3f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database", nargs="?", default="database.db")
+    parser.add_argument("--sample", type=int, default=500, help="number of replays benchmarked")
+    parser.add_argument("--level", type=int, default=6, help="zlib compression level")
+    args = parser.parse_args()
+    bench(args.database, args.sample, args.level)
@@ -0,0 +1,143 @@
+"""
+Concurrent read/write load on the replay archive, saving replays the old way
+(a pool connection and a commit per save) against the ReplayArchive (tuned pragmas, batched single writer).
+
+python -m Scripts.archive_load_bench [--rows 1000] [--writers 8] [--saves 100] [--readers 16] [--reads 200]
+                                    [--blob-size 40000]
+Runs on throwaway databases in a temporary directory. "save" is how long the saving command is held up,
+"commit" how long until the save is actually committed (the future ReplayArchive.write returns is awaited,
+every writer waits for its save's commit before the next one), saves/s counts until every save is committed.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import asqlite
+
+from Helpers.replay_archive import ReplayArchive
+
+create_query = "CREATE TABLE psreplays (replayid TEXT PRIMARY KEY, format_text TEXT, turns BLOB)"
+insert_query = "INSERT OR IGNORE INTO psreplays (replayid, format_text, turns) VALUES (?, ?, ?)"
+select_query = "SELECT format_text, turns FROM psreplays WHERE replayid = ?"
+
+
+class OldArchive:
+    """how the cog used the database before, one pool connection and commit for every save"""
+    def __init__(self, path: str):
+        self.path = path
+        self.pool = None
+
+    async def start(self):
+        self.pool = await asqlite.create_pool(self.path)
+
+    def read(self):
+        return self.pool.acquire()
+
+    async def write(self, query: str, params=()):
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, params)
+            await conn.commit()
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        await self.pool.close()
+
+
+def percentile(times: list[float], q: int) -> float:
+    # inclusive, so small runs never report a percentile past their slowest op
+    return statistics.quantiles(times, n=100, method="inclusive")[q - 1] if len(times) > 1 else times[0]
+
+
+def populate(path: str, rows: int, blob: bytes):
+    conn = sqlite3.connect(path)
+    conn.execute(create_query)
+    conn.executemany(insert_query, ((f"gen3ou-{i}", "format", blob) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+async def run(archive, args, blob: bytes) -> dict:
+    populate(archive.path, args.rows, blob)
+    await archive.start()
+
+    read_times = []
+    write_times = []
+    commit_times = []
+
+    async def reader():
+        for _ in range(args.reads):
+            replay_id = f"gen3ou-{random.randrange(args.rows)}"
+            start = time.perf_counter()
+            async with archive.read() as conn:
+                async with conn.execute(select_query, (replay_id,)) as cursor:
+                    await cursor.fetchone()
+            read_times.append(time.perf_counter() - start)
+
+    async def writer(index: int):
+        for i in range(args.saves):
+            start = time.perf_counter()
+            write = archive.write(insert_query, (f"new-{index}-{i}", "format", blob))
+            if asyncio.iscoroutine(write):  # the old way, the command waits on its commit
+                await write
+                write_times.append(time.perf_counter() - start)
+            else:  # write-behind, the command moves on and the queue commits it
+                write_times.append(time.perf_counter() - start)
+                await write
+            commit_times.append(time.perf_counter() - start)
+
+    async def timed_gather(*coros) -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*coros)
+        return time.perf_counter() - start
+
+    async def saves() -> float:
+        elapsed = await timed_gather(*(writer(index) for index in range(args.writers)))
+        start = time.perf_counter()
+        await archive.flush()
+        return elapsed + time.perf_counter() - start
+
+    save_time, read_time = await asyncio.gather(saves(), timed_gather(*(reader() for _ in range(args.readers))))
+    await archive.close()
+    return {
+        "saves/s": args.writers * args.saves / save_time,
+        "reads/s": len(read_times) / read_time,
+        "read p50": percentile(read_times, 50) * 1e3,
+        "read p99": percentile(read_times, 99) * 1e3,
+        "save p50": percentile(write_times, 50) * 1e3,
+        "save p99": percentile(write_times, 99) * 1e3,
+        "commit p50": percentile(commit_times, 50) * 1e3,
+        "commit p99": percentile(commit_times, 99) * 1e3,
+    }
+
+
+async def main(args):
+    blob = os.urandom(args.blob_size)  # incompressible, about the size of a long compacted replay
+    with tempfile.TemporaryDirectory() as directory:
+        before = await run(OldArchive(os.path.join(directory, "before.db")), args, blob)
+        after = await run(ReplayArchive(os.path.join(directory, "after.db")), args, blob)
+    print(
+        f"{args.writers} writers saving {args.saves} replays each, "
+        f"{args.readers} readers reading {args.reads} of {args.rows} archived replays each"
+    )
+    print(f"{'':10} {'before':>10} {'after':>10}")
+    for name in before:
+        unit = "ms" if name.startswith(("read p", "save p", "commit p")) else ""
+        print(f"{name:10} {before[name]:>10.2f} {after[name]:>10.2f} {unit}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="replays archived before the load starts")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=100, help="replays saved by each writer")
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--reads", type=int, default=200, help="replays read by each reader")
+    parser.add_argument("--blob-size", type=int, default=40000, help="bytes per archived replay")
+    asyncio.run(main(parser.parse_args()))
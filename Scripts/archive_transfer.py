@@ -0,0 +1,273 @@
+"""
+Copies the replay archive out of one database and into another, e.g. to move the bot to a new host or merge
+the archives of two bots, without copying database.db while the bot is writing to it.
+
+python -m Scripts.archive_transfer export DIR [--db database.db] [--since N|DIR/manifest.json] [--chunk-rows 5000]
+python -m Scripts.archive_transfer import DIR [--db database.db] [--batch 500] [--verify-only]
+
+An export is a directory of gzipped chunks with one json line per replay (its psreplays row along with its
+psreplay_meta row, the turns blob in base64), and manifest.json listing every chunk with its row count and sha256.
+The manifest is written last, a directory without one is an export which didn't finish.
+Both sides stream a batch of rows at a time, so memory stays flat however big the archive is, and both can run
+while the bot is up.
+
+--since only exports the replays archived after an earlier export, give it that export's manifest (or its
+last_rowid). Row ids are the order replays were archived in, until a VACUUM renumbers them, so export everything
+again after running migrate_archive --vacuum. Importing the same replay twice is harmless, rows are upserted.
+Imported replays can be searched and /replaystats'd once .replayindex and then .replaystatsindex are run.
+"""
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from Helpers.replay_archive import ReplayArchive, apply_pragmas, ensure_schema
+from Helpers.replay_codec import STORAGE_VERSION
+
+MANIFEST = "manifest.json"
+FORMAT = "tyranitar-archive"
+VERSION = 1
+
+export_query = """
+SELECT p.rowid, p.replayid, p.format_text, p.battle_text1, p.battle_text2, p.turns,
+       m.p1, m.p2, m.format, m.rating, m.uploadtime, m.views
+FROM psreplays p LEFT JOIN psreplay_meta m ON m.replayid = p.replayid
+WHERE p.rowid > ? AND p.rowid <= ?
+ORDER BY p.rowid LIMIT ?
+"""
+# replays never change once uploaded, but a compact row isn't swapped for one still in the old format
+replay_upsert_query = """
+INSERT INTO psreplays (replayid, format_text, battle_text1, battle_text2, turns) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (replayid) DO UPDATE SET
+    format_text = excluded.format_text, battle_text1 = excluded.battle_text1,
+    battle_text2 = excluded.battle_text2, turns = excluded.turns
+WHERE excluded.turns IS NOT NULL OR psreplays.turns IS NULL
+"""
+# views only go up, whichever archive saw more of them is more recent
+meta_upsert_query = """
+INSERT INTO psreplay_meta (replayid, p1, p2, format, rating, uploadtime, views, views_checked)
+VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+ON CONFLICT (replayid) DO UPDATE SET
+    p1 = excluded.p1, p2 = excluded.p2, format = excluded.format, rating = excluded.rating,
+    uploadtime = excluded.uploadtime, views = max(coalesce(views, 0), coalesce(excluded.views, 0))
+"""
+META_FIELDS = ("p1", "p2", "format", "rating", "uploadtime", "views")
+
+
+class Throughput:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.rows = 0
+        self.bytes = 0  # compressed
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (
+            f"{self.rows} rows, {self.bytes / 2 ** 20:.1f} MiB in {elapsed:.1f}s "
+            f"({self.rows / elapsed:.0f} rows/s, {self.bytes / 2 ** 20 / elapsed:.1f} MiB/s)"
+        )
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)  # busy_timeout and wal, the bot may be using the database too
+    return conn
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(2 ** 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_record(row: tuple) -> dict:
+    _, replay_id, format_text, battle_text1, battle_text2, turns, *meta = row
+    record = {"id": replay_id, "format_text": format_text}
+    if turns is not None:
+        record["turns"] = base64.b64encode(turns).decode("ascii")
+    else:  # not converted to the compact format yet
+        record["text1"], record["text2"] = battle_text1, battle_text2
+    if meta[0] is not None:
+        record["meta"] = dict(zip(META_FIELDS, meta))
+    return record
+
+
+def decode_record(record: dict) -> tuple[tuple, tuple | None]:
+    turns = record.get("turns")
+    replay = (
+        record["id"], record.get("format_text"), record.get("text1"), record.get("text2"),
+        base64.b64decode(turns) if turns is not None else None,
+    )
+    meta = record.get("meta")
+    if meta is not None:
+        meta = (record["id"], *(meta.get(field) for field in META_FIELDS))
+    return replay, meta
+
+
+def since_rowid(since: str | None) -> int:
+    if since is None:
+        return 0
+    if since.isdigit():
+        return int(since)
+    path = os.path.join(since, MANIFEST) if os.path.isdir(since) else since
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)["last_rowid"]
+
+
+def export(path: str, directory: str, since: int = 0, chunk_rows: int = 5000, batch: int = 500, level: int = 6):
+    if os.path.exists(os.path.join(directory, MANIFEST)):
+        raise SystemExit(f"{directory} already holds an export")
+    os.makedirs(directory, exist_ok=True)
+    conn = connect(path)
+    # rows archived while exporting are left for the next --since export
+    until, = conn.execute("SELECT coalesce(max(rowid), 0) FROM psreplays").fetchone()
+    chunks = []
+    progress = Throughput()
+    last_rowid = since
+    file = None
+    while True:
+        # a short read per batch instead of one long one, so the bot's checkpoints aren't held up
+        rows = conn.execute(export_query, (last_rowid, until, batch)).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            if file is None:
+                name = f"replays-{len(chunks):05d}.jsonl.gz"
+                file = gzip.open(os.path.join(directory, name), "wt", encoding="utf-8", compresslevel=level)
+                chunk = {"file": name, "rows": 0, "first_rowid": row[0]}
+            file.write(json.dumps(encode_record(row), separators=(',', ':')) + '\n')
+            chunk["rows"] += 1
+            chunk["last_rowid"] = row[0]
+            if chunk["rows"] >= chunk_rows:
+                chunks.append(finish_chunk(directory, file, chunk, progress))
+                file = None
+        last_rowid = rows[-1][0]
+    if file is not None:
+        chunks.append(finish_chunk(directory, file, chunk, progress))
+    conn.close()
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "storage_version": STORAGE_VERSION,
+        "created": int(time.time()),
+        "since_rowid": since,
+        "last_rowid": max(last_rowid, since),
+        "rows": sum(chunk["rows"] for chunk in chunks),
+        "chunks": chunks,
+    }
+    # written last and renamed into place, so an export which was cut short has no manifest
+    with open(os.path.join(directory, MANIFEST + ".tmp"), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(os.path.join(directory, MANIFEST + ".tmp"), os.path.join(directory, MANIFEST))
+    print(f"Exported {progress.summary()}, {len(chunks)} chunks. Next incremental export: --since {manifest['last_rowid']}")
+
+
+def finish_chunk(directory: str, file, chunk: dict, progress: Throughput) -> dict:
+    file.close()
+    chunk_path = os.path.join(directory, chunk["file"])
+    chunk["bytes"] = os.path.getsize(chunk_path)
+    chunk["sha256"] = file_sha256(chunk_path)
+    progress.rows += chunk["rows"]
+    progress.bytes += chunk["bytes"]
+    print(f"{chunk['file']}: {chunk['rows']} rows, total {progress.summary()}", flush=True)
+    return chunk
+
+
+def read_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        raise SystemExit(f"{directory} has no {MANIFEST}, the export didn't finish")
+    if manifest.get("format") != FORMAT or manifest.get("version", 0) > VERSION:
+        raise SystemExit(f"{directory} isn't an export this version can read")
+    if manifest.get("storage_version", 0) > STORAGE_VERSION:
+        raise SystemExit(f"{directory} holds turns in a newer storage format, update the bot first")
+    return manifest
+
+
+def verify(directory: str, manifest: dict) -> list[str]:
+    """chunks which are missing or don't match their checksum"""
+    bad = []
+    for chunk in manifest["chunks"]:
+        chunk_path = os.path.join(directory, chunk["file"])
+        if not os.path.exists(chunk_path) or file_sha256(chunk_path) != chunk["sha256"]:
+            bad.append(chunk["file"])
+    return bad
+
+
+async def prepare(path: str):
+    """creates the tables (and brings old databases up to date) the same way the bot does"""
+    archive = ReplayArchive(path, readers=1)
+    await archive.start()
+    await ensure_schema(archive)
+    await archive.close()
+
+
+def import_(path: str, directory: str, batch: int = 500, verify_only: bool = False):
+    manifest = read_manifest(directory)
+    bad = verify(directory, manifest)
+    if bad:
+        raise SystemExit(f"Checksum mismatch or missing chunks, nothing was imported: {', '.join(bad)}")
+    print(f"{len(manifest['chunks'])} chunks ({manifest['rows']} rows) verified")
+    if verify_only:
+        return
+    asyncio.run(prepare(path))
+    conn = connect(path)
+    progress = Throughput()
+    for chunk in manifest["chunks"]:
+        chunk_path = os.path.join(directory, chunk["file"])
+        with gzip.open(chunk_path, "rt", encoding="utf-8") as file:
+            replays, metas = [], []
+            for line in file:
+                replay, meta = decode_record(json.loads(line))
+                replays.append(replay)
+                if meta is not None:
+                    metas.append(meta)
+                if len(replays) >= batch:
+                    upsert(conn, replays, metas)
+                    progress.rows += len(replays)
+                    replays, metas = [], []
+            upsert(conn, replays, metas)
+            progress.rows += len(replays)
+        progress.bytes += chunk["bytes"]
+        print(f"{chunk['file']}: total {progress.summary()}", flush=True)
+    conn.close()
+    print(f"Imported {progress.summary()}")
+    print("Run .replayindex and then .replaystatsindex on the bot to make the new replays searchable")
+
+
+def upsert(conn: sqlite3.Connection, replays: list[tuple], metas: list[tuple]):
+    """one transaction per batch"""
+    with conn:
+        conn.executemany(replay_upsert_query, replays)
+        conn.executemany(meta_upsert_query, metas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write the archive out to a directory")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--db", default="database.db")
+    export_parser.add_argument("--since", help="only replays archived after this export (its manifest) or rowid")
+    export_parser.add_argument("--chunk-rows", type=int, default=5000, help="replays per chunk file")
+    export_parser.add_argument("--batch", type=int, default=500, help="rows read from the database at once")
+    export_parser.add_argument("--level", type=int, default=6, help="gzip compression level")
+    import_parser = commands.add_parser("import", help="upsert an export into a database")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--db", default="database.db")
+    import_parser.add_argument("--batch", type=int, default=500, help="rows upserted per transaction")
+    import_parser.add_argument("--verify-only", action="store_true", help="only check the chunks against the manifest")
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.db, args.directory, since_rowid(args.since), args.chunk_rows, args.batch, args.level)
+    else:
+        import_(args.db, args.directory, args.batch, args.verify_only)
@@ -0,0 +1,317 @@
+"""
+Load test of the replay cog end to end, without discord or showdown: fake contexts and interactions drive
+/replay and the viewer buttons while a local showdown stand-in (Scripts.fake_showdown) serves the replays.
+
+python -m Scripts.bot_bench [--replays 50] [--concurrency 10] [--herd 50] [--users 10] [--clicks 50]
+                            [--latency 0.05] [--parsers 2] [--render-workers 0] [--fixtures DIR]
+                            [--save results.json] [--baseline results.json] [--stages]
+Scenarios, run in this order against a throwaway archive:
+  cold      /replay of replays nobody has asked for yet (showdown, parse, save)
+  archived  /replay of the same replays after a restart (empty caches, served from the archive)
+  herd      --herd people asking for the same new replay at once
+  navigate  --users people clicking through their viewers --clicks times as fast as they can
+--save writes the results to compare later runs against with --baseline. --stages adds the span histograms.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+import discord
+
+from Cogs.replays import Replay
+from Helpers.fetch_scheduler import FetchScheduler
+from Helpers.lazy_browser import LazyBrowser, process_tree_rss
+from Helpers.loop_monitor import LoopLagMonitor
+from Helpers.metrics import Metrics
+from Helpers.parse_pool import ParsePool
+from Helpers.render_queue import RenderQueue
+from Helpers.replay_archive import ReplayArchive, ensure_schema
+from Helpers.showdown_client import ShowdownClient
+from Scripts.fake_showdown import FakeShowdown
+
+
+class FakeMessage:
+    def __init__(self, content=None, embeds=None, view=None):
+        self.content = content
+        self.embeds = embeds or []
+        self.view = view
+        # what discord would send back, the viewer reads its replay id out of these
+        self.components = [discord.ActionRow(row) for row in view.to_components()] if view is not None else []
+
+    async def edit(self, content=None, **_):
+        return FakeMessage(content, self.embeds, self.view)
+
+    async def delete(self):
+        pass
+
+
+class FakeContext:
+    """what Replay.replay uses of a commands.Context"""
+    def __init__(self, user_id: int, guild_id: int):
+        self.author = SimpleNamespace(id=user_id)
+        self.guild = SimpleNamespace(id=guild_id)
+        self.sent: list[FakeMessage] = []
+
+    async def defer(self):
+        pass
+
+    async def send(self, content=None, *, embeds=None, view=None, ephemeral=False):
+        message = FakeMessage(content, embeds, view)
+        self.sent.append(message)
+        return message
+
+    @property
+    def viewer(self) -> FakeMessage | None:
+        return next((message for message in self.sent if message.view is not None), None)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+        self.message: FakeMessage | None = None
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self):
+        self.done = True
+
+    async def edit_message(self, *, embeds=None, view=None):
+        self.done = True
+        self.message = FakeMessage(None, embeds, view)
+
+    async def send_message(self, content=None, *, ephemeral=False):
+        self.done = True
+
+    async def send_modal(self, modal):
+        self.done = True
+
+
+class FakeInteraction:
+    """a click on one of a viewer message's buttons, as Replay.on_interaction sees it"""
+    def __init__(self, message: FakeMessage, custom_id: str, user_id: int, guild_id: int):
+        self.type = discord.InteractionType.component
+        self.data = {"custom_id": custom_id}
+        self.message = message
+        self.user = SimpleNamespace(id=user_id)
+        self.guild_id = guild_id
+        self.response = FakeResponse()
+        self.followup = SimpleNamespace(send=self._followup)
+
+    async def _followup(self, content=None, *, ephemeral=False):
+        pass
+
+    async def edit_original_response(self, *, embeds=None, view=None):
+        self.response.message = FakeMessage(None, embeds, view)
+
+
+def percentile(times: list[float], q: int) -> float:
+    # inclusive, so small runs never report a percentile past their slowest op
+    return statistics.quantiles(times, n=100, method="inclusive")[q - 1] if len(times) > 1 else times[0]
+
+
+class PeakRSS:
+    """samples the memory of this process and its children (parsers, render workers) in the background"""
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, process_tree_rss() or 0)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def reset(self) -> int:
+        peak, self.peak = self.peak, process_tree_rss() or 0
+        return peak
+
+    def stop(self):
+        self._task.cancel()
+
+
+async def timed(times: list[float], coro):
+    start = time.perf_counter()
+    result = await coro
+    if isinstance(result, list):  # it timed each of its steps itself
+        times.extend(result)
+    else:
+        times.append(time.perf_counter() - start)
+
+
+async def scenario(name: str, rss: PeakRSS, server: FakeShowdown, coros, concurrency: int) -> dict:
+    """runs the coroutines `concurrency` at a time, timing each of them"""
+    times = []
+    requests = server.requests
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coro):
+        async with semaphore:
+            await timed(times, coro)
+
+    rss.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(coro) for coro in coros))
+    elapsed = time.perf_counter() - start
+    return {
+        "scenario": name,
+        "ops": len(times),
+        "ops/s": len(times) / elapsed,
+        "p50": percentile(times, 50) * 1e3,
+        "p95": percentile(times, 95) * 1e3,
+        "p99": percentile(times, 99) * 1e3,
+        "max": max(times) * 1e3,
+        "showdown requests": server.requests - requests,
+        "peak rss": rss.reset() / 2 ** 20,
+    }
+
+
+async def command(replays: Replay, user_id: int, replay_id: str) -> FakeContext:
+    ctx = FakeContext(user_id, guild_id=user_id % 5)
+    # the id, links are only recognised on showdown's domain
+    await replays.replay.callback(replays, ctx, replay_id)
+    if ctx.viewer is None:
+        raise RuntimeError(f"{replay_id} wasn't shown: {[message.content for message in ctx.sent]}")
+    return ctx
+
+
+async def navigate(replays: Replay, ctx: FakeContext, clicks: int) -> list[float]:
+    """clicks next until the end then previous back, one click after the other, returns how long each took"""
+    times = []
+    message = ctx.viewer
+    user_id = ctx.author.id
+    forwards = True
+    for _ in range(clicks):
+        buttons = message.view.children
+        if buttons[2].disabled:
+            forwards = False
+        elif buttons[0].disabled:
+            forwards = True
+        interaction = FakeInteraction(message, buttons[2 if forwards else 0].custom_id, user_id, ctx.guild.id)
+        start = time.perf_counter()
+        await replays.on_interaction(interaction)
+        times.append(time.perf_counter() - start)
+        message = interaction.response.message
+    return times
+
+
+async def main(args) -> list[dict]:
+    server = FakeShowdown(latency=args.latency, fixtures=args.fixtures)
+    base_url = await server.start(port=0)
+    rss = PeakRSS()
+    rss.start()
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "bench.db")
+
+    bot = SimpleNamespace()
+    bot.showdown = ShowdownClient(base_url=base_url)
+    await bot.showdown.start()
+    bot.archive = ReplayArchive(path, readers=4, batch_size=64)
+    await bot.archive.start()
+    await ensure_schema(bot.archive)
+    bot.parse_pool = ParsePool(kind="process" if args.parsers else "thread", workers=args.parsers or 1)
+    await bot.parse_pool.start()
+    # as configured in main.py, but nobody gets turned away, that's not what this measures
+    bot.fetch_scheduler = FetchScheduler(concurrency=4, reserved=1, per_user=2, per_guild=3, max_queue=10 ** 6, max_user_queue=10 ** 6)
+    bot.loop_monitor = LoopLagMonitor()
+    bot.loop_monitor.start()
+    bot.metrics = Metrics()
+    bot.browser_pool = LazyBrowser(pool_size=3, max_uses=50, idle_timeout=None)
+    # the fake showdown's replay pages can't be played back in chromium, only their logs can be rendered
+    bot.render_from_log = True
+    bot.render_queue = None
+    if args.render_workers:
+        bot.render_queue = RenderQueue(workers=args.render_workers)
+        await bot.render_queue.start()
+        while bot.render_queue.connected < args.render_workers:
+            await asyncio.sleep(0.1)
+
+    ids = [f"gen3ou-{9000000 + i}" for i in range(args.replays)]
+    users = itertools.count(1)
+    results = []
+    try:
+        replays = Replay(bot)
+        results.append(await scenario(
+            "cold", rss, server, [command(replays, next(users), replay_id) for replay_id in ids], args.concurrency
+        ))
+        await bot.archive.flush()
+        replays = Replay(bot)  # a restart, nothing cached but the archive
+        results.append(await scenario(
+            "archived", rss, server, [command(replays, next(users), replay_id) for replay_id in ids], args.concurrency
+        ))
+        herd_id = f"gen3ou-{8000000 + args.replays}"
+        results.append(await scenario(
+            "herd", rss, server, [command(replays, next(users), herd_id) for _ in range(args.herd)], args.herd
+        ))
+        viewers = [await command(replays, next(users), ids[index % len(ids)]) for index in range(args.users)]
+        results.append(await scenario(
+            "navigate", rss, server, [navigate(replays, ctx, args.clicks) for ctx in viewers], args.users
+        ))
+        results.append({"scenario": "event loop", "max lag": bot.loop_monitor.max_lag * 1e3})
+    finally:
+        rss.stop()
+        if bot.render_queue is not None:
+            await bot.render_queue.close()
+        bot.loop_monitor.stop()
+        bot.parse_pool.shutdown()
+        await bot.showdown.close()
+        await bot.archive.close()
+        await server.close()
+        directory.cleanup()
+
+    if args.stages:
+        print(f"{'stage':18}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9} ms")
+        for name, (count, p50, p95, p99) in bot.metrics.summary().items():
+            print(f"{name:18}{count:>7}{p50 * 1e3:>9.1f}{p95 * 1e3:>9.1f}{p99 * 1e3:>9.1f}")
+        print()
+    return results
+
+
+def report(results: list[dict], baseline: list[dict] | None):
+    before = {result["scenario"]: result for result in baseline or ()}
+    for result in results:
+        old = before.get(result["scenario"], {})
+        values = []
+        for key, value in result.items():
+            if key == "scenario":
+                continue
+            text = f"{key} {value:.1f}" if isinstance(value, float) else f"{key} {value}"
+            if key in old and old[key]:
+                text += f" ({(value - old[key]) / old[key]:+.0%})"
+            values.append(text)
+        print(f"{result['scenario']:11} " + ", ".join(values))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replays", type=int, default=50, help="distinct replays for the cold and archived runs")
+    parser.add_argument("--concurrency", type=int, default=10, help="commands running at once")
+    parser.add_argument("--herd", type=int, default=50, help="people asking for the same replay at once")
+    parser.add_argument("--users", type=int, default=10, help="people navigating at once")
+    parser.add_argument("--clicks", type=int, default=50, help="clicks of each navigating user")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake showdown takes to answer")
+    parser.add_argument("--parsers", type=int, default=2, help="parser processes, 0 parses on a thread")
+    parser.add_argument("--render-workers", type=int, default=0, help="render worker processes, 0 renders in process")
+    parser.add_argument("--fixtures", help="directory of recorded replays for the fake showdown")
+    parser.add_argument("--save", help="file to write the results to")
+    parser.add_argument("--baseline", help="results saved by an earlier run to compare against")
+    parser.add_argument("--stages", action="store_true", help="also print the latency of every stage")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,249 @@
+"""
+Replay renders through the browser pool with every request let through (how pages were rendered before)
+against the pool's request filter (allowed_resources, blocked_hosts), on a local stand-in of the replay page.
+
+python -m Scripts.browser_bench [--replays 30] [--concurrency 3] [--assets 20] [--asset-kb 40]
+                                [--asset-latency 0.05] [--latency 0.02]
+Needs chromium (playwright install chromium), nothing goes to showdown.
+The stand-in page is shaped like the real one for what matters here: a stylesheet ahead of the client script
+(so it holds up domcontentloaded), a web font, --assets sprites and backgrounds, music, an analytics script from
+another host, and a client script which fetches the log and only enables "Skip to end" once it's in.
+Each render is what Replay.fetch_battle_logs does, goto, skip to the end, read the log, switch viewpoint and read it
+again, timed per render. Before waits for the load event like the cog used to, after only for domcontentloaded.
+Both runs have to read the same logs, so the filter can't be dropping anything the log needs.
+
+python -m Scripts.browser_bench --live LINK [LINK ...] [--concurrency 3]
+Does that last check on real replay pages instead: every link is rendered the old way (everything let through,
+waiting for load) and the way the cog does now (DEFAULT_ALLOWED_RESOURCES, DEFAULT_BLOCKED_HOSTS, waiting for
+domcontentloaded), and both logs of both viewpoints have to be the same. Exits with 1 if any differ.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from aiohttp import web
+from playwright.async_api import async_playwright
+
+from Helpers.browser_pool import DEFAULT_ALLOWED_RESOURCES, DEFAULT_BLOCKED_HOSTS, BrowserPool
+from Scripts.fake_showdown import make_replay
+
+# stands in for the client, builds the log the way the page shows it: a header per turn, one line per message
+CLIENT_SCRIPT = """
+const log = document.querySelector('[role=log]');
+const skip = document.getElementById('skip');
+const viewpoint = document.getElementById('viewpoint');
+let lines = [], flipped = false;
+function render() {
+    log.innerHTML = lines.map(line => {
+        const parts = line.split('|');
+        if (parts[1] === 'turn') return `<h2 class="battle-history">Turn ${parts[2]}</h2>`;
+        let text = parts.slice(1).join(' ');
+        if (flipped) text = text.replace(/p1|p2/g, side => side === 'p1' ? 'p2' : 'p1');
+        return `<div class="battle-history">${text}</div>`;
+    }).join('');
+}
+fetch(location.pathname + '.log').then(response => response.text()).then(text => {
+    lines = text.split('\\n');
+    skip.disabled = false;
+});
+skip.onclick = render;
+viewpoint.onclick = () => { flipped = !flipped; render(); };
+"""
+
+
+def percentile(times: list[float], q: int) -> float:
+    # inclusive, so small runs never report a percentile past their slowest op
+    return statistics.quantiles(times, n=100, method="inclusive")[q - 1] if len(times) > 1 else times[0]
+
+
+class ReplayPage:
+    """serves the stand-in replay pages, their logs and their assets, counting what was asked for"""
+    def __init__(self, assets: int, asset_kb: int, asset_latency: float, latency: float):
+        self.assets = assets
+        self.asset = b"\0" * (asset_kb * 1024)
+        self.asset_latency = asset_latency
+        self.latency = latency
+        self.requests = 0
+        self.bytes = 0
+        self.analytics_url = ""
+        self.app = web.Application()
+        self.app.router.add_get("/assets/{name}", self.handle_asset)
+        self.app.router.add_get("/{name}", self.handle_replay)
+        self.runner: web.AppRunner | None = None
+
+    def respond(self, body: bytes, content_type: str) -> web.Response:
+        self.requests += 1
+        self.bytes += len(body)
+        return web.Response(body=body, content_type=content_type)
+
+    async def handle_asset(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        await asyncio.sleep(self.latency if name == "client.js" else self.asset_latency)
+        if name == "client.js":
+            return self.respond(CLIENT_SCRIPT.encode(), "application/javascript")
+        if name == "analytics.js":
+            return self.respond(b"window.tracked = true;" + self.asset, "application/javascript")
+        if name == "style.css":
+            css = "@font-face { font-family: pokemon; src: url(/assets/font.woff2); } body { font-family: pokemon; }"
+            return self.respond(css.encode() + b"/*" + self.asset + b"*/", "text/css")
+        content_type = {"woff2": "font/woff2", "mp3": "audio/mpeg"}.get(name.rsplit('.', 1)[-1], "image/png")
+        return self.respond(self.asset, content_type)
+
+    async def handle_replay(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        name = request.match_info["name"]
+        replay_id = name.removesuffix(".log")
+        replay = make_replay(replay_id)
+        if name.endswith(".log"):
+            return self.respond(replay["log"].encode(), "text/plain")
+        images = ''.join(f'<img src="/assets/sprite-{replay_id}-{number}.png">' for number in range(self.assets))
+        page = (
+            f'<!DOCTYPE html><html><head><title>{replay["format"]}</title>'
+            '<link rel="stylesheet" href="/assets/style.css">'
+            f'<script async src="{self.analytics_url}"></script></head><body>'
+            f'<div class="battle">{images}<audio src="/assets/music-{replay_id}.mp3" preload="auto"></audio></div>'
+            '<button id="skip" disabled>Skip to end</button><button id="viewpoint">Switch viewpoint</button>'
+            '<div class="battle-log" role="log"></div>'
+            '<script src="/assets/client.js"></script></body></html>'
+        )
+        return self.respond(page.encode(), "text/html")
+
+    async def start(self) -> tuple[str, str]:
+        """serves in the background, returns the base url and the host analytics are served from"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        port = self.runner.addresses[0][1]
+        # another host name for the same server, like analytics being on another domain than the replay
+        self.analytics_url = f"http://localhost:{port}/assets/analytics.js"
+        return f"http://127.0.0.1:{port}/", f"localhost:{port}"
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+async def render(pool: BrowserPool, url: str, wait_until: str = "domcontentloaded") -> tuple[str, str]:
+    """what Replay.fetch_battle_logs does"""
+    async with pool.page() as page:
+        await page.goto(url=url, wait_until=wait_until)
+        await page.get_by_role("button", name="Skip to end").click()
+        html_log = await page.get_by_role("log").inner_html()
+        await page.get_by_role("button", name="viewpoint").click()
+        html_log2 = await page.get_by_role("log").inner_html()
+    return html_log, html_log2
+
+
+async def run(browser, server: ReplayPage, base_url: str, replay_ids: list[str], concurrency: int, wait_until: str = "domcontentloaded", **filters):
+    pool = BrowserPool(browser, size=concurrency, **filters)
+    await pool.start()
+    server.requests = server.bytes = 0
+    times = []
+
+    async def timed(replay_id: str):
+        start = time.perf_counter()
+        logs = await render(pool, base_url + replay_id, wait_until)
+        times.append(time.perf_counter() - start)
+        return logs
+
+    start = time.perf_counter()
+    logs = await asyncio.gather(*(timed(replay_id) for replay_id in replay_ids))
+    elapsed = time.perf_counter() - start
+    await pool.close()
+    results = {
+        "renders/s": len(replay_ids) / elapsed,
+        "p50": percentile(times, 50) * 1e3,
+        "p95": percentile(times, 95) * 1e3,
+        "max": max(times) * 1e3,
+        "requests": server.requests / len(replay_ids),
+        "KiB": server.bytes / 1024 / len(replay_ids),
+        "blocked": pool.blocked_requests / len(replay_ids),
+    }
+    return results, logs
+
+
+async def main(args):
+    server = ReplayPage(args.assets, args.asset_kb, args.asset_latency, args.latency)
+    base_url, analytics_host = await server.start()
+    replay_ids = [f"gen3ou-{number}" for number in range(1, args.replays + 1)]
+    playwright = await async_playwright().start()
+    try:
+        browser = await playwright.chromium.launch()
+        try:
+            # a render of each first, so neither run pays for chromium warming up
+            await run(browser, server, base_url, replay_ids[:args.concurrency], args.concurrency)
+            before, logs = await run(
+                browser, server, base_url, replay_ids, args.concurrency, "load", allowed_resources=None, blocked_hosts=(),
+            )
+            after, filtered_logs = await run(
+                browser, server, base_url, replay_ids, args.concurrency,
+                allowed_resources=DEFAULT_ALLOWED_RESOURCES, blocked_hosts=DEFAULT_BLOCKED_HOSTS + (analytics_host,),
+            )
+        finally:
+            await browser.close()
+    finally:
+        await playwright.stop()
+        await server.close()
+    print(
+        f"{args.replays} renders, {args.concurrency} at once, {args.assets} assets of {args.asset_kb} KiB "
+        f"taking {args.asset_latency * 1e3:.0f}ms each"
+    )
+    print(f"{'':10} {'before':>10} {'after':>10}")
+    for name in before:
+        unit = {"p50": "ms", "p95": "ms", "max": "ms", "requests": "per render", "KiB": "per render", "blocked": "per render"}
+        print(f"{name:10} {before[name]:>10.1f} {after[name]:>10.1f} {unit.get(name, '')}")
+    different = [replay_id for replay_id, ours, theirs in zip(replay_ids, filtered_logs, logs) if ours != theirs]
+    if different:
+        print(f"The filtered renders read different logs for {len(different)} replays: {', '.join(different[:5])}")
+
+
+async def check_live(links: list[str], concurrency: int) -> list[str]:
+    """renders every link unfiltered and filtered, returns the ones whose logs differ"""
+    problems = []
+    playwright = await async_playwright().start()
+    try:
+        browser = await playwright.chromium.launch()
+        unfiltered = BrowserPool(browser, size=concurrency, allowed_resources=None, blocked_hosts=())
+        filtered = BrowserPool(browser, size=concurrency)
+        await unfiltered.start()
+        await filtered.start()
+        try:
+            logs = await asyncio.gather(*(render(unfiltered, link, "load") for link in links), return_exceptions=True)
+            filtered_logs = await asyncio.gather(*(render(filtered, link) for link in links), return_exceptions=True)
+        finally:
+            await unfiltered.close()
+            await filtered.close()
+            await browser.close()
+    finally:
+        await playwright.stop()
+    for link, theirs, ours in zip(links, logs, filtered_logs):
+        if isinstance(theirs, Exception) or isinstance(ours, Exception):
+            problems.append(f"{link}: couldn't render, {theirs if isinstance(theirs, Exception) else ours}")
+        elif not theirs[0]:
+            problems.append(f"{link}: the unfiltered page has an empty log")
+        elif ours != theirs:
+            side = "first viewpoint" if ours[0] != theirs[0] else "second viewpoint"
+            problems.append(f"{link}: the filtered page reads a different log from the {side}")
+    print(f"{len(links) - len(problems)} of {len(links)} replays read the same log filtered and unfiltered ({filtered.blocked_requests} requests blocked)")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replays", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=3, help="pool size, renders running at once")
+    parser.add_argument("--assets", type=int, default=20, help="sprites and backgrounds on each page")
+    parser.add_argument("--asset-kb", type=int, default=40, help="size of every asset")
+    parser.add_argument("--asset-latency", type=float, default=0.05, help="seconds each asset takes to arrive")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the page, its log and client script take")
+    parser.add_argument("--live", nargs="+", metavar="LINK", help="real replay links to compare the logs of instead")
+    args = parser.parse_args()
+    if args.live:
+        problems = asyncio.run(check_live(args.live, args.concurrency))
+        for problem in problems:
+            print(problem)
+        print(f"{len(problems)} problems")
+        sys.exit(1 if problems else 0)
+    asyncio.run(main(args))
@@ -0,0 +1,114 @@
+"""
+Checks that Scripts.ingest picks up where it left off: an ingest into a throwaway database is killed part way,
+run again until it finishes, then run once more, with Scripts.fake_showdown serving the replays.
+
+python -m Scripts.check_ingest_resume [--replays 40] [--missing 3] [--latency 0.05]
+The kill is a SIGKILL, so only what was committed by then counts as done. Every rerun has to skip what's archived
+or checkpointed and only ask showdown for the rest, replays showdown doesn't have (--missing of them) have to
+end up checkpointed as failed and only be asked for again with --retry-failed.
+"""
+import argparse
+import asyncio
+import os
+import re
+import signal
+import sqlite3
+import sys
+import tempfile
+
+from Scripts.fake_showdown import FakeShowdown
+
+JOB = "resume-check"
+
+
+def finished(path: str) -> tuple[set[str], set[str]]:
+    """archived replays, and the ones checkpointed as failed, as committed right now"""
+    if not os.path.exists(path):
+        return set(), set()
+    conn = sqlite3.connect(path, timeout=10)
+    try:
+        archived = {row[0] for row in conn.execute("SELECT replayid FROM psreplays")}
+        failed = {row[0] for row in conn.execute("SELECT replayid FROM psreplay_ingest WHERE job = ? AND status = 'failed'", (JOB,))}
+    except sqlite3.OperationalError:  # the tables aren't there yet
+        return set(), set()
+    finally:
+        conn.close()
+    return archived, failed
+
+
+async def ingest(path: str, base_url: str, ids: list[str], *extra: str, kill_after: int | None = None) -> tuple[int, int]:
+    """
+    Runs Scripts.ingest to the end, or SIGKILLs it and its parser processes once kill_after replays are committed.
+    Returns its exit code and how many replays it skipped (-1 if it didn't get to say)
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "Scripts.ingest", "--db", path, "--base-url", base_url, "--job", JOB,
+        "--workers", "2", "--parsers", "1", "--from-log", "--ids", *ids, *extra,
+        stdout=asyncio.subprocess.PIPE, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        start_new_session=True,
+    )
+    if kill_after is not None:
+        while process.returncode is None and sum(map(len, finished(path))) < kill_after:
+            await asyncio.sleep(0.05)
+        if process.returncode is None:
+            os.killpg(process.pid, signal.SIGKILL)
+    output, _ = await process.communicate()
+    skipped = re.findall(r'^Job \S+: \d+ archived, (\d+) skipped', output.decode(), re.MULTILINE)
+    return process.returncode, int(skipped[-1]) if skipped else -1
+
+
+async def main(args) -> list[str]:
+    problems = []
+    ids = [f"gen3ou-{number}" for number in range(1, args.replays + 1)]
+    missing = [f"gen3ou-{number}404" for number in range(1, args.missing + 1)]
+    server = FakeShowdown(latency=args.latency)
+    base_url = await server.start(port=0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "ingest.db")
+        try:
+            await ingest(path, base_url, ids + missing, kill_after=len(ids) // 3)
+            archived, failed = finished(path)
+            print(f"killed with {len(archived)} archived and {len(failed)} failed committed")
+            if len(archived) + len(failed) >= len(ids) + len(missing):
+                problems.append("the first run finished before it could be killed, try more --replays or --latency")
+
+            # only what wasn't committed is asked for again, one .json each
+            server.requests = 0
+            code, skipped = await ingest(path, base_url, ids + missing)
+            left = len(ids) + len(missing) - len(archived) - len(failed)
+            if code != 0:
+                problems.append(f"resumed run exited with {code}")
+            if skipped != len(archived) + len(failed):
+                problems.append(f"resumed run skipped {skipped} replays, {len(archived) + len(failed)} were committed")
+            if server.requests != left:
+                problems.append(f"resumed run made {server.requests} requests for {left} replays left")
+            archived, failed = finished(path)
+            if archived != set(ids):
+                problems.append(f"not archived after resuming: {sorted(set(ids) - archived)}")
+            if failed != set(missing):
+                problems.append(f"checkpointed as failed: {sorted(failed)}, expected {sorted(missing)}")
+
+            server.requests = 0
+            _, skipped = await ingest(path, base_url, ids + missing)
+            if server.requests or skipped != len(ids) + len(missing):
+                problems.append(f"run of a finished job skipped {skipped} replays and made {server.requests} requests")
+
+            server.requests = 0
+            await ingest(path, base_url, ids + missing, "--retry-failed")
+            if server.requests != len(missing):
+                problems.append(f"--retry-failed made {server.requests} requests for {len(missing)} failed replays")
+        finally:
+            await server.close()
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replays", type=int, default=40, help="replays showdown has")
+    parser.add_argument("--missing", type=int, default=3, help="replays showdown doesn't have")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    problems = asyncio.run(main(parser.parse_args()))
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problems")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,137 @@
+"""
+Checks that replays rendered from their protocol log read exactly like the same replays rendered by the replay page
+in chromium, turn by turn from both viewpoints. The bot only renders from the log (bot.render_from_log in main.py)
+once this passes on recorded replays of several formats, long games included.
+
+python -m Scripts.check_log_parity [--fixtures Scripts/fixtures] [--show 3]
+python -m Scripts.check_log_parity --record LINK_OR_ID [...] [--fixtures Scripts/fixtures]
+
+A fixture is DIR/<id>.json (showdown's .json saved as is) along with DIR/<id>.p1.html and DIR/<id>.p2.html,
+the battle log html the replay page shows from each viewpoint. --record saves all three for the given replays,
+which needs showdown and chromium (playwright install chromium), checking them again runs offline.
+Fixtures without the html are only checked for rendering at all, like the hand-written logs already in
+Scripts/fixtures. A log the renderer refuses (UnsupportedLogLine) falls back to the browser so isn't a mismatch,
+but is listed since each one costs a browser render. Without any recorded html nothing is compared, which fails too.
+The same fixtures can be served by Scripts.fake_showdown --fixtures and checked by Scripts.check_replay_analytics.
+"""
+import argparse
+import asyncio
+import difflib
+import glob
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+from Helpers.battle_log import UnsupportedLogLine, log_battle_parser
+from Helpers.html_parser import html_battle_views
+from Helpers.replay_id import parse_replay_id, replay_url
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def read(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def diff_views(name: str, ours, theirs, show: int) -> list[str]:
+    """differences between the log's and the page's (format_text, turn texts) of one viewpoint"""
+    problems = []
+    (format_text, turns), (page_format_text, page_turns) = ours, theirs
+    if format_text != page_format_text:
+        problems.append(f"{name}: format text differs\n" + '\n'.join(
+            difflib.unified_diff(page_format_text.splitlines(), format_text.splitlines(), "page", "log", lineterm='')
+        ))
+    if len(turns) != len(page_turns):
+        problems.append(f"{name}: {len(turns)} turns from the log, {len(page_turns)} from the page")
+    for number, (text, page_text) in enumerate(zip(turns, page_turns)):
+        if text != page_text:
+            if len(problems) >= show:
+                problems.append(f"{name}: more turns differ")
+                break
+            problems.append(f"{name}: turn {number} differs\n" + '\n'.join(
+                difflib.unified_diff(page_text.splitlines(), text.splitlines(), "page", "log", lineterm='')
+            ))
+    return problems
+
+
+def check(directory: str, show: int) -> tuple[list[str], list[str], int, int]:
+    """mismatches, fallbacks, replays compared and replays only rendered"""
+    mismatches, fallbacks = [], []
+    compared = rendered = 0
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        replay_id = os.path.basename(path)[:-len(".json")]
+        log = json.loads(read(path))["log"]
+        try:
+            ours = log_battle_parser(log)
+        except UnsupportedLogLine as e:
+            fallbacks.append(f"{replay_id}: {e}")
+            continue
+        html_log = read(os.path.join(directory, replay_id + ".p1.html"))
+        html_log2 = read(os.path.join(directory, replay_id + ".p2.html"))
+        if html_log is None or html_log2 is None:
+            rendered += 1
+            continue
+        compared += 1
+        theirs = html_battle_views(html_log, html_log2)
+        for viewpoint, mine, page in zip(("p1", "p2"), ours, theirs):
+            mismatches += diff_views(f"{replay_id} ({viewpoint})", mine, page, show)
+    return mismatches, fallbacks, compared, rendered
+
+
+async def record(directory: str, links: list[str]):
+    """saves the .json and the page's battle logs of every replay, the way the bot would render it"""
+    from Cogs.replays import Replay
+    from Helpers.lazy_browser import LazyBrowser
+    from Helpers.metrics import Metrics
+    from Helpers.showdown_client import ShowdownClient
+
+    os.makedirs(directory, exist_ok=True)
+    bot = SimpleNamespace(metrics=Metrics(), showdown=ShowdownClient(), browser_pool=LazyBrowser(pool_size=1, idle_timeout=None))
+    await bot.showdown.start()
+    replays = Replay(bot)
+    try:
+        for link in links:
+            replay_id = parse_replay_id(link)
+            if replay_id is None:
+                print(f"{link}: not a replay link")
+                continue
+            url = replay_url(replay_id)
+            status, data = await bot.showdown.get_json(url + ".json")
+            if data is None:
+                print(f"{replay_id}: {status}")
+                continue
+            html_log, html_log2 = await replays.fetch_battle_logs(url)
+            for suffix, text in ((".json", json.dumps(data, indent=1)), (".p1.html", html_log), (".p2.html", html_log2)):
+                with open(os.path.join(directory, replay_id + suffix), "w", encoding="utf-8") as file:
+                    file.write(text)
+            print(f"{replay_id}: recorded")
+    finally:
+        await bot.browser_pool.close()
+        await bot.showdown.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--record", nargs="+", metavar="LINK_OR_ID", help="record these replays into --fixtures first")
+    parser.add_argument("--show", type=int, default=3, help="differing turns shown per viewpoint")
+    args = parser.parse_args()
+    if args.record:
+        asyncio.run(record(args.fixtures, args.record))
+    mismatches, fallbacks, compared, rendered = check(args.fixtures, args.show)
+    for problem in mismatches:
+        print(problem)
+    for fallback in fallbacks:
+        print(f"falls back to the browser, {fallback}")
+    print(
+        f"{compared} replays compared with the page, {len(mismatches)} differences. "
+        f"{rendered} rendered without recorded html, {len(fallbacks)} fall back to the browser"
+    )
+    if not compared:
+        print("Nothing was compared, record replays with --record first")
+    sys.exit(1 if mismatches or not compared else 0)
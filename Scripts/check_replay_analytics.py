@@ -0,0 +1,73 @@
+"""
+Checks replay analytics against the protocol logs they were worked out from: the winner (or tie) and turn count
+have to match the log's |win|/|tie| and last |turn| lines from both viewpoints, and every KO has to be of a
+pokemon the same side sent out.
+
+python -m Scripts.check_replay_analytics [--replays 200] [--fixtures DIR]
+Runs over --replays logs made up by Scripts.fake_showdown, which finish right after a |turn| line, and over
+every showdown .json saved in --fixtures (e.g. recorded with Scripts.check_log_parity --record).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+from Helpers.battle_log import log_battle_parser
+from Helpers.replay_analytics import FAINT, analyse_replay
+from Scripts.fake_showdown import make_replay
+
+
+def expected_result(log: str) -> tuple[str | None, bool, int]:
+    """winner, tie and turn count as the log itself says"""
+    winner, tie, turns = None, False, 0
+    for line in log.splitlines():
+        parts = line.split('|')
+        if len(parts) < 2:
+            continue
+        if parts[1] == "win":
+            winner = parts[2]
+        elif parts[1] == "tie":
+            tie = True
+        elif parts[1] == "turn":
+            turns = int(parts[2])
+    return winner, tie, turns
+
+
+def check_log(name: str, log: str) -> list[str]:
+    problems = []
+    winner, tie, turns = expected_result(log)
+    (_, texts), (_, texts2) = log_battle_parser(log)
+    for viewpoint, turn_texts in (("p1", texts), ("p2", texts2)):
+        analytics = analyse_replay(turn_texts)
+        if (analytics.winner, analytics.tie) != (winner, tie):
+            problems.append(f"{name} ({viewpoint}): winner {analytics.winner!r} tie {analytics.tie}, log says {winner!r} tie {tie}")
+        if analytics.turn_count != turns:
+            problems.append(f"{name} ({viewpoint}): {analytics.turn_count} turns, log says {turns}")
+        for event in analytics.events:
+            if event.kind == FAINT and event.species not in analytics.teams[event.side]:
+                problems.append(f"{name} ({viewpoint}): {event.species} fainted on turn {event.turn} but was never sent out")
+    return problems
+
+
+def fixture_logs(directory: str):
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf-8") as file:
+            yield os.path.basename(path), json.load(file)["log"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replays", type=int, default=200, help="made up logs to check")
+    parser.add_argument("--fixtures", help="directory of recorded showdown .json files")
+    args = parser.parse_args()
+    logs = [(f"gen3ou-{number}", make_replay(f"gen3ou-{number}")["log"]) for number in range(1, args.replays + 1)]
+    if args.fixtures is not None:
+        logs += fixture_logs(args.fixtures)
+    problems = []
+    for name, log in logs:
+        problems += check_log(name, log)
+    for problem in problems:
+        print(problem)
+    print(f"{len(logs)} logs, {len(problems)} problems")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,71 @@
+"""
+Checks the gen 3 sprite table: every species and forme resolves to its own urls by its display name,
+and every url maps back to the species it belongs to.
+
+python -m Scripts.check_sprites [--online]
+--online also requests every url to make sure the sprite exists, everything else runs without network access.
+"""
+import argparse
+import asyncio
+import sys
+
+from Helpers.sprites import ALIASES, FORMES, SPECIES, SPRITE_SPECIES, SPRITES, sprite_urls
+
+
+def check_table() -> list[str]:
+    problems = []
+    if len(SPECIES) != 386:
+        problems.append(f"{len(SPECIES)} species instead of 386")
+    if len(set(SPECIES)) != len(SPECIES):
+        problems.append("duplicate species")
+    for species in SPECIES + FORMES:
+        urls = SPRITES.get(species)
+        if urls is None:
+            problems.append(f"{species} is missing from the table")
+            continue
+        # how the battle log may write it
+        for name in (species, species.upper(), species.lower()):
+            if sprite_urls(name) != urls:
+                problems.append(f"{name!r} resolves to {sprite_urls(name)} instead of {urls}")
+        for url in urls:
+            if SPRITE_SPECIES.get(url) != species:
+                problems.append(f"{url} maps back to {SPRITE_SPECIES.get(url)} instead of {species}")
+            if not url.isascii() or ' ' in url:
+                problems.append(f"{species} has an odd url: {url}")
+    for alias, species in ALIASES.items():
+        if sprite_urls(alias) != SPRITES[species]:
+            problems.append(f"alias {alias} doesn't resolve to {species}")
+    return problems
+
+
+async def check_urls() -> list[str]:
+    import aiohttp
+
+    problems = []
+    semaphore = asyncio.Semaphore(16)
+
+    async def check(session, url):
+        async with semaphore:
+            try:
+                async with session.head(url, allow_redirects=True) as response:
+                    if response.status != 200:
+                        problems.append(f"{url}: {response.status}")
+            except Exception as e:
+                problems.append(f"{url}: {e}")
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(check(session, url) for url in SPRITE_SPECIES))
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--online", action="store_true")
+    args = parser.parse_args()
+    problems = check_table()
+    if args.online:
+        problems += asyncio.run(check_urls())
+    for problem in problems:
+        print(problem)
+    print(f"{len(SPRITES)} species and formes, {len(SPRITE_SPECIES)} urls, {len(problems)} problems")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,149 @@
+"""
+Checks taskcache with fake coroutines: coalescing of concurrent calls, LRU eviction (never of running calls),
+failed results being dropped, ttl expiry, stale-while-revalidate and the stats counting all of it.
+
+python -m Scripts.check_task_cache
+Takes about a second, the ttls are short and nothing touches the network.
+"""
+import asyncio
+import sys
+
+from Helpers.task_cache import taskcache
+
+
+class Fake:
+    """a coroutine function counting its runs, returning `result` (or raising it) after `delay`"""
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.runs = 0
+        self.result = "value"
+
+    async def __call__(self, _, key):
+        self.runs += 1
+        await asyncio.sleep(self.delay)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return f"{self.result} {key} {self.runs}"
+
+
+def expect(problems: list[str], name: str, got, expected):
+    if got != expected:
+        problems.append(f"{name}: got {got!r}, expected {expected!r}")
+
+
+async def check_coalescing(problems: list[str]):
+    fake = Fake()
+    cached = taskcache(ttl=10)(fake)
+    results = await asyncio.gather(*(cached(None, "a") for _ in range(5)))
+    expect(problems, "coalescing runs", fake.runs, 1)
+    expect(problems, "coalescing results", set(results), {"value a 1"})
+    await cached(None, "a")
+    info = cached.cache_info()
+    expect(problems, "coalescing stats", (info["misses"], info["coalesced"], info["hits"]), (1, 4, 1))
+
+
+async def check_lru(problems: list[str]):
+    fake = Fake(delay=0)
+    cached = taskcache(ttl=10, maxsize=2)(fake)
+    await cached(None, "a")
+    await cached(None, "b")
+    await cached(None, "a")  # a is now the most recently used
+    await cached(None, "c")  # so b goes
+    expect(problems, "lru size", cached.cache_info()["size"], 2)
+    expect(problems, "lru evicted", cached.stats.evicted, 1)
+    runs = fake.runs
+    await cached(None, "a")
+    expect(problems, "lru keeps the recently used entry", fake.runs, runs)
+    await cached(None, "b")
+    expect(problems, "lru drops the least recently used entry", fake.runs, runs + 1)
+    # running tasks are skipped, evicting one would start a second run of it on the next call
+    slow = Fake(delay=0.05)
+    single_flight = taskcache(ttl=0, maxsize=1)(slow)
+    first = single_flight(None, "a")
+    second = single_flight(None, "b")
+    expect(problems, "lru keeps the running entry", single_flight(None, "a"), first)
+    await asyncio.gather(first, second)
+    expect(problems, "lru running entry ran once", slow.runs, 2)
+    expect(problems, "lru back within maxsize", single_flight.cache_info()["size"] <= 1, True)
+
+
+async def check_failures(problems: list[str]):
+    fake = Fake()
+    cached = taskcache(ttl=10)(fake)
+    fake.result = ValueError("boom")
+    try:
+        await cached(None, "a")
+        problems.append("failure: the error wasn't raised")
+    except ValueError:
+        pass
+    expect(problems, "failure dropped", cached.cache_info()["size"], 0)
+    fake.result = "value"
+    expect(problems, "failure retried", await cached(None, "a"), "value a 2")
+    # returned failures (None, exception classes) are dropped too
+    for failure in (None, TimeoutError):
+        cached_failure = taskcache(ttl=10)(lambda _, key, failure=failure: asyncio.sleep(0, failure))
+        await cached_failure(None, "a")
+        expect(problems, f"returned {failure!r} dropped", cached_failure.cache_info()["size"], 0)
+        expect(problems, f"returned {failure!r} counted", cached_failure.stats.failed, 1)
+    # as are cancelled tasks
+    slow = Fake(delay=1)
+    cached_slow = taskcache(ttl=10)(slow)
+    task = cached_slow(None, "a")
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    expect(problems, "cancelled dropped", cached_slow.cache_info()["size"], 0)
+
+
+async def check_ttl(problems: list[str]):
+    fake = Fake(delay=0)
+    cached = taskcache(ttl=0.05)(fake)
+    await cached(None, "a")
+    await cached(None, "a")
+    expect(problems, "ttl cached", fake.runs, 1)
+    await asyncio.sleep(0.1)
+    expect(problems, "ttl expired", (await cached(None, "a"), cached.stats.expired), ("value a 2", 1))
+    # ttl=0 is single flight: shared while running, gone once done
+    single = Fake()
+    single_flight = taskcache(ttl=0)(single)
+    await asyncio.gather(single_flight(None, "a"), single_flight(None, "a"))
+    await single_flight(None, "a")
+    expect(problems, "single flight runs", single.runs, 2)
+
+
+async def check_stale_while_revalidate(problems: list[str]):
+    fake = Fake(delay=0.02)
+    cached = taskcache(ttl=0.05, stale_while_revalidate=1)(fake)
+    await cached(None, "a")
+    await asyncio.sleep(0.07)
+    # expired but within the stale window: the old result right away, a refresh in the background
+    expect(problems, "stale served", await cached(None, "a"), "value a 1")
+    expect(problems, "stale counted", cached.stats.stale, 1)
+    await cached(None, "a")  # doesn't start a second refresh
+    await asyncio.sleep(0.05)
+    expect(problems, "one refresh", fake.runs, 2)
+    expect(problems, "refreshed result served", await cached(None, "a"), "value a 2")
+    # a failed refresh keeps the stale result around
+    await asyncio.sleep(0.07)
+    fake.result = ValueError("boom")
+    expect(problems, "stale served while refresh fails", await cached(None, "a"), "value a 2")
+    await asyncio.sleep(0.05)
+    expect(problems, "stale kept after failed refresh", await cached(None, "a"), "value a 2")
+
+
+async def main() -> list[str]:
+    problems = []
+    for check in (check_coalescing, check_lru, check_failures, check_ttl, check_stale_while_revalidate):
+        try:
+            await check(problems)
+        except Exception as e:
+            problems.append(f"{check.__name__}: {e!r}")
+    return problems
+
+
+if __name__ == "__main__":
+    problems = asyncio.run(main())
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problems")
+    sys.exit(1 if problems else 0)
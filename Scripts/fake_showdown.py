@@ -0,0 +1,147 @@
+"""
+A local stand-in for replay.pokemonshowdown.com, for exercising the bot's fetch paths without touching showdown.
+
+python -m Scripts.fake_showdown [--port 8765] [--latency 0.05] [--fail-rate 0.0] [--fixtures DIR]
+Every replay id exists, /<id>.json and /<id>.log are generated from the id so they're the same every time.
+--fixtures serves recorded replays instead where there are any, DIR/<id>.json (showdown's .json saved as is)
+and optionally DIR/<id>.html (the replay page).
+Ids ending in 404 (gen3ou-1404) don't exist, --fail-rate makes that share of requests answer 503 instead.
+Point the bot or a script at it with base url http://127.0.0.1:8765/
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+
+from aiohttp import web
+
+from Helpers.replay_id import parse_replay_id, replay_format_id
+
+TEAM1 = ["Tyranitar", "Skarmory", "Blissey", "Swampert", "Gengar", "Metagross"]
+TEAM2 = ["Salamence", "Zapdos", "Snorlax", "Celebi", "Jirachi", "Starmie"]
+
+
+def make_log(replay_id: str, p1: str, p2: str, turns: int, rng: random.Random) -> str:
+    """a plausible gen 3 singles protocol log, every turn is a switch or an attack from each side"""
+    lines = [
+        f"|j|☆{p1}", f"|j|☆{p2}", f"|player|p1|{p1}|1", f"|player|p2|{p2}|2", "|gametype|singles", "|gen|3",
+        f"|tier|[Gen 3] {replay_format_id(replay_id)[4:].upper() or 'OU'}",
+        "|rule|Sleep Clause Mod: Limit one foe put to sleep", "|", "|start",
+        "|switch|p1a: Tyranitar|Tyranitar, L100|100/100", "|switch|p2a: Salamence|Salamence, L100|100/100", "|turn|1",
+    ]
+    mon1, mon2 = TEAM1[0], TEAM2[0]
+    for turn in range(2, turns + 1):
+        if rng.random() < 0.3:
+            mon1 = rng.choice(TEAM1)
+            lines.append(f"|switch|p1a: {mon1}|{mon1}, L100|100/100")
+        else:
+            lines.append(f"|move|p1a: {mon1}|Earthquake|p2a: {mon2}")
+            lines.append(f"|-damage|p2a: {mon2}|{rng.randint(1, 99)}/100")
+        if rng.random() < 0.3:
+            mon2 = rng.choice(TEAM2)
+            lines.append(f"|switch|p2a: {mon2}|{mon2}, L100|100/100")
+        else:
+            lines.append(f"|move|p2a: {mon2}|Dragon Claw|p1a: {mon1}")
+            lines.append(f"|-damage|p1a: {mon1}|{rng.randint(1, 99)}/100")
+        lines.append(f"|turn|{turn}")
+    lines.append(f"|win|{rng.choice((p1, p2))}")
+    return '\n'.join(lines)
+
+
+def make_replay(replay_id: str) -> dict:
+    """showdown's .json for a replay id, seeded by the id"""
+    rng = random.Random(hashlib.sha1(replay_id.encode()).digest())
+    p1, p2 = f"Player{rng.randrange(1000)}", f"Player{rng.randrange(1000, 2000)}"
+    return {
+        "id": replay_id,
+        "format": f"[Gen 3] {replay_format_id(replay_id)[4:].upper() or 'OU'}",
+        "players": [p1, p2],
+        "log": make_log(replay_id, p1, p2, rng.randint(10, 80), rng),
+        "uploadtime": 1700000000 + rng.randrange(10 ** 7),
+        "views": rng.randrange(500),
+        "rating": rng.choice((0, 0, rng.randint(1000, 1800))),
+    }
+
+
+def read_fixture(directory: str | None, name: str) -> str | None:
+    if directory is None:
+        return None
+    try:
+        with open(os.path.join(directory, name), encoding="utf-8") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+class FakeShowdown:
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, fixtures: str | None = None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fixtures = fixtures
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_get("/{name}", self.handle)
+        self.runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return web.Response(status=503, text="Service Unavailable")
+        name = request.match_info["name"]
+        replay_id = parse_replay_id(name)
+        if replay_id is None or replay_id.endswith("404"):
+            return web.Response(status=404, text="Not Found")
+        recorded = read_fixture(self.fixtures, replay_id + ".json")
+        replay = json.loads(recorded) if recorded is not None else make_replay(replay_id)
+        if name.endswith(".json"):
+            body = json.dumps(replay)
+            etag = '"' + hashlib.sha1(body.encode()).hexdigest()[:16] + '"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.Response(text=body, content_type="application/json", headers={"ETag": etag})
+        if name.endswith(".log"):
+            return web.Response(text=replay["log"])
+        page = read_fixture(self.fixtures, replay_id + ".html")
+        if page is not None:
+            return web.Response(text=page, content_type="text/html")
+        # the replay page itself, only good enough for the log to be read out of it
+        return web.Response(text=f'<script type="text/plain" class="battle-log-data">{replay["log"]}</script>', content_type="text/html")
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> str:
+        """serves in the background, returns the base url"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]  # port 0 picks a free one
+        return f"http://{host}:{port}/"
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+async def main(args):
+    server = FakeShowdown(args.latency, args.fail_rate, args.fixtures)
+    print(f"Serving replays on {await server.start(args.host, args.port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--fixtures", help="directory of recorded replays, <id>.json and <id>.html")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
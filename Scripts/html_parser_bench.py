@@ -0,0 +1,120 @@
+"""
+Times html_battle_parser (a cascade of regex passes over the whole battle log) against a single pass tokenizer
+giving the same output, on small, medium and huge battle logs.
+
+python -m Scripts.html_parser_bench [--fixtures Scripts/fixtures/parser_bench] [--repeat 20] [--write-fixtures]
+The fixtures are battle log html rendered by Helpers.battle_log from made up logs of 20, 80 and 400 turns,
+--write-fixtures makes them again. Each parser's best time of --repeat runs is shown.
+The tokenizer only has to be right for these fixtures (the output of both is compared first), it's a prototype
+to see whether replacing the cascade would pay off, not a parser to ship.
+"""
+import argparse
+import os
+import random
+import re
+import timeit
+
+from Helpers.battle_log import render_log_html
+from Helpers.html_parser import html_battle_parser
+from Scripts.fake_showdown import make_log
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "parser_bench")
+SIZES = {"small": 20, "medium": 80, "huge": 400}
+
+WRAPPER_START = '<div class="battle-options"></div><div class="inner message-log">'
+WRAPPER_END = '</div><div class="inner-preempt message-log"></div>'
+SPACER = '<div class="spacer battle-history"><br></div>'
+token_pattern = re.compile(r'<div class="chat.*?">.*?</div>|' + re.escape(SPACER) + r'|<(/?)([a-z0-9]+)[^>]*>|[^<]+')
+
+
+def tokenizer_parser(html_text: str) -> tuple[str, list[str]]:
+    """html_battle_parser in one walk over the tags"""
+    text = html_text.replace(WRAPPER_START, '').replace(WRAPPER_END, '')
+    tokens = [match for match in token_pattern.finditer(text) if not match.group(0).startswith('<div class="chat')]
+    format_parts = []
+    turns = []
+    out = format_parts
+    in_battle = False
+    for index, match in enumerate(tokens):
+        token = match.group(0)
+        if token[0] != '<':
+            out.append(token)
+            continue
+        if token == SPACER:
+            out.append('\n')
+            continue
+        closing, tag = match.group(1), match.group(2)
+        if tag == 'div':
+            if closing:
+                out.append('\n')
+            elif not in_battle and token == '<div class="battle-history">':
+                in_battle = True
+                out = []
+                turns.append(out)
+        elif tag == 'strong':
+            out.append('**')
+        elif tag == 'em':
+            if in_battle:
+                out.append('_')
+            elif not closing:
+                out.append('- ')
+        elif tag == 'br' and in_battle:
+            following = tokens[index + 1].group(0) if index + 1 < len(tokens) else ''
+            # a br right before a newline (where a div ends) is dropped, any other one is a newline
+            if not following.startswith(('\n', '</div', SPACER)):
+                out.append('\n')
+        elif tag == 'h2':
+            if closing:
+                out.append('```')
+            else:
+                out = ['## ```']
+                turns.append(out)
+        # small and abbr tags are dropped, their text kept
+    texts = [''.join(turn).strip() for turn in turns]
+    texts[0] = "## ```Turn 0```\n" + texts[0]
+    return ''.join(format_parts).strip(), texts
+
+
+def fixture_html(turns: int) -> str:
+    rng = random.Random(turns)
+    log = make_log(f"gen3ou-{turns}", "Player1", "Player2", turns, rng)
+    return render_log_html(log, 'p1')
+
+
+def write_fixtures(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    for name, turns in SIZES.items():
+        with open(os.path.join(directory, name + ".html"), "w", encoding="utf-8") as file:
+            file.write(fixture_html(turns))
+
+
+def best_time(func, html: str, repeat: int) -> float:
+    number = max(1, 2000 // len(html.split('<h2')))  # about the same amount of work per size
+    return min(timeit.repeat(lambda: func(html), number=number, repeat=repeat)) / number
+
+
+def main(args):
+    if args.write_fixtures:
+        write_fixtures(args.fixtures)
+    print(f"{'':8} {'turns':>6} {'KiB':>7} {'cascade':>10} {'tokenizer':>10} {'speed':>6}")
+    for name in SIZES:
+        with open(os.path.join(args.fixtures, name + ".html"), encoding="utf-8") as file:
+            html = file.read()
+        if tokenizer_parser(html) != html_battle_parser(html):
+            print(f"{name}: the tokenizer's output differs, its time wouldn't mean anything")
+            continue
+        cascade = best_time(html_battle_parser, html, args.repeat)
+        tokenizer = best_time(tokenizer_parser, html, args.repeat)
+        turns = len(html_battle_parser(html)[1]) - 1
+        print(
+            f"{name:8} {turns:>6} {len(html) / 1024:>7.1f} {cascade * 1e3:>8.2f}ms {tokenizer * 1e3:>8.2f}ms "
+            f"{cascade / tokenizer:>5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--repeat", type=int, default=20, help="runs of each parser, the best one counts")
+    parser.add_argument("--write-fixtures", action="store_true", help="render the fixtures again first")
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+"""
+Archives a list of replays into the bot's database, the same way .ingest does but without the bot running.
+
+python -m Scripts.ingest [--db database.db] [--job NAME] [--workers 4] [--retry-failed]
+                         [--base-url URL] [--from-log] [replays.txt ...] [--ids LINK_OR_ID ...]
+Files hold replay links or ids separated by whitespace or commas, "-" reads them from stdin.
+Progress is checkpointed in the database, so rerunning the same job (same name, or the same list) resumes it.
+Replays are rendered from the replay page in chromium, like the bot does, or from their log with --from-log
+(chromium is then only started for logs which can't be rendered directly).
+--base-url points it at another replay server, e.g. python -m Scripts.fake_showdown for testing.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from Cogs.replays import Replay
+from Helpers.fetch_scheduler import FetchScheduler, Priority, Requester, current_requester
+from Helpers.lazy_browser import LazyBrowser
+from Helpers.metrics import Metrics
+from Helpers.parse_pool import ParsePool
+from Helpers.replay_archive import ReplayArchive, ensure_schema
+from Helpers.replay_ingest import BulkIngest, parse_replay_list
+from Helpers.showdown_client import ShowdownClient
+
+
+def read_lists(paths: list[str]) -> str:
+    texts = []
+    for path in paths:
+        if path == "-":
+            texts.append(sys.stdin.read())
+        else:
+            with open(path, encoding="utf-8") as file:
+                texts.append(file.read())
+    return '\n'.join(texts)
+
+
+async def print_progress(report):
+    print(report.summary(), flush=True)
+
+
+async def main(args):
+    replay_ids, invalid = parse_replay_list(read_lists(args.files) + '\n' + ' '.join(args.ids))
+    for entry in invalid:
+        print(f"Not a replay link: {entry}")
+    if not replay_ids:
+        return print("Nothing to ingest")
+
+    # just the parts of the bot the replay cog uses
+    bot = SimpleNamespace()
+    bot.showdown = ShowdownClient(base_url=args.base_url) if args.base_url else ShowdownClient()
+    await bot.showdown.start()
+    bot.archive = ReplayArchive(args.db)
+    await bot.archive.start()
+    await ensure_schema(bot.archive)
+    # nobody else is using it, so no caps besides the number of workers
+    bot.fetch_scheduler = FetchScheduler(concurrency=args.workers, reserved=0, per_user=args.workers)
+    current_requester.set(Requester(None, None, Priority.BULK))
+    bot.parse_pool = ParsePool(kind="process", workers=args.parsers)
+    await bot.parse_pool.start()
+    bot.browser_pool = LazyBrowser(pool_size=3, max_uses=50, idle_timeout=None)
+    bot.render_queue = None  # renders right here, this isn't sharing a process with a gateway
+    bot.render_from_log = args.from_log
+    bot.metrics = Metrics()
+    replays = Replay(bot)
+    ingest = BulkIngest(
+        bot.archive, replays.load_replay, workers=args.workers, retry_failed=args.retry_failed,
+        on_progress=print_progress, progress_interval=args.progress,
+    )
+    try:
+        report = await ingest.run(replay_ids, args.job)
+    finally:
+        # views refreshes started for already archived replays
+        await asyncio.gather(*replays.background_tasks, return_exceptions=True)
+        await bot.browser_pool.close()
+        bot.parse_pool.shutdown()
+        await bot.showdown.close()
+        await bot.archive.close()
+
+    print(report.summary())
+    for replay_id, error in report.errors.items():
+        print(f"  failed {replay_id}: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="files of replay links or ids, - for stdin")
+    parser.add_argument("--ids", nargs="*", default=[], help="replay links or ids given directly")
+    parser.add_argument("--db", default="database.db")
+    parser.add_argument("--job", help="checkpoint name, defaults to one derived from the list of replays")
+    parser.add_argument("--workers", type=int, default=4, help="replays loaded at once")
+    parser.add_argument("--parsers", type=int, default=2, help="parser processes")
+    parser.add_argument("--retry-failed", action="store_true", help="try replays which failed in an earlier run again")
+    parser.add_argument("--base-url", help="replay server, https://replay.pokemonshowdown.com/ by default")
+    parser.add_argument("--from-log", action="store_true", help="render replays from their log instead of the replay page")
+    parser.add_argument("--progress", type=float, default=5.0, help="seconds between progress reports")
+    started = time.perf_counter()
+    asyncio.run(main(parser.parse_args()))
+    print(f"Took {time.perf_counter() - started:.1f}s")
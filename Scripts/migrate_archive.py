@@ -0,0 +1,58 @@
+"""
+Converts every psreplays row still in the old sentinel joined format to the compact turns blob at once,
+instead of waiting for each of them to be read by the bot.
+
+python -m Scripts.migrate_archive [database.db] [--batch 200] [--vacuum]
+Safe to stop and run again, only rows which weren't converted yet are touched.
+"""
+import argparse
+import sqlite3
+import time
+
+from Helpers.replay_codec import encode_turns, legacy_split
+
+
+def migrate(path: str, batch: int = 200, vacuum: bool = False):
+    conn = sqlite3.connect(path)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(psreplays)")}
+    if "turns" not in columns:
+        conn.execute("ALTER TABLE psreplays ADD COLUMN turns BLOB")
+    # walks the rows in replayid order, so rows which fail to convert aren't picked up again
+    select = (
+        "SELECT replayid, battle_text1, battle_text2 FROM psreplays"
+        " WHERE turns IS NULL AND replayid > ? ORDER BY replayid LIMIT ?"
+    )
+    update = "UPDATE psreplays SET turns = ?, battle_text1 = NULL, battle_text2 = NULL WHERE replayid = ?"
+    converted = failed = 0
+    start = time.perf_counter()
+    last_id = ''
+    while True:
+        rows = conn.execute(select, (last_id, batch)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = []
+        for replay_id, battle_text1, battle_text2 in rows:
+            try:
+                updates.append((encode_turns(*legacy_split(battle_text1, battle_text2)), replay_id))
+            except Exception as e:  # left as is, the bot can still read it
+                print(f"{replay_id}: {e}")
+                failed += 1
+        conn.executemany(update, updates)
+        conn.commit()
+        converted += len(updates)
+        print(f"{converted} rows converted ({converted / (time.perf_counter() - start):.0f}/s)")
+    if vacuum:
+        print("Vacuuming..")
+        conn.execute("VACUUM")
+    conn.close()
+    print(f"Done, {converted} converted, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database", nargs="?", default="database.db")
+    parser.add_argument("--batch", type=int, default=200, help="rows converted per transaction")
+    parser.add_argument("--vacuum", action="store_true", help="give the freed space back to the filesystem afterwards")
+    args = parser.parse_args()
+    migrate(args.database, args.batch, args.vacuum)
@@ -0,0 +1,97 @@
+"""
+Render worker: takes replays to render from the bot's render queue and sends the turn texts back for the bot to archive,
+with its own chromium (only launched when a log can't be parsed, closed again when idle).
+The worker never touches the database, so the bot's archive stays the only writer.
+
+python -m Scripts.render_worker --port PORT [--host 127.0.0.1] [--pages 1] [--supervised]
+The bot starts (and restarts) these on its own, start one by hand to add a worker to a running bot.
+A worker started by hand reconnects whenever the bot restarts, --supervised ones exit with their bot instead.
+"""
+import argparse
+import asyncio
+import os
+from types import SimpleNamespace
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from Cogs.replays import Replay
+from Helpers.battle_log import UnsupportedLogLine, log_battle_parser
+from Helpers.html_parser import html_battle_views
+from Helpers.lazy_browser import LazyBrowser
+from Helpers.metrics import Metrics
+from Helpers.render_queue import MESSAGE_LIMIT, read_message, send_message
+
+
+async def render_turns(bot, replays: Replay, job: dict):
+    """the cog's render_turns, parsing inline since this process is already off the bot's event loop"""
+    if job.get("from_log"):
+        try:
+            # no browser needed when the protocol log can be rendered directly
+            with bot.metrics.span("log_parse"):
+                return log_battle_parser(job["battle_data"]["log"])
+        except (KeyError, UnsupportedLogLine) as e:
+            print(e)
+    html_log, html_log2 = await replays.fetch_battle_logs(job["url"])
+    with bot.metrics.span("html_parse"):
+        return html_battle_views(html_log, html_log2)
+
+
+async def render(bot, replays: Replay, job: dict) -> dict:
+    # fresh spans for every job, they're sent back to the bot's histograms
+    bot.metrics = Metrics()
+    try:
+        (format_text, texts), (_, texts2) = await render_turns(bot, replays, job)
+        reply = {"type": "done", "format_text": format_text, "texts": texts, "texts2": texts2}
+    except PlaywrightTimeoutError:
+        reply = {"type": "error", "message": 'Replay website timed out! Please redo the command.'}
+    except Exception as e:
+        print(e)
+        reply = {"type": "error", "message": 'An error occurred, I was unable to open the replay site properly. Please report it to Intenzi.'}
+    reply["id"] = job["id"]
+    reply["spans"] = {name: histogram.sum for name, histogram in bot.metrics.histograms.items()}
+    return reply
+
+
+async def work(bot, replays: Replay, host: str, port: int):
+    """takes jobs until the bot goes away"""
+    reader, writer = await asyncio.open_connection(host, port, limit=MESSAGE_LIMIT)
+    try:
+        await send_message(writer, {"type": "hello", "pid": os.getpid()})
+        while (job := await read_message(reader)) is not None:
+            await send_message(writer, await render(bot, replays, job))
+    finally:
+        writer.close()
+
+
+async def main(args):
+    # just the parts of the bot fetch_battle_logs uses
+    bot = SimpleNamespace()
+    bot.metrics = Metrics()
+    bot.browser_pool = LazyBrowser(pool_size=args.pages, max_uses=50, idle_timeout=600)
+    replays = Replay(bot)
+    delay = 1.0
+    try:
+        while True:
+            try:
+                await work(bot, replays, args.host, args.port)
+                delay = 1.0
+            except (ConnectionError, OSError) as e:
+                print(f"Render worker {os.getpid()}: {e}")
+            if args.supervised:
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+    finally:
+        await bot.browser_pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True, help="port of the bot's render queue")
+    parser.add_argument("--pages", type=int, default=1, help="browser pages kept open")
+    parser.add_argument("--supervised", action="store_true", help="started by the bot, exit when it disconnects")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,98 @@
+"""
+Memory held by open replay viewers, with every viewer keeping its own copy of its replay's turns (how the cog
+worked before ParsedReplay) against one ParsedReplay per replay shared through a cache keyed by replay id (the cog's
+viewer cache), measured with tracemalloc.
+
+python -m Scripts.replay_memory_bench [--replays 20] [--viewers 10]
+--replays archived replays (made up by Scripts.fake_showdown) are each opened by --viewers people at once.
+Before, every open split the archived texts again and worked out its own sprite index. After, the first open
+decodes the compact turns and the rest share it. Also shows what __slots__ saves on each ParsedReplay object itself,
+the turn texts it points to are the same either way.
+"""
+import argparse
+import gc
+import tracemalloc
+
+from Helpers.battle_log import log_battle_parser
+from Helpers.replay_codec import LEGACY_SEPARATOR, decode_turns, encode_turns, legacy_split
+from Helpers.replay_store import ParsedReplay, active_mon_index
+from Scripts.fake_showdown import make_replay
+
+
+class OldViewer:
+    """what a viewer held of its replay before, its own lists of both viewpoints' turns and sprites"""
+    def __init__(self, format_text: str, battle_text1: str, battle_text2: str):
+        self.format_text = format_text
+        self.texts, self.texts2 = legacy_split(battle_text1, battle_text2)
+        self.active_mons = list(active_mon_index(self.texts))
+        self.active_mons2 = list(active_mon_index(self.texts2))
+
+
+class NewViewer:
+    def __init__(self, replay: ParsedReplay):
+        self.replay = replay
+
+
+class UnslottedReplay:
+    """a ParsedReplay as it would be without __slots__, pointing at the same turns"""
+    def __init__(self, replay: ParsedReplay):
+        for name in ParsedReplay.__slots__:
+            setattr(self, name, getattr(replay, name))
+
+
+def measure(build) -> tuple[int, int, object]:
+    """bytes still allocated once build() returns (what it returns being kept alive), and at the peak"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, kept
+
+
+def main(args):
+    # the archive as each version of the cog stored it, built before measuring
+    rows = {}
+    for number in range(1, args.replays + 1):
+        replay_id = f"gen3ou-{number}"
+        (format_text, texts), (_, texts2) = log_battle_parser(make_replay(replay_id)["log"])
+        rows[replay_id] = (format_text, LEGACY_SEPARATOR.join(texts), LEGACY_SEPARATOR.join(texts2), encode_turns(texts, texts2))
+
+    def before():
+        return [
+            OldViewer(format_text, text1, text2)
+            for format_text, text1, text2, _ in rows.values() for _ in range(args.viewers)
+        ]
+
+    def after():
+        cache = {}
+        viewers = []
+        for replay_id, (format_text, _, _, turns) in rows.items():
+            for _ in range(args.viewers):
+                replay = cache.get(replay_id)
+                if replay is None:
+                    replay = cache[replay_id] = ParsedReplay(replay_id, format_text, *decode_turns(turns))
+                viewers.append(NewViewer(replay))
+        return cache, viewers
+
+    before_current, before_peak, _ = measure(before)
+    after_current, after_peak, (_, viewers) = measure(after)
+    replays = list({id(viewer.replay): viewer.replay for viewer in viewers}.values())
+    slotted = measure(lambda: [ParsedReplay.__new__(ParsedReplay) for _ in range(1000)])[0] / 1000
+    unslotted = measure(lambda: [UnslottedReplay(replay) for replay in replays * (1000 // len(replays) + 1)][:1000])[0] / 1000
+
+    count = args.replays * args.viewers
+    print(f"{args.replays} replays with {args.viewers} viewers each")
+    print(f"{'':16} {'before':>10} {'after':>10}")
+    print(f"{'held (KiB)':16} {before_current / 1024:>10.1f} {after_current / 1024:>10.1f}")
+    print(f"{'peak (KiB)':16} {before_peak / 1024:>10.1f} {after_peak / 1024:>10.1f}")
+    print(f"{'per viewer (KiB)':16} {before_current / 1024 / count:>10.2f} {after_current / 1024 / count:>10.2f}")
+    print(f"Each ParsedReplay object: {slotted:.0f} bytes with __slots__, {unslotted:.0f} without")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replays", type=int, default=20, help="distinct replays being viewed")
+    parser.add_argument("--viewers", type=int, default=10, help="viewers open on each replay")
+    main(parser.parse_args())
@@ -0,0 +1,153 @@
+"""
+Bot startup time and idle memory with chromium launched at startup (how main.py started the bot before LazyBrowser)
+against launched on the first render that needs it, neither logging in to discord.
+
+python -m Scripts.startup_bench [--runs 3] [--idle 5] [--render-workers 0]
+Each run is a fresh python process building what main.py does before bot.start() (cogs imported, showdown
+client, archive on a throwaway database, parser processes, scheduler, browser, render workers), timed from
+spawning it to everything being ready. --idle seconds later it reads the resident memory of its whole process
+tree (process_tree_rss, so chromium and parser/render workers count). The eager run also shows what the launch
+itself took (what LazyBrowser keeps as last_launch_time). Eager runs need chromium (playwright install chromium).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+async def start_bot(mode: str, idle: float, render_workers: int) -> dict:
+    """what main.py does up to bot.start(), returns the idle memory and the launch time (or what went wrong)"""
+    import importlib
+    from types import SimpleNamespace
+
+    from playwright.async_api import async_playwright
+
+    from Helpers.browser_pool import BrowserPool
+    from Helpers.fetch_scheduler import FetchScheduler
+    from Helpers.lazy_browser import LazyBrowser, process_tree_rss
+    from Helpers.loop_monitor import LoopLagMonitor
+    from Helpers.metrics import Metrics
+    from Helpers.parse_pool import ParsePool
+    from Helpers.render_queue import RenderQueue
+    from Helpers.replay_archive import ReplayArchive, ensure_schema
+    from Helpers.showdown_client import ShowdownClient
+
+    for cog in os.listdir('Cogs'):
+        if cog.endswith('.py'):
+            importlib.import_module('Cogs.' + cog[:-3])
+
+    bot = SimpleNamespace()
+    directory = tempfile.TemporaryDirectory()
+    bot.showdown = ShowdownClient(limit=20, limit_per_host=10, timeout=10, retries=2, breaker_threshold=5, breaker_cooldown=30)
+    await bot.showdown.start()
+    bot.metrics = Metrics(export_port=None)
+    bot.archive = ReplayArchive(os.path.join(directory.name, 'database.db'), readers=4, batch_size=64)
+    await bot.archive.start()
+    bot.parse_pool = ParsePool(kind="process", workers=2)
+    await bot.parse_pool.start()
+    bot.fetch_scheduler = FetchScheduler(concurrency=4, reserved=1, per_user=2, per_guild=3, max_queue=100, max_user_queue=5)
+    bot.loop_monitor = LoopLagMonitor()
+    bot.loop_monitor.start()
+    await ensure_schema(bot.archive)
+
+    playwright = None
+    bot.browser_pool = None
+    bot.render_queue = None
+    try:
+        if mode == "eager":
+            start = time.perf_counter()
+            playwright = await async_playwright().start()
+            browser = await playwright.chromium.launch()
+            bot.browser_pool = BrowserPool(browser, size=3, max_uses=50)
+            await bot.browser_pool.start()
+            launch_time = time.perf_counter() - start
+        else:
+            bot.browser_pool = LazyBrowser(pool_size=3, max_uses=50, idle_timeout=600)
+            launch_time = bot.browser_pool.last_launch_time  # nothing launched, so 0
+        if render_workers:
+            bot.render_queue = RenderQueue(workers=render_workers)
+            await bot.render_queue.start()
+            while bot.render_queue.connected < render_workers:
+                await asyncio.sleep(0.05)
+        print("ready", flush=True)
+        await asyncio.sleep(idle)
+        result = {"rss": process_tree_rss(), "launch": launch_time}
+    except Exception as e:
+        result = {"error": str(e).strip().splitlines()[0] if str(e).strip() else repr(e)}
+    try:
+        if bot.render_queue is not None:
+            await bot.render_queue.close()
+        if bot.browser_pool is not None:
+            await bot.browser_pool.close()
+        if playwright is not None:
+            if bot.browser_pool is not None:
+                await bot.browser_pool.browser.close()
+            await playwright.stop()
+        await bot.showdown.close()
+        bot.loop_monitor.stop()
+        bot.parse_pool.shutdown()
+        await bot.archive.close()
+    finally:
+        directory.cleanup()
+    return result
+
+
+async def measure(mode: str, idle: float, render_workers: int) -> dict:
+    """one fresh bot process, timed from spawning it to it being ready"""
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "Scripts.startup_bench", "--child", mode, "--idle", str(idle),
+        "--render-workers", str(render_workers),
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    startup = None
+    result = None
+    while line := await process.stdout.readline():
+        line = line.decode().strip()
+        if line == "ready":
+            startup = time.perf_counter() - start
+        elif line.startswith("{"):
+            result = json.loads(line)
+    _, errors = await process.communicate()
+    if result is None:
+        lines = errors.decode().strip().splitlines()
+        return {"error": lines[-1] if lines else f"exited with {process.returncode}"}
+    return {"startup": startup, **result}
+
+
+async def main(args):
+    results = {}
+    for mode in ("eager", "lazy"):
+        runs = [await measure(mode, args.idle, args.render_workers) for _ in range(args.runs)]
+        failed = [run["error"] for run in runs if "error" in run]
+        if failed:
+            print(f"{mode} startup failed: {failed[0]}")
+            continue
+        results[mode] = {
+            "startup (s)": statistics.median(run["startup"] for run in runs),
+            "idle MiB": statistics.median(run["rss"] for run in runs) / 2 ** 20,
+            "launch (s)": statistics.median(run["launch"] for run in runs),
+        }
+    print(f"median of {args.runs} runs, memory read after {args.idle:.0f}s idle, {args.render_workers} render workers")
+    print(f"{'':12} {'eager':>10} {'lazy':>10}")
+    for name in ("startup (s)", "idle MiB", "launch (s)"):
+        values = [f"{results[mode][name]:>10.2f}" if mode in results else f"{'-':>10}" for mode in ("eager", "lazy")]
+        print(f"{name:12} {' '.join(values)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes started for each mode")
+    parser.add_argument("--idle", type=float, default=5, help="seconds to sit idle before reading the memory")
+    parser.add_argument("--render-workers", type=int, default=0, help="render worker processes, main.py runs one per core")
+    parser.add_argument("--child", choices=("eager", "lazy"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(start_bot(args.child, args.idle, args.render_workers))), flush=True)
+    else:
+        asyncio.run(main(args))
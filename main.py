@@ -1,12 +1,17 @@
 import asyncio
 import os
 
-import aiohttp
-import asqlite
 import discord
 from discord.ext import commands
-from playwright.async_api import async_playwright
 
+from Helpers.fetch_scheduler import FetchScheduler
+from Helpers.lazy_browser import LazyBrowser
+from Helpers.loop_monitor import LoopLagMonitor
+from Helpers.metrics import Metrics
+from Helpers.parse_pool import ParsePool
+from Helpers.render_queue import RenderQueue
+from Helpers.replay_archive import ReplayArchive, ensure_schema
+from Helpers.showdown_client import ShowdownClient
 from secrets import TOKEN
 
 
@@ -19,7 +24,8 @@ bot = commands.Bot(command_prefix=commands.when_mentioned_or("."), case_insensit
 
 @bot.hybrid_command()
 async def ping(ctx):
-    await ctx.send(f'Pong! {round(bot.latency * 1000)}ms')
+    monitor = bot.loop_monitor
+    await ctx.send(f'Pong! {round(bot.latency * 1000)}ms (event loop lag: {round(monitor.last_lag * 1000)}ms, recent worst: {round(monitor.recent_max_lag * 1000)}ms)')
 
 
 @bot.command()
@@ -37,33 +43,57 @@ async def on_ready():
 bot.owner_ids = {378678890345791489, 296937641121939456}  # for calling sync cmd
 
 
-create_query = """
-CREATE TABLE IF NOT EXISTS psreplays (
-    replayid TEXT PRIMARY KEY,
-    format_text TEXT,
-    battle_text1 TEXT[],
-    battle_text2 TEXT[]
-);
-"""
-
-
 async def main():
-    async with bot, asqlite.create_pool('database.db') as pool:
+    async with bot:
         for cog in os.listdir('Cogs'):
             if cog.endswith('.py'):
                 await bot.load_extension('Cogs.' + cog[:-3])
 
-        bot.session = aiohttp.ClientSession()
-        bot.pool = pool
-        async with pool.acquire() as conn:
-            # Create the table if it doesn't exist
-            await conn.execute(create_query)
-            # Commit the transaction
-            await conn.commit()
-
-        bot.playwright = await async_playwright().start()
-        bot.browser = await bot.playwright.chromium.launch()
-        print("Browser on standby")
-        await bot.start(TOKEN)
-
-asyncio.run(main())
+        # every request to showdown, kept-alive connections, 10s per attempt with 2 retries,
+        # and no requests for 30s once 5 in a row have failed
+        bot.showdown = ShowdownClient(limit=20, limit_per_host=10, timeout=10, retries=2, breaker_threshold=5, breaker_cooldown=30)
+        await bot.showdown.start()
+        # latency histograms behind .stats, give it a port to also serve them on localhost:<port>/metrics for scraping
+        bot.metrics = Metrics(export_port=None)
+        # 4 read connections, saves are committed in batches of up to 64 by a single writer
+        bot.archive = ReplayArchive('database.db', readers=4, batch_size=64)
+        await bot.archive.start()
+        # replay analytics/indexing (and parsing while no render worker is connected) run here instead of on the
+        # event loop, use kind="thread" to skip the extra processes
+        bot.parse_pool = ParsePool(kind="process", workers=2)
+        await bot.parse_pool.start()
+        # 4 replays fetched/rendered at once (1 of them kept for people waiting on a command),
+        # 2 at once per user and 3 per guild of each priority, so someone's prefetches never hold up their /replay,
+        # interactive requests are turned away past 100 queued or 5 of a user's interactive ones
+        bot.fetch_scheduler = FetchScheduler(concurrency=4, reserved=1, per_user=2, per_guild=3, max_queue=100, max_user_queue=5)
+        bot.loop_monitor = LoopLagMonitor()
+        bot.loop_monitor.start()
+        # Create the tables if they don't exist
+        await ensure_schema(bot.archive)
+
+        # chromium is only launched once a replay needs it, and closed again after 10 minutes without renders
+        # at most 3 replays are rendered at once, pages get replaced after 50 renders
+        bot.browser_pool = LazyBrowser(pool_size=3, max_uses=50, idle_timeout=600)
+        # replays are rendered from the replay page, set this to render them from their protocol log instead
+        # (no browser) once python -m Scripts.check_log_parity passes on recorded fixtures
+        bot.render_from_log = False
+        # renders go to worker processes which send the turns back to be archived here, one per core
+        # but no more than the scheduler ever runs at once, the browser above is only used while none are connected
+        bot.render_queue = RenderQueue(workers=min(os.cpu_count() or 1, bot.fetch_scheduler.concurrency))
+        await bot.render_queue.start()
+        await bot.metrics.start(gauges=bot.get_cog("Stats").gauges)
+        try:
+            await bot.start(TOKEN)
+        finally:
+            await bot.metrics.close()
+            await bot.render_queue.close()
+            await bot.browser_pool.close()
+            await bot.showdown.close()
+            bot.loop_monitor.stop()
+            bot.parse_pool.shutdown()
+            # commits the saves still queued
+            await bot.archive.close()
+
+
+if __name__ == "__main__":  # parser workers re-import this module
+    asyncio.run(main())